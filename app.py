@@ -1,5 +1,6 @@
 import streamlit as st
-from data_collector import collect_stock_data, load_stock_data
+from data_collector import collect_stock_data, INTERVALS
+from dataset_cache import get_dataset, cache_stats
 
 # Configurações da página
 st.set_page_config(
@@ -10,34 +11,34 @@ st.set_page_config(
 
 st.header("Seja bem-vindo!!")
 
-# Função de carregamento de dados com cache
-@st.cache_data
-def load_data():
-    return load_stock_data()
-
-# Carregando dados
-df = load_data()
+# Carregando dados (cache compartilhado, invalidado automaticamente após cada coleta)
+df = get_dataset()
 
 if df.empty:
     st.markdown('Não foi possível carregar os dados. Clique no botão para coletar os dados.')
 
 collecting_message = st.empty() 
+intervalo = st.selectbox('Intervalo das cotações:', INTERVALS,
+                         help='Intervalos intradiários são gravados em um armazenamento separado.')
 # Adicionando um botão para coletar os dados
 if st.button('Coletar Dados de Ações'):
     collecting_message.markdown('Coletando dados... Não navegue entre guias.  \n  \n**Pode levar alguns minutos**')
     # collecting_message.markdown('**Pode levar alguns minutos**')
 
-    TICKERS = ["AAPL", "MSFT", "GOOGL", '^GSPC', "AMZN", 'VALE3.SA', 'BBAS3.SA', 'DOGE-USD','BTC-USD' ]
-    collect_stock_data(TICKERS, period="1y")
+    TICKERS = ["AAPL", "MSFT", "GOOGL", '^GSPC', "AMZN", 'VALE3.SA', 'BBAS3.SA', 'DOGE-USD','BTC-USD', 'BRL=X' ]
+    coletados = collect_stock_data(TICKERS, period="1y", interval=intervalo)
     
     # Removendo a mensagem de "Coletando dados..." após a coleta ser concluída
     collecting_message.empty()
     
+    falhas = coletados.attrs.get('falhas', {})
+    if falhas:
+        st.warning('Não foi possível coletar: ' + ', '.join(f'{ticker} ({erro})' for ticker, erro in falhas.items()))
     st.success("Dados coletados com sucesso!")
     
     # Recarregar os dados após a coleta
-    df = load_data()
-st.markdown(f'Atualizado em {(df.iloc[-1]['Datetime']).strftime('%Y-%m-%d')}')
+    df = get_dataset()
+st.markdown(f'Atualizado em {(df['Datetime'].max()).strftime('%Y-%m-%d')}')
 
 # Exibindo os dados (tabela)
 if not df.empty:
@@ -48,6 +49,10 @@ else:
 # Página explicativa
 st.sidebar.title("Sobre o Site")
 
+estatisticas = cache_stats()
+st.sidebar.caption(f"Cache de dados: {estatisticas['hits']} acertos, {estatisticas['misses']} leituras do disco, "
+                   f"{estatisticas['invalidations']} invalidações")
+
 st.sidebar.markdown("""
     **Página de Backtest:**  
     -
@@ -0,0 +1,100 @@
+import os
+import time
+from types import SimpleNamespace
+
+# Chamadas ao modelo de linguagem usadas pelos assistentes (Carteira e Seu_Chatbot).
+# As respostas chegam em streaming. Com ASSISTANT_MOCK=1 é usado um cliente local que imita
+# a API do Groq, para rodar e testar sem acesso à internet; sem essa variável a chave é obrigatória.
+
+MODEL = "llama3-8b-8192"
+
+
+class MockClient:
+    """
+    Cliente local com a mesma interface de `Groq().chat.completions.create`.
+    Responde repetindo a última pergunta, palavra por palavra, com `delay` segundos entre os trechos.
+    """
+
+    def __init__(self, delay=0.02, first_token_delay=0.2):
+        self.delay = delay
+        self.first_token_delay = first_token_delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _answer(self, messages):
+        pergunta = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        return f"Resposta simulada para: {pergunta}"
+
+    def _stream(self, texto):
+        time.sleep(self.first_token_delay)
+        for i, palavra in enumerate(texto.split(" ")):
+            if i:
+                time.sleep(self.delay)
+            trecho = palavra if i == 0 else " " + palavra
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=trecho))])
+
+    def _create(self, messages, model=MODEL, stream=False, **kwargs):
+        self.calls += 1
+        texto = self._answer(messages)
+        if stream:
+            return self._stream(texto)
+        time.sleep(self.first_token_delay + self.delay * texto.count(" "))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=texto))])
+
+
+def load_api_key():
+    """Chave do Groq em st.secrets (api_key.GROQ_API_KEY) ou na variável de ambiente GROQ_API_KEY."""
+    try:
+        import streamlit as st
+        return st.secrets['api_key']['GROQ_API_KEY']
+    except Exception:
+        return os.getenv("GROQ_API_KEY")
+
+
+def make_client(api_key=None, **kwargs):
+    """
+    Cliente do Groq (kwargs repassados, ex.: timeout), ou o MockClient com ASSISTANT_MOCK=1.
+    Levanta RuntimeError se não houver chave: respostas simuladas só quando pedidas explicitamente.
+    """
+    if os.getenv("ASSISTANT_MOCK") == "1":
+        return MockClient()
+    if not api_key:
+        raise RuntimeError("A chave da API do Groq não está configurada (api_key.GROQ_API_KEY em "
+                           "st.secrets ou a variável de ambiente GROQ_API_KEY).")
+    from groq import Groq
+    return Groq(api_key=api_key, **kwargs)
+
+
+def stream_completion(client, messages, model=MODEL, stats=None, **kwargs):
+    """
+    Gerador com os trechos de texto da resposta, à medida que chegam (pode ser passado a st.write_stream).
+    Se `stats` (dicionário) for informado, recebe 'ttft' (tempo até o primeiro trecho),
+    'total' (tempo até o fim da resposta) e 'chunks', em segundos.
+    """
+    stats = {} if stats is None else stats
+    inicio = time.perf_counter()
+    stats.update(ttft=None, total=None, chunks=0)
+    resposta = client.chat.completions.create(messages=messages, model=model, stream=True, **kwargs)
+    for chunk in resposta:
+        texto = chunk.choices[0].delta.content if chunk.choices else None
+        if not texto:
+            continue
+        if stats['ttft'] is None:
+            stats['ttft'] = time.perf_counter() - inicio
+        stats['chunks'] += 1
+        yield texto
+    stats['total'] = time.perf_counter() - inicio
+
+
+def latency_caption(stats):
+    """Texto curto com as latências da última resposta."""
+    if not stats or stats.get('total') is None:
+        return ""
+    if stats.get('cached'):
+        texto = f"Resposta do cache em {stats['total'] * 1000:.1f} ms"
+    else:
+        ttft = stats['ttft'] if stats['ttft'] is not None else stats['total']
+        texto = f"Primeiro trecho em {ttft:.2f} s · resposta completa em {stats['total']:.2f} s"
+    if stats.get('tokens'):
+        texto += f" · ~{stats['tokens']} tokens enviados"
+    return texto
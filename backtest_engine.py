@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+def first_last_valid(values):
+    """
+    Índices da primeira e da última linha com preço (não NaN) de cada coluna.
+    Colunas sem nenhum preço recebem -1.
+    """
+    validos = ~np.isnan(values)
+    possui = validos.any(axis=0)
+    primeiro = np.where(possui, validos.argmax(axis=0), -1)
+    ultimo = np.where(possui, len(values) - 1 - validos[::-1].argmax(axis=0), -1)
+    return primeiro, ultimo
+
+
+def tickers_with_data(values, tickers):
+    """Tickers que têm ao menos um preço no recorte."""
+    return [ticker for ticker, possui in zip(tickers, (~np.isnan(values)).any(axis=0)) if possui]
+
+
+def buy_and_hold(values, dates, tickers, investment):
+    """
+    Resultado de comprar `investment` de cada ativo no primeiro preço do período e manter até o último.
+    Calculado de uma vez para todos os tickers a partir da matriz de preços (datas x tickers).
+    """
+    primeiro, ultimo = first_last_valid(values)
+    possui = primeiro >= 0
+    colunas = np.flatnonzero(possui)
+
+    preco_inicial = values[primeiro[colunas], colunas]
+    preco_final = values[ultimo[colunas], colunas]
+    retorno = (preco_final - preco_inicial) / preco_inicial
+
+    return pd.DataFrame({
+        "Ticker": [tickers[i] for i in colunas],
+        "Data Inicial": pd.DatetimeIndex(dates)[primeiro[colunas]].strftime("%Y-%m-%d"),
+        "Preço Inicial": preco_inicial,
+        "Preço Final": preco_final,
+        "Ganho": np.round(retorno * investment, 2),
+        "Retorno (%)": np.round(retorno * 100, 2),
+    })
+
+
+def yearly_returns(values, dates, tickers):
+    """
+    Variação percentual de cada ano (primeiro x último preço do ano), com um ano por linha e um ticker por coluna.
+    Anos sem dados de um ticker ficam como NaN.
+    """
+    precos = pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=tickers)
+    por_ano = precos.groupby(precos.index.year)
+    tabela = (por_ano.last() / por_ano.first() - 1) * 100
+    tabela = tabela.dropna(how='all')
+    tabela.index.name = 'Year'
+    return tabela
+
+
+def growth_curves(values, dates, tickers):
+    """
+    Crescimento percentual acumulado de cada ticker desde o seu primeiro preço no período,
+    no formato longo (Datetime, Ticker, Close, Percentual_Crescimento) usado pelos gráficos.
+    """
+    primeiro, _ = first_last_valid(values)
+    possui = primeiro >= 0
+    base = np.full(values.shape[1], np.nan)
+    base[possui] = values[primeiro[possui], np.flatnonzero(possui)]
+    crescimento = (values / base - 1) * 100
+
+    curvas = pd.DataFrame({
+        "Datetime": np.repeat(pd.DatetimeIndex(dates), len(tickers)),
+        "Ticker": np.tile(np.asarray(tickers, dtype=object), len(dates)),
+        "Close": np.asarray(values).ravel(),
+        "Percentual_Crescimento": crescimento.ravel(),
+    })
+    return curvas.dropna(subset=["Close"]).sort_values(["Ticker", "Datetime"], ignore_index=True)
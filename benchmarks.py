@@ -0,0 +1,222 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+import data_collector
+import dataset_cache
+from fetcher import FETCH_COLUMNS
+from synthetic_data import MarketSimulator, synthetic_tickers
+from price_matrix import build_price_matrix, get_price_matrix
+from backtest_engine import buy_and_hold, yearly_returns, growth_curves
+from positions import PositionBook
+from valuation import PortfolioValuation
+
+# Micro-benchmarks dos caminhos críticos de dados e análises, sem acesso à internet:
+# os preços são gerados por synthetic_data (B3, NYSE e cripto, com correlações e gaps)
+# e gravados num armazenamento temporário.
+# Cada caso (número de tickers x anos de histórico) grava o tempo mínimo e a mediana de
+# cada etapa num JSON, que pode ser comparado com o de outro commit (--compare).
+#
+#   python benchmarks.py --output bench.json
+#   python benchmarks.py --quick --output novo.json --compare bench.json
+
+TICKERS = [10, 100, 1000, 5000]
+YEARS = [5, 25]
+QUICK_TICKERS = [10, 100]
+QUICK_YEARS = [1, 5]
+INVESTMENT = 1000.0
+LANCAMENTOS_POR_TICKER = 10
+MAX_CARTEIRA_TICKERS = 200  # ativos distintos na carteira sintética
+REGRESSION_THRESHOLD = 1.2
+
+
+def synthetic_frames(n_tickers, years, seed=0):
+    """
+    Históricos diários sintéticos (synthetic_data) dos últimos `years` anos para `n_tickers` tickers
+    da B3, NYSE e cripto, no formato de FETCH_COLUMNS. Tickers sem dados no período (deslistados) ficam de fora.
+    """
+    fim = pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+    inicio = fim - pd.DateOffset(days=int(years * 365.25))
+    frames = MarketSimulator(seed).generate(synthetic_tickers(n_tickers), inicio, fim)
+    return {ticker: frame for ticker, frame in frames.items() if not frame.empty}
+
+
+class FrameSource:
+    """Fonte de dados em memória para collect_stock_data (mesma interface de YahooSource)."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def download(self, ticker, start_date, end_date, interval="1d"):
+        data = self.frames.get(ticker)
+        if data is None:
+            return pd.DataFrame(columns=FETCH_COLUMNS)
+        periodo = (data['Datetime'] >= pd.Timestamp(start_date)) & (data['Datetime'] < pd.Timestamp(end_date))
+        return data[periodo].reset_index(drop=True)
+
+
+def synthetic_lancamentos(tickers, n, end_date, seed=0):
+    """Compras aleatórias nos tickers, com preços próximos de 10 a 100, no formato do livro."""
+    rng = np.random.default_rng(seed)
+    datas = end_date - pd.to_timedelta(rng.integers(0, 5 * 365, size=n), unit='D')
+    quantidade = rng.integers(1, 100, size=n).astype(np.float64)
+    preco = rng.uniform(10, 100, size=n).round(2)
+    return pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Ativo': rng.choice(tickers, size=n),
+        'Operação': 'Compra',
+        'Quantidade': quantidade,
+        'Preço': preco,
+        'Valor': quantidade * preco,
+        'Data de Compra': datas.normalize(),
+    })
+
+
+def _time(func, repeat):
+    """Executa `func` `repeat` vezes; devolve o último resultado e os tempos mínimo e mediano (s)."""
+    tempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, {"min_s": min(tempos), "median_s": statistics.median(tempos), "repeat": repeat}
+
+
+def run_case(n_tickers, years, repeat=3, seed=0):
+    """Mede todas as etapas para um universo de `n_tickers` com `years` anos de histórico."""
+    resultados = []
+
+    def medir(nome, func, vezes=repeat, linhas=None):
+        resultado, tempos = _time(func, vezes)
+        resultados.append({"benchmark": nome, "tickers": n_tickers, "years": years,
+                           "rows": linhas(resultado) if linhas else None, **tempos})
+        return resultado
+
+    frames = synthetic_frames(n_tickers, years, seed)
+    tickers = list(frames)
+    with tempfile.TemporaryDirectory() as diretorio, contextlib.chdir(diretorio):
+        dataset_cache.invalidate()
+
+        # Coleta: transformações de collect_stock_data e gravação (uma vez, pois grava o armazenamento)
+        with contextlib.redirect_stdout(io.StringIO()):
+            medir("collect_stock_data", lambda: data_collector.collect_stock_data(
+                tickers, incremental=False, source=FrameSource(frames)), vezes=1, linhas=len)
+        medir("calcular_variacoes", lambda: [
+            data_collector.calcular_variacoes(frame.copy()) for frame in frames.values()
+        ], linhas=lambda r: sum(map(len, r)))
+
+        # Leitura do armazenamento
+        dados = medir("load_stock_data", data_collector.load_stock_data, linhas=len)
+        medir("load_stock_data[10 tickers, 1 ano]", lambda: data_collector.load_stock_data(
+            [ticker.replace('.SA', '') for ticker in tickers[:10]], start_date=dados['Datetime'].max() - pd.DateOffset(years=1)), linhas=len)
+        medir("load_stock_data[OHLCV]", lambda: data_collector.load_stock_data(
+            columns=data_collector.OHLCV_COLUMNS), linhas=len)
+
+        # Backtest: matriz de preços e cálculos da página
+        medir("build_price_matrix", lambda: build_price_matrix(dados), linhas=lambda m: m.values.size)
+        get_price_matrix()
+        matriz = medir("get_price_matrix[cache]", get_price_matrix, linhas=lambda m: m.values.size)
+        valores, datas, selecionados = matriz.select()
+        medir("buy_and_hold", lambda: buy_and_hold(valores, datas, selecionados, INVESTMENT), linhas=len)
+        medir("yearly_returns", lambda: yearly_returns(valores, datas, selecionados), linhas=len)
+        medir("growth_curves", lambda: growth_curves(valores, datas, selecionados), linhas=len)
+
+        # Carteira: posições (carregar_carteira) e avaliação diária a mercado
+        lancamentos = synthetic_lancamentos(tickers[:MAX_CARTEIRA_TICKERS], LANCAMENTOS_POR_TICKER * n_tickers,
+                                            pd.Timestamp(datas[-1]), seed)
+        posicoes = medir("PositionBook", lambda: PositionBook(lancamentos), linhas=lambda p: len(lancamentos))
+        medir("carregar_carteira[media]", lambda: posicoes.table('media'), linhas=len)
+        medir("carregar_carteira[fifo]", lambda: posicoes.table('fifo'), linhas=len)
+        avaliacao = medir("PortfolioValuation", lambda: PortfolioValuation(lancamentos),
+                          linhas=lambda a: a.market_value().size)
+        medir("PortfolioValuation.totals", avaliacao.totals, linhas=len)
+        medir("PortfolioValuation.series", avaliacao.series, linhas=lambda s: s.size)
+        dataset_cache.invalidate()
+    return resultados
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(tickers=TICKERS, years=YEARS, repeat=3, seed=0):
+    """Roda todos os casos e devolve o relatório (resultados e informações do ambiente)."""
+    resultados = []
+    for n_anos in years:
+        for n_tickers in tickers:
+            print(f"{n_tickers} tickers x {n_anos} anos...", file=sys.stderr)
+            resultados.extend(run_case(n_tickers, n_anos, repeat, seed))
+    return {
+        "commit": _commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "results": resultados,
+    }
+
+
+def compare(atual, anterior, threshold=REGRESSION_THRESHOLD):
+    """
+    Razão entre as medianas (atual / anterior) de cada benchmark presente nos dois relatórios.
+    Devolve um DataFrame ordenado da maior razão para a menor, com a coluna 'regressao'
+    indicando razões acima de `threshold`.
+    """
+    chave = ["benchmark", "tickers", "years"]
+    novo = pd.DataFrame(atual["results"]).set_index(chave)["median_s"]
+    velho = pd.DataFrame(anterior["results"]).set_index(chave)["median_s"]
+    tabela = pd.DataFrame({"anterior_s": velho, "atual_s": novo}).dropna()
+    tabela["razao"] = tabela["atual_s"] / tabela["anterior_s"]
+    tabela["regressao"] = tabela["razao"] > threshold
+    return tabela.sort_values("razao", ascending=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline dos caminhos de dados e análises.")
+    parser.add_argument("--tickers", type=int, nargs="+", help=f"tamanhos do universo (padrão: {TICKERS})")
+    parser.add_argument("--years", type=float, nargs="+", help=f"anos de histórico (padrão: {YEARS})")
+    parser.add_argument("--quick", action="store_true", help=f"casos pequenos: {QUICK_TICKERS} x {QUICK_YEARS}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="relatório JSON anterior para comparação")
+    args = parser.parse_args(argv)
+
+    tickers = args.tickers or (QUICK_TICKERS if args.quick else TICKERS)
+    years = args.years or (QUICK_YEARS if args.quick else YEARS)
+    relatorio = run(tickers, years, args.repeat, args.seed)
+    with open(args.output, "w") as f:
+        json.dump(relatorio, f, indent=2)
+
+    tabela = pd.DataFrame(relatorio["results"]).set_index(["benchmark", "tickers", "years"])
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(tabela[["rows", "min_s", "median_s"]])
+        print(f"Resultados salvos em {args.output}")
+        if args.compare:
+            with open(args.compare) as f:
+                comparacao = compare(relatorio, json.load(f))
+            print(comparacao)
+            if comparacao["regressao"].any():
+                print(f"Regressões acima de {REGRESSION_THRESHOLD:.0%} do tempo anterior: {int(comparacao['regressao'].sum())}")
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import re
+import math
+import unicodedata
+import numpy as np
+from collections import Counter, defaultdict
+
+# Contexto enviado ao modelo em cada pergunta, com tamanho limitado:
+# - a conversa entra das mensagens mais novas para as mais antigas até o orçamento de tokens;
+#   as que ficam de fora são resumidas numa única mensagem de sistema;
+# - os arquivos anexados são divididos em trechos e indexados (BM25), e só os trechos mais
+#   relevantes para a pergunta são enviados, em vez do início truncado de cada arquivo.
+# Os tokens são estimados em ~4 caracteres por token (o tokenizador do modelo não é usado).
+
+CHARS_PER_TOKEN = 4
+MAX_PROMPT_TOKENS = 6000  # llama3-8b-8192: o restante da janela fica para a resposta
+SUMMARY_TOKENS = 400
+RETRIEVAL_TOKENS = 2000
+CHUNK_TOKENS = 200
+SUMMARY_LINE_CHARS = 160
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+ROLE_LABELS = {"user": "Usuário", "assistant": "Assistente"}
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _message_tokens(message):
+    return estimate_tokens(message["content"]) + 4  # papel e separadores
+
+
+def summarize(messages, budget=SUMMARY_TOKENS):
+    """
+    Resumo extrativo das mensagens (o começo de cada uma), das mais novas para as mais antigas
+    até `budget` tokens, apresentado em ordem cronológica.
+    """
+    linhas, usados = [], 0
+    for message in reversed(messages):
+        texto = " ".join(message["content"].split())
+        if len(texto) > SUMMARY_LINE_CHARS:
+            texto = texto[:SUMMARY_LINE_CHARS] + "…"
+        linha = f"- {ROLE_LABELS.get(message['role'], message['role'])}: {texto}"
+        usados += estimate_tokens(linha)
+        if usados > budget:
+            break
+        linhas.append(linha)
+    return "\n".join(reversed(linhas))
+
+
+def build_messages(messages, budget=MAX_PROMPT_TOKENS, context=None):
+    """
+    Mensagens a enviar ao modelo, dentro de `budget` tokens estimados: as mensagens de sistema,
+    o resumo das mensagens antigas que não couberem, as mais recentes e a última pergunta,
+    acrescida de `context` (ex.: trechos dos arquivos anexados), sem alterar o histórico original.
+    Percorre só as mensagens que cabem no orçamento, então o custo não cresce com a conversa.
+    """
+    sistema = [m for m in messages if m["role"] == "system"]
+    conversa = [m for m in messages if m["role"] != "system"]
+    if not conversa:
+        return list(sistema)
+
+    ultima = dict(conversa[-1])
+    if context:
+        ultima["content"] = f"{ultima['content']}\n\n{context}"
+    restante = budget - sum(_message_tokens(m) for m in sistema) - SUMMARY_TOKENS
+    if _message_tokens(ultima) > restante:
+        ultima["content"] = ultima["content"][:max(restante, 0) * CHARS_PER_TOKEN]
+    restante -= _message_tokens(ultima)
+
+    inicio = len(conversa) - 1
+    while inicio > 0 and _message_tokens(conversa[inicio - 1]) <= restante:
+        inicio -= 1
+        restante -= _message_tokens(conversa[inicio])
+
+    resultado = list(sistema)
+    if inicio > 0:
+        # Cada linha do resumo custa ao menos um token: mais de SUMMARY_TOKENS mensagens nunca cabem
+        resumo = summarize(conversa[max(0, inicio - SUMMARY_TOKENS):inicio])
+        if resumo:
+            resultado.append({"role": "system", "content": f"Resumo das mensagens anteriores da conversa:\n{resumo}"})
+    return resultado + conversa[inicio:-1] + [ultima]
+
+
+def payload_tokens(messages):
+    """Total de tokens estimados de uma lista de mensagens."""
+    return sum(_message_tokens(m) for m in messages)
+
+
+def tokenize(text):
+    """Termos em minúsculas e sem acentos (ex.: 'Preço' e 'preco' são o mesmo termo)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"\w+", text)
+
+
+def chunk_text(text, header=None, chunk_tokens=CHUNK_TOKENS):
+    """
+    Divide o texto em trechos de até `chunk_tokens` tokens, quebrando entre linhas
+    (linhas maiores que um trecho são cortadas). `header` (ex.: o cabeçalho de um CSV)
+    é repetido no começo de cada trecho.
+    """
+    limite = chunk_tokens * CHARS_PER_TOKEN
+    prefixo = f"{header}\n" if header else ""
+    trechos, atual, tamanho = [], [], 0
+    for linha in text.splitlines():
+        while len(linha) > limite:
+            trechos.append(prefixo + linha[:limite])
+            linha = linha[limite:]
+        if atual and tamanho + len(linha) > limite:
+            trechos.append(prefixo + "\n".join(atual))
+            atual, tamanho = [], 0
+        atual.append(linha)
+        tamanho += len(linha) + 1
+    if atual and any(l.strip() for l in atual):
+        trechos.append(prefixo + "\n".join(atual))
+    return trechos
+
+
+class ChunkIndex:
+    """
+    Índice lexical (BM25) dos trechos dos arquivos anexados. Cada arquivo é indexado
+    uma única vez (pela chave informada em `add`); as buscas só percorrem os trechos
+    que contêm algum termo da pergunta.
+    """
+
+    def __init__(self):
+        self.chunks = []  # (arquivo, número do trecho, texto)
+        self._postings = defaultdict(list)  # termo -> [(trecho, frequência)]
+        self._lengths = []
+        self._keys = set()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def add(self, key, name, text, header=None):
+        """Indexa o texto do arquivo `name`; não faz nada se `key` já foi indexada."""
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        for numero, trecho in enumerate(chunk_text(text, header), start=1):
+            i = len(self.chunks)
+            termos = Counter(tokenize(trecho))
+            self.chunks.append((name, numero, trecho))
+            self._lengths.append(sum(termos.values()))
+            for termo, frequencia in termos.items():
+                self._postings[termo].append((i, frequencia))
+
+    def search(self, query, k=None):
+        """Índices dos trechos em ordem de relevância para a pergunta (só os com algum termo em comum)."""
+        if not self.chunks:
+            return []
+        n = len(self.chunks)
+        tamanhos = np.asarray(self._lengths, dtype=np.float64)
+        normalizacao = BM25_K1 * (1 - BM25_B + BM25_B * tamanhos / max(tamanhos.mean(), 1.0))
+        scores = np.zeros(n)
+        for termo in set(tokenize(query)):
+            postings = self._postings.get(termo)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            linhas, frequencias = np.asarray(postings, dtype=np.int64).T
+            scores[linhas] += idf * frequencias * (BM25_K1 + 1) / (frequencias + normalizacao[linhas])
+        candidatos = np.flatnonzero(scores > 0)
+        ordem = candidatos[np.argsort(-scores[candidatos], kind="stable")]
+        return ordem[:k].tolist() if k else ordem.tolist()
+
+    def context(self, query, budget=RETRIEVAL_TOKENS):
+        """
+        Texto com os trechos mais relevantes para a pergunta, até `budget` tokens. Se nenhum
+        trecho tiver termos da pergunta (ex.: "resuma o arquivo"), usa o começo de cada arquivo.
+        """
+        ordem = self.search(query)
+        if not ordem:
+            # Trechos iniciais de cada arquivo, intercalados
+            ordem = sorted(range(len(self.chunks)), key=lambda i: self.chunks[i][1])
+        partes, usados = [], 0
+        for i in ordem:
+            nome, numero, trecho = self.chunks[i]
+            parte = f"Arquivo: {nome} (trecho {numero})\n{trecho}"
+            custo = estimate_tokens(parte)
+            if usados + custo > budget:
+                break
+            partes.append(parte)
+            usados += custo
+        if not partes:
+            return ""
+        return "Trechos relevantes dos arquivos anexados:\n\n" + "\n\n".join(partes)
@@ -0,0 +1,168 @@
+import os
+import uuid
+import sqlite3
+import threading
+from collections import deque
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+from data_collector import DATA_DIR
+
+HISTORY_FILE = os.path.join(DATA_DIR, "conversas.db")
+RECENT_MESSAGES = 40  # mensagens mantidas em memória por conversa
+PAGE_SIZE = 10
+
+# Histórico das conversas com o assistente em SQLite: cada mensagem é gravada ao ser
+# trocada e a sessão guarda em memória só as RECENT_MESSAGES mais recentes (um buffer
+# circular), então a memória por sessão não cresce com a conversa. As mais antigas são
+# lidas do disco por páginas, e a conversa continua disponível depois de recarregar a página.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mensagens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversa TEXT NOT NULL,
+    papel TEXT NOT NULL CHECK (papel IN ('user', 'assistant')),
+    conteudo TEXT NOT NULL,
+    criada_em TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mensagens_conversa ON mensagens (conversa, id);
+"""
+
+_iniciado = set()
+_lock = threading.Lock()
+
+
+def connect():
+    """Abre uma conexão com o histórico, criando a tabela na primeira vez."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(HISTORY_FILE, timeout=30)
+    with _lock:
+        if HISTORY_FILE not in _iniciado:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _iniciado.add(HISTORY_FILE)
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Conexão cujas operações formam uma única transação."""
+    with closing(connect()) as conn:
+        with conn:
+            yield conn
+
+
+def session_id():
+    """
+    Identificador da sessão do usuário no Streamlit, mantido também no endereço da página
+    (?sessao=...) para que a conversa seja recuperada ao recarregar.
+    """
+    import streamlit as st
+    if "sessao_id" not in st.session_state:
+        st.session_state.sessao_id = st.query_params.get("sessao") or uuid.uuid4().hex
+    if st.query_params.get("sessao") != st.session_state.sessao_id:
+        st.query_params["sessao"] = st.session_state.sessao_id
+    return st.session_state.sessao_id
+
+
+def append_messages(conversa, messages):
+    """
+    Grava as mensagens (dicionários com 'role' e 'content') no fim da conversa, numa única transação.
+    Retorna os IDs gravados, na mesma ordem.
+    """
+    agora = datetime.now().isoformat(timespec="seconds")
+    with transaction() as conn:
+        return [
+            conn.execute(
+                "INSERT INTO mensagens (conversa, papel, conteudo, criada_em) VALUES (?, ?, ?, ?)",
+                (conversa, m["role"], m["content"], agora),
+            ).lastrowid
+            for m in messages
+        ]
+
+
+def load_messages(conversa, limit=PAGE_SIZE, before_id=None):
+    """
+    Até `limit` mensagens da conversa anteriores ao ID `before_id` (as mais recentes, se None),
+    em ordem cronológica, com as chaves 'id', 'role', 'content' e 'created'.
+    """
+    sql = "SELECT id, papel, conteudo, criada_em FROM mensagens WHERE conversa = ?"
+    params = [conversa]
+    if before_id is not None:
+        sql += " AND id < ?"
+        params.append(before_id)
+    with transaction() as conn:
+        linhas = conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()
+    return [{"id": i, "role": papel, "content": conteudo, "created": criada} for i, papel, conteudo, criada in reversed(linhas)]
+
+
+def count_messages(conversa):
+    with transaction() as conn:
+        return conn.execute("SELECT COUNT(*) FROM mensagens WHERE conversa = ?", (conversa,)).fetchone()[0]
+
+
+def clear_conversation(conversa):
+    with transaction() as conn:
+        conn.execute("DELETE FROM mensagens WHERE conversa = ?", (conversa,))
+
+
+class ChatHistory:
+    """
+    Conversa de uma sessão: as mensagens de sistema (definidas pela página, não gravadas) e as
+    `capacity` mensagens mais recentes em memória; todas as mensagens ficam gravadas em disco.
+    As mensagens exibidas (`page`) começam pela última página; `load_more` acrescenta a página
+    anterior, lendo do disco só essas mensagens.
+    """
+
+    def __init__(self, conversa, system=None, capacity=RECENT_MESSAGES, page_size=PAGE_SIZE):
+        self.conversa = conversa
+        self.system = list(system or [])
+        self.page_size = page_size
+        ultimas = load_messages(conversa, max(capacity, page_size))
+        self.recent = deque(({"role": m["role"], "content": m["content"]} for m in ultimas), maxlen=capacity)
+        self.total = count_messages(conversa)
+        self._paginas = 1
+        self._exibidas = ultimas[-page_size:]
+
+    @property
+    def messages(self):
+        """Mensagens de sistema seguidas das recentes, no formato da API do modelo."""
+        return self.system + list(self.recent)
+
+    def set_system(self, content):
+        self.system = [{"role": "system", "content": content}]
+
+    def append(self, *messages):
+        """Grava as mensagens e as inclui no buffer (descartando da memória as mais antigas)."""
+        messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+        ids = append_messages(self.conversa, messages)
+        self.recent.extend(messages)
+        self.total += len(messages)
+        agora = datetime.now().isoformat(timespec="seconds")
+        self._exibidas.extend({"id": i, **m, "created": agora} for i, m in zip(ids, messages))
+        # As exibidas ficam limitadas às páginas pedidas
+        del self._exibidas[:-self._paginas * self.page_size]
+
+    def last(self, role):
+        return next((m for m in reversed(self.recent) if m["role"] == role), None)
+
+    def page(self):
+        """Mensagens exibidas, em ordem cronológica (as últimas `page_size` e as páginas anteriores já carregadas)."""
+        return list(self._exibidas)
+
+    def has_more(self):
+        """Indica se há mensagens mais antigas que as exibidas."""
+        return len(self._exibidas) < self.total
+
+    def load_more(self):
+        """Carrega a página anterior às mensagens exibidas (uma consulta de `page_size` mensagens)."""
+        antes = self._exibidas[0]["id"] if self._exibidas else None
+        self._exibidas[:0] = load_messages(self.conversa, self.page_size, before_id=antes)
+        self._paginas += 1
+
+    def clear(self):
+        clear_conversation(self.conversa)
+        self.recent.clear()
+        self.total = 0
+        self._paginas = 1
+        self._exibidas = []
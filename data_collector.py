@@ -1,84 +1,409 @@
 import os
+import uuid
 import numpy as np
 import pandas as pd
-import yfinance as yf
+import pyarrow as pa
+import pyarrow.dataset as ds
 from datetime import datetime, timedelta
+from fetcher import default_source, fetch_many
 
 DATA_DIR = "data"
-CSV_FILE = os.path.join(DATA_DIR, "stocks.csv")
+CSV_FILE = os.path.join(DATA_DIR, "stocks.csv")  # formato antigo, usado apenas para migração
+STORE_DIR = os.path.join(DATA_DIR, "stocks")  # intervalo diário; os intradiários ficam em stocks_<intervalo>
+
+# Esquema tipado do armazenamento colunar (o Ticker é a coluna de partição).
+# Arquivos gravados antes da inclusão de Open/High/Low/Adj Close leem essas colunas como nulas.
+SCHEMA = pa.schema([
+    ('Datetime', pa.timestamp('ns')),
+    ('Open', pa.float64()),
+    ('High', pa.float64()),
+    ('Low', pa.float64()),
+    ('Close', pa.float64()),
+    ('Adj Close', pa.float64()),
+    ('Volume', pa.int64()),
+    ('variacao', pa.float64()),
+    ('variacao_acumulada', pa.float64()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('Ticker', pa.string())]), flavor='hive')
+STORED_COLUMNS = SCHEMA.names + ['Ticker']
+# Colunas lidas por padrão: as páginas diárias não pagam pela leitura do OHLC
+COLUMNS = ['Datetime', 'Close', 'Volume', 'variacao', 'variacao_acumulada', 'Ticker']
+OHLCV_COLUMNS = ['Datetime', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume', 'Ticker']
+
+INTERVALS = ['1d', '1h', '30m', '15m', '5m']
+# O Yahoo só fornece histórico intradiário recente: dias de histórico disponíveis por intervalo
+INTRADAY_HISTORY_DAYS = {'1h': 729, '30m': 59, '15m': 59, '5m': 59}
+
+# Tipos compactos usados em memória: Ticker categórico e float32 onde 7 dígitos bastam.
+# Close continua float64 porque é a base dos cálculos de retorno; Volume continua int64
+# (volumes diários passam de 2^24, o limite de inteiros exatos do float32) e
+# variacao_acumulada continua float64, pois acumula erro relativo ao longo do histórico.
+MEMORY_TYPES = {
+    'Open': pa.float32(),
+    'High': pa.float32(),
+    'Low': pa.float32(),
+    'variacao': pa.float32(),
+    'Ticker': pa.dictionary(pa.int32(), pa.string()),
+}
+
+START_DATE = '2000-01-01'
+
+# Linhas por row group: blocos menores permitem pular anos inteiros ao filtrar por data
+ROW_GROUP_SIZE = 1024
+# Arquivos por partição a partir dos quais as atualizações incrementais são compactadas em um só
+MAX_FRAGMENTS = 4
+
+def store_dir(interval="1d"):
+    """Diretório do armazenamento de um intervalo."""
+    if interval not in INTERVALS:
+        raise ValueError(f"Intervalo não suportado: {interval}")
+    return STORE_DIR if interval == "1d" else f"{STORE_DIR}_{interval}"
 
 def ensure_data_directory():
     """Garante que o diretório para armazenar dados existe."""
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-    if not os.path.exists(CSV_FILE):
-        columns = ['Datetime', 'Close', 'Volume', 'variacao', 'Ticker', 'day']
-        empty_df = pd.DataFrame(columns=columns)
-        empty_df.to_csv(CSV_FILE, index=False)
+    if not os.path.exists(STORE_DIR) and os.path.exists(CSV_FILE):
+        migrate_csv_store()
 
-def baixar_dados(ticker, start_date, end_date):
-    data = yf.download(
-        tickers=ticker,
-        start=start_date,
-        end=end_date,
-        interval="1d"
+def migrate_csv_store():
+    """Converte o antigo data/stocks.csv para o armazenamento particionado por Ticker."""
+    data = pd.read_csv(CSV_FILE, parse_dates=["Datetime"])
+    if data.empty:
+        return
+    save_stock_data(data)
+    print(f"Dados de {CSV_FILE} migrados para {STORE_DIR}.")
+
+def save_stock_data(data, append=False, interval="1d"):
+    """
+    Grava os dados no armazenamento colunar, uma partição por Ticker.
+    Por padrão as partições dos tickers presentes em `data` são substituídas; as demais são mantidas.
+    Com append=True as linhas são gravadas em um novo arquivo dentro da partição, sem reescrever o histórico;
+    partições que passam de MAX_FRAGMENTS arquivos são então compactadas (compact_partitions).
+    Colunas do esquema ausentes em `data` são gravadas como nulas.
+    """
+    data = data.sort_values(['Ticker', 'Datetime']).reindex(columns=STORED_COLUMNS)
+    table = pa.Table.from_pandas(
+        data,
+        schema=SCHEMA.append(pa.field('Ticker', pa.string())),
+        preserve_index=False,
+    )
+    ds.write_dataset(
+        table,
+        store_dir(interval),
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f"part-{datetime.now():%Y%m%d%H%M%S%f}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore' if append else 'delete_matching',
+        min_rows_per_group=ROW_GROUP_SIZE,
+        max_rows_per_group=ROW_GROUP_SIZE,
     )
+    _bump_version(interval)
+    if append:
+        compact_partitions(data['Ticker'].unique(), interval=interval)
+
+def compact_partitions(tickers=None, interval="1d", max_fragments=MAX_FRAGMENTS):
+    """
+    Reescreve em um único arquivo cada partição com mais de `max_fragments` arquivos
+    (um por atualização incremental), para que a leitura não precise abrir um arquivo por dia coletado.
+    Retorna os tickers compactados.
+    """
+    dataset = _dataset(interval)
+    if dataset is None:
+        return []
+    arquivos = {}
+    for fragment in dataset.get_fragments(filter=_filter(tickers)):
+        ticker = ds.get_partition_keys(fragment.partition_expression).get('Ticker')
+        arquivos[ticker] = arquivos.get(ticker, 0) + 1
+    compactar = sorted(ticker for ticker, n in arquivos.items() if ticker is not None and n > max_fragments)
+    if compactar:
+        save_stock_data(load_stock_data(compactar, columns=STORED_COLUMNS, compact=False, interval=interval),
+                        interval=interval)
+    return compactar
+
+def _version_file(interval="1d"):
+    return f"{store_dir(interval)}.version"
+
+def _bump_version(interval="1d"):
+    """Grava uma nova versão para o armazenamento do intervalo (chamada a cada gravação)."""
+    versao = uuid.uuid4().hex[:16]
+    arquivo = _version_file(interval)
+    # Grava em um arquivo temporário e renomeia, para nenhum leitor ver o arquivo pela metade
+    tmp = f"{arquivo}.{versao}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(versao)
+    os.replace(tmp, arquivo)
+    return versao
+
+def data_version(interval="1d"):
+    """
+    Identificador da versão atual dos dados armazenados.
+    Muda a cada gravação feita por save_stock_data, que grava a nova versão ao lado do
+    armazenamento (data/stocks.version); consultar a versão é a leitura de um único arquivo pequeno.
+    """
+    ensure_data_directory()
+    if not os.path.exists(store_dir(interval)):
+        return "vazio"
+    try:
+        with open(_version_file(interval)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        # Armazenamento gravado antes do arquivo de versão existir
+        return _bump_version(interval)
+
+def _dataset(interval="1d"):
+    ensure_data_directory()
+    diretorio = store_dir(interval)
+    if not os.path.exists(diretorio):
+        return None
+    return ds.dataset(diretorio, format='parquet', schema=SCHEMA.append(pa.field('Ticker', pa.string())),
+                      partitioning=PARTITIONING)
+
+def baixar_dados(ticker, start_date, end_date):
+    return default_source().download(ticker, start_date, end_date, interval="1d")
+
+
+def last_stored_rows(tickers, interval="1d"):
+    """Último registro (Datetime, Close, variacao_acumulada) de cada ticker já armazenado."""
+    # Tipos completos: o acumulado armazenado é a base do cálculo dos novos dias
+    stored = load_stock_data(tickers=tickers, columns=['Datetime', 'Close', 'variacao_acumulada', 'Ticker'],
+                             compact=False, interval=interval)
+    if stored.empty:
+        return {}
+    ultimos = stored.groupby('Ticker').tail(1).set_index('Ticker')
+    return ultimos.to_dict('index')
+
+def calcular_variacoes(dados, ultimo=None):
+    """
+    Calcula variacao e variacao_acumulada (em %).
+    Se `ultimo` (o último registro armazenado do ticker) for informado, a variação
+    do primeiro dia novo é calculada contra o fechamento armazenado e o acumulado
+    continua a partir do valor armazenado.
+    """
+    if ultimo is None:
+        dados['variacao'] = dados['Close'].pct_change()
+        dados['variacao_acumulada'] = (1 + dados['variacao']).cumprod() - 1
+    else:
+        fechamentos = pd.concat([pd.Series([ultimo['Close']]), dados['Close']], ignore_index=True)
+        dados['variacao'] = fechamentos.pct_change().iloc[1:].to_numpy()
+        acumulada_anterior = 0 if pd.isna(ultimo['variacao_acumulada']) else ultimo['variacao_acumulada'] / 100
+        dados['variacao_acumulada'] = (1 + acumulada_anterior) * (1 + dados['variacao']).cumprod() - 1
 
-    data = data.reset_index()
-    data.columns = ['Datetime','Adj Close','Close','High',	'Low',	'Open',	'Volume']
+    dados['variacao'] = (dados['variacao'] * 100).round(4)  # Em %
+    dados['variacao_acumulada'] = (dados['variacao_acumulada'] * 100).round(4)  # Em %
+    return dados
+
+def add_derived_columns(data, fields=('log_retorno', 'day', 'month', 'year')):
+    """
+    Colunas derivadas calculadas sob demanda (não são armazenadas):
+    log_retorno (log do retorno diário, em fração) e os campos de calendário day, month e year.
+    """
+    data = data.copy()
+    if 'log_retorno' in fields:
+        data['log_retorno'] = np.log1p(data['variacao'].astype(np.float64) / 100)
+    for campo in ('day', 'month', 'year'):
+        if campo in fields:
+            data[campo] = getattr(data['Datetime'].dt, campo).astype(np.int16 if campo == 'year' else np.int8)
     return data
 
-    
-def collect_stock_data(tickers, period="1d"):
-    all_data = []  
+def collect_stock_data(tickers, period="1d", incremental=True, source=None, max_workers=8, interval="1d",
+                       calls_per_second=None):
+    """
+    Coleta os dados OHLCV dos tickers no intervalo informado ('1d' ou intradiário) e grava no armazenamento.
+    No modo incremental só é baixado o trecho posterior ao último Datetime
+    armazenado de cada ticker, que é anexado ao histórico existente. Tickers
+    sem histórico são baixados desde START_DATE (ou, nos intervalos intradiários,
+    desde o início do histórico que o Yahoo disponibiliza).
+    Os downloads são feitos em paralelo por `source` (por padrão a de fetcher.default_source,
+    o Yahoo, ou dados sintéticos com MARKET_DATA_SOURCE=synthetic), limitados a `calls_per_second`
+    requisições por segundo (por padrão, o limite da fonte: 2/s no Yahoo); tickers
+    que falharem são listados em `resultado.attrs['falhas']` sem interromper a coleta.
+    """
+    all_data = []
     now = datetime.now()
 
     end_date = (now + timedelta(days=1)).strftime("%Y-%m-%d")
 
-    start_date = '2000-01-01'
+    if interval == "1d":
+        inicio_historico = START_DATE
+    else:
+        inicio_historico = (now - timedelta(days=INTRADAY_HISTORY_DAYS[interval])).strftime("%Y-%m-%d")
+
+    ultimos = last_stored_rows([acao.replace('.SA', '') for acao in tickers], interval) if incremental else {}
+    start_dates = {
+        acao: ultimos[acao.replace('.SA', '')]['Datetime'].strftime("%Y-%m-%d")
+        if acao.replace('.SA', '') in ultimos else inicio_historico
+        for acao in tickers
+    }
+
+    baixados, falhas = fetch_many(tickers, start_dates, end_date, source=source, max_workers=max_workers,
+                                  calls_per_second=calls_per_second, interval=interval)
 
     count = 0
     for acao in tickers:
-        dados_diarios = baixar_dados(acao, start_date, end_date)
-        dados_diarios['variacao'] = dados_diarios['Close'].pct_change()
+        if acao not in baixados:
+            print(f'Falha ao coletar {acao}: {falhas[acao]}')
+            continue
+
+        ticker = acao.replace('.SA', '')
+        ultimo = ultimos.get(ticker)
 
-        dados_diarios['variacao_acumulada'] = (1 + dados_diarios['variacao']).cumprod() - 1
+        dados_diarios = baixados[acao]
+        dados_diarios['Datetime'] = pd.to_datetime(dados_diarios['Datetime'])
+        if ultimo:
+            dados_diarios = dados_diarios[dados_diarios['Datetime'] > ultimo['Datetime']].reset_index(drop=True)
+            if dados_diarios.empty:
+                print(f'Ação {ticker} já está atualizada')
+                continue
 
-        dados_diarios['variacao'] = dados_diarios['variacao'].apply(lambda x: round(x * 100, 4))  # Em %
-        dados_diarios['variacao_acumulada'] = dados_diarios['variacao_acumulada'].apply(lambda x: round(x * 100, 4))  # Em %
+        dados_diarios = calcular_variacoes(dados_diarios, ultimo)
 
-        dados_diarios = dados_diarios.loc[:, ['Datetime', 'Close', 'Volume', 'variacao', 'variacao_acumulada']]
-        dados_diarios['Ticker'] = acao.replace('.SA', '') 
+        dados_diarios = dados_diarios.loc[:, SCHEMA.names]
+        dados_diarios['Ticker'] = ticker
         count = count + 1
-        try:
-            print(f'Coletados Dados Diarios da Ação {dados_diarios["Ticker"][0]}')
-        except:
-            return 
+        print(f'Coletados Dados Diarios da Ação {ticker}')
         print(f'Total de ações: {count}')
-        
+
         all_data.append(dados_diarios)
     if all_data:
         combined_data = pd.concat(all_data, ignore_index=False)
         combined_data['Datetime'] = pd.to_datetime(combined_data['Datetime'])
-        combined_data['day'] = combined_data['Datetime'].dt.day
 
-        combined_data.to_csv(CSV_FILE, index=False)
-        print(f"Dados coletados e salvos em {CSV_FILE}.")
-        return combined_data
-    
+        ensure_data_directory()
+        # Tickers que já têm histórico armazenado recebem só o trecho novo, anexado às suas partições;
+        # os demais (sem histórico, ou em coleta não incremental) têm a partição inteira gravada
+        existentes = combined_data['Ticker'].isin(ultimos.keys())
+        if existentes.any():
+            save_stock_data(combined_data[existentes], append=True, interval=interval)
+        if not existentes.all():
+            save_stock_data(combined_data[~existentes], interval=interval)
+        print(f"Dados coletados e salvos em {store_dir(interval)}.")
+
     else:
-        print("Nenhum dado coletado. Verifique os tickers e a conexão.")
-        return pd.DataFrame()
-def load_stock_data():
+        print("Nenhum dado novo coletado.")
+        combined_data = pd.DataFrame()
+
+    combined_data.attrs['falhas'] = falhas
+    return combined_data
+
+def list_tickers(interval="1d"):
+    """Lista os tickers armazenados lendo apenas os nomes das partições."""
+    dataset = _dataset(interval)
+    if dataset is None:
+        return []
+    tickers = set()
+    for fragment in dataset.get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        if 'Ticker' in keys:
+            tickers.add(keys['Ticker'])
+    return sorted(tickers)
+
+def date_bounds(tickers=None, interval="1d"):
+    """Retorna (data mínima, data máxima) armazenadas, lendo somente a coluna Datetime."""
+    data = load_stock_data(tickers=tickers, columns=['Datetime'], interval=interval)
+    if data.empty:
+        return None, None
+    return data['Datetime'].min(), data['Datetime'].max()
+
+def load_stock_data(tickers=None, start_date=None, end_date=None, columns=None, compact=True, interval="1d"):
     """
-    Carrega os dados do CSV.
+    Carrega os dados do armazenamento colunar.
+    Os filtros de ticker e de período são aplicados na leitura: só as partições
+    e row groups necessários são lidos do disco.
+    Com compact=True as colunas usam os tipos de MEMORY_TYPES (Ticker categórico, float32).
+    Por padrão são lidas as colunas de COLUMNS; use columns=OHLCV_COLUMNS para o OHLC completo.
+    Colunas derivadas podem ser obtidas com add_derived_columns().
     Certifique-se de que os dados já tenham sido coletados com collect_stock_data().
     """
-    if not os.path.exists(CSV_FILE):
-        ensure_data_directory()
-    
-    data = pd.read_csv(CSV_FILE, parse_dates=["Datetime"])
-    
-    return data
+    dataset = _dataset(interval)
+    columns = columns or COLUMNS
+    if dataset is None:
+        return pd.DataFrame(columns=columns)
+
+    filtro = _filter(tickers, start_date, end_date)
+    table = dataset.to_table(columns=columns, filter=filtro)
+    if {'Ticker', 'Datetime'}.issubset(table.column_names):
+        table = table.sort_by([('Ticker', 'ascending'), ('Datetime', 'ascending')])
+    if compact:
+        for coluna, tipo in MEMORY_TYPES.items():
+            if coluna in table.column_names:
+                indice = table.column_names.index(coluna)
+                table = table.set_column(indice, coluna, table.column(coluna).cast(tipo, safe=False))
+
+    return table.to_pandas()
+
+def _filter(tickers=None, start_date=None, end_date=None):
+    """Expressão de filtro do pyarrow para ticker e período (usada para pular partições e row groups)."""
+    filtro = None
+    if tickers is not None:
+        # Lista tipada: uma seleção vazia não tem tipo inferível e o pyarrow a rejeitaria
+        filtro = ds.field('Ticker').isin(pa.array(list(tickers), pa.string()))
+    if start_date is not None:
+        condicao = ds.field('Datetime') >= pd.Timestamp(start_date)
+        filtro = condicao if filtro is None else filtro & condicao
+    if end_date is not None:
+        condicao = ds.field('Datetime') <= pd.Timestamp(end_date)
+        filtro = condicao if filtro is None else filtro & condicao
+    return filtro
+
+def _aggregate_bars(data, rule):
+    """Agrega barras OHLCV por (Ticker, período), guardando o instante da primeira e da última barra."""
+    data = data.assign(Periodo=data['Datetime'].dt.to_period(rule).dt.start_time)
+    grupos = data.groupby(['Ticker', 'Periodo'], sort=False, observed=True)
+    primeiro = data.loc[grupos['Datetime'].idxmin()].set_index(['Ticker', 'Periodo'])
+    ultimo = data.loc[grupos['Datetime'].idxmax()].set_index(['Ticker', 'Periodo'])
+    return pd.DataFrame({
+        'Inicio': primeiro['Datetime'],
+        'Open': primeiro['Open'],
+        'High': grupos['High'].max(),
+        'Low': grupos['Low'].min(),
+        'Fim': ultimo['Datetime'],
+        'Close': ultimo['Close'],
+        'Adj Close': ultimo['Adj Close'],
+        'Volume': grupos['Volume'].sum(),
+    })
+
+def _merge_bars(parciais):
+    """Combina agregados parciais do mesmo (Ticker, período) vindos de lotes diferentes."""
+    parciais = pd.concat(parciais)
+    grupos = parciais.groupby(level=['Ticker', 'Periodo'], sort=False)
+    por_inicio = parciais.sort_values('Inicio')
+    por_fim = parciais.sort_values('Fim')
+    return pd.DataFrame({
+        'Inicio': grupos['Inicio'].min(),
+        'Open': por_inicio.groupby(level=['Ticker', 'Periodo'], sort=False)['Open'].first(),
+        'High': grupos['High'].max(),
+        'Low': grupos['Low'].min(),
+        'Fim': grupos['Fim'].max(),
+        'Close': por_fim.groupby(level=['Ticker', 'Periodo'], sort=False)['Close'].last(),
+        'Adj Close': por_fim.groupby(level=['Ticker', 'Periodo'], sort=False)['Adj Close'].last(),
+        'Volume': grupos['Volume'].sum(),
+    })
+
+def resample_bars(rule="W", tickers=None, start_date=None, end_date=None, interval="1d", batch_size=65_536):
+    """
+    Agrega as barras armazenadas em barras semanais ('W'), mensais ('M') etc. (regras de período do pandas).
+    Os dados são lidos em lotes e cada lote é reduzido a agregados parciais por (Ticker, período),
+    então a memória usada é proporcional ao número de barras de saída, não ao histórico bruto.
+    Retorna Datetime (início do período), Open, High, Low, Close, Adj Close, Volume e Ticker.
+    """
+    dataset = _dataset(interval)
+    if dataset is None:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    parciais = []
+    for lote in dataset.to_batches(columns=OHLCV_COLUMNS, filter=_filter(tickers, start_date, end_date),
+                                   batch_size=batch_size):
+        if lote.num_rows == 0:
+            continue
+        parciais.append(_aggregate_bars(lote.to_pandas(), rule))
+        # Consolida de tempos em tempos para a lista de parciais não crescer com o histórico
+        if len(parciais) >= 64:
+            parciais = [_merge_bars(parciais)]
 
+    if not parciais:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    parciais = _merge_bars(parciais)
+    barras = parciais.drop(columns=['Inicio', 'Fim']).reset_index().rename(columns={'Periodo': 'Datetime'})
+    return barras.sort_values(['Ticker', 'Datetime'], ignore_index=True)[OHLCV_COLUMNS]
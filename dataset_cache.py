@@ -0,0 +1,136 @@
+import threading
+import pandas as pd
+from collections import OrderedDict
+
+from data_collector import load_stock_data, list_tickers, date_bounds, data_version, resample_bars
+
+# Cache único do processo para os dados de ações, compartilhado por todas as páginas
+# e sessões. As entradas são indexadas pela versão dos dados (data_version), então
+# qualquer coleta que altere o armazenamento as invalida automaticamente.
+# As leituras do disco acontecem fora da trava: sessões que pedem outras entradas não esperam,
+# e pedidos simultâneos da mesma entrada aguardam a leitura em andamento em vez de repeti-la.
+
+MAX_ENTRIES = 64
+
+_entries = OrderedDict()
+_inflight = {}  # (versão, chave) -> Event da leitura em andamento
+_lock = threading.Lock()
+_version = None
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _normalize(values):
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return (values,)
+    return tuple(sorted(set(values)))
+
+
+def _timestamp(value):
+    return None if value is None else pd.Timestamp(value)
+
+
+def _check_version():
+    """Descarta todas as entradas se os dados armazenados mudaram desde a última consulta."""
+    global _version
+    version = data_version()
+    if version != _version:
+        if _version is not None:
+            _stats["invalidations"] += 1
+        _entries.clear()
+        _version = version
+    return version
+
+
+def _cached(key, loader):
+    while True:
+        with _lock:
+            version = _check_version()
+            if key in _entries:
+                _stats["hits"] += 1
+                _entries.move_to_end(key)
+                return _entries[key]
+            evento = _inflight.get((version, key))
+            if evento is None:
+                _stats["misses"] += 1
+                evento = _inflight[(version, key)] = threading.Event()
+                break
+        # Outra sessão já está lendo esta entrada: espera e consulta o cache de novo
+        # (se a leitura dela falhou, esta sessão tenta ler)
+        evento.wait()
+
+    try:
+        value = loader()
+        with _lock:
+            # Só guarda se os dados não mudaram durante a leitura
+            if _version == version:
+                _entries[key] = value
+                if len(_entries) > MAX_ENTRIES:
+                    _entries.popitem(last=False)
+        return value
+    finally:
+        with _lock:
+            _inflight.pop((version, key), None)
+        evento.set()
+
+
+def get_dataset(tickers=None, start_date=None, end_date=None, columns=None):
+    """
+    Mesmos parâmetros de load_stock_data, mas lido do disco apenas uma vez por versão dos dados.
+    O DataFrame devolvido é compartilhado entre sessões; não o altere.
+    """
+    tickers, columns = _normalize(tickers), _normalize(columns)
+    start_date, end_date = _timestamp(start_date), _timestamp(end_date)
+    return _cached(
+        ("dataset", tickers, start_date, end_date, columns),
+        lambda: load_stock_data(tickers, start_date, end_date, list(columns) if columns else None),
+    )
+
+
+def slice_dates(frame, start_date=None, end_date=None):
+    """
+    Linhas de um DataFrame do cache (coluna Datetime) entre as datas, inclusive, sem ler o disco:
+    permite guardar um recorte por tickers e fatiar o período em memória.
+    """
+    datas = frame['Datetime']
+    periodo = pd.Series(True, index=frame.index)
+    if start_date is not None:
+        periodo &= datas >= pd.Timestamp(start_date)
+    if end_date is not None:
+        periodo &= datas <= pd.Timestamp(end_date)
+    return frame[periodo]
+
+
+def get_bars(rule, tickers=None, start_date=None, end_date=None):
+    """Barras OHLCV agregadas por resample_bars (ex.: rule='W' semanal, 'M' mensal), uma vez por versão dos dados."""
+    tickers = _normalize(tickers)
+    start_date, end_date = _timestamp(start_date), _timestamp(end_date)
+    return _cached(
+        ("bars", rule, tickers, start_date, end_date),
+        lambda: resample_bars(rule, tickers, start_date, end_date),
+    )
+
+
+def get_tickers():
+    return _cached(("tickers",), list_tickers)
+
+
+def get_date_bounds(tickers=None):
+    tickers = _normalize(tickers)
+    return _cached(("date_bounds", tickers), lambda: date_bounds(tickers))
+
+
+def invalidate():
+    """Descarta o cache manualmente (a mudança de versão dos dados já faz isso automaticamente)."""
+    global _version
+    with _lock:
+        _entries.clear()
+        _version = None
+        _stats["invalidations"] += 1
+
+
+def cache_stats():
+    """Contadores de acertos, faltas e invalidações, mais a versão e o número de entradas atuais."""
+    with _lock:
+        return {**_stats, "entries": len(_entries), "version": _version}
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# Redução de pontos antes de desenhar os gráficos: o navegador recebe no máximo
+# alguns milhares de pontos por série, qualquer que seja o tamanho do histórico.
+
+MAX_POINTS = 1500
+
+
+def points_for_range(start_date, end_date, max_points=MAX_POINTS):
+    """Resolução do gráfico: um ponto por dia do intervalo, limitado a `max_points`."""
+    dias = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+    return int(max(2, min(dias, max_points)))
+
+
+def _argmax_per_bucket(valores, limites, n):
+    """Índice do maior valor de cada bucket (buckets contíguos começando em `limites`)."""
+    maximos = np.maximum.reduceat(valores, limites)
+    bucket = np.repeat(np.arange(len(limites)), np.diff(np.append(limites, n)))
+    posicoes = np.flatnonzero(valores == maximos[bucket])
+    indices = np.full(len(limites), n, dtype=np.int64)
+    np.minimum.at(indices, bucket[posicoes], posicoes)
+    return indices
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: índices dos pontos que preservam o formato visual da série.
+    Mantém o primeiro e o último ponto; de cada bucket intermediário escolhe o ponto que forma o
+    maior triângulo com a média do bucket anterior e a média do bucket seguinte. Usar a média
+    do bucket anterior (em vez do ponto escolhido nele) permite calcular todos os buckets de uma vez.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    limites = np.unique(np.linspace(1, n - 1, n_out - 1).astype(np.int64)[:-1])
+    tamanhos = np.diff(np.append(limites, n - 1))
+    media_x = np.add.reduceat(x[1:n - 1], limites - 1) / tamanhos
+    media_y = np.add.reduceat(y[1:n - 1], limites - 1) / tamanhos
+
+    # Vizinhos de cada bucket: média do anterior (ou o primeiro ponto) e do seguinte (ou o último)
+    ax = np.concatenate([[x[0]], media_x[:-1]])
+    ay = np.concatenate([[y[0]], media_y[:-1]])
+    cx = np.concatenate([media_x[1:], [x[-1]]])
+    cy = np.concatenate([media_y[1:], [y[-1]]])
+
+    bucket = np.repeat(np.arange(len(limites)), tamanhos)
+    xi, yi = x[1:n - 1], y[1:n - 1]
+    area = np.abs((ax[bucket] - cx[bucket]) * (yi - ay[bucket]) - (ax[bucket] - xi) * (cy[bucket] - ay[bucket]))
+    area = np.where(np.isnan(area), -np.inf, area)
+
+    escolhidos = _argmax_per_bucket(area, limites - 1, n - 2) + 1
+    return np.concatenate([[0], escolhidos, [n - 1]])
+
+
+def minmax(y, n_buckets):
+    """Índices do mínimo e do máximo de cada bucket; mais barato que o LTTB e preserva os picos."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    limites = np.unique(np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1])
+    idx_max = _argmax_per_bucket(np.where(np.isnan(y), -np.inf, y), limites, n)
+    idx_min = _argmax_per_bucket(np.where(np.isnan(y), -np.inf, -y), limites, n)
+    return np.unique(np.concatenate([idx_min, idx_max, [0, n - 1]]))
+
+
+def downsample_frame(data, x, y, n_points, group=None, method="lttb"):
+    """
+    Reduz um DataFrame a cerca de `n_points` pontos por série antes de plotar.
+    Com `group` (ex.: 'Ticker') cada série do formato longo é reduzida separadamente.
+    """
+    if data.empty:
+        return data
+    if group is not None:
+        partes = [downsample_frame(parte, x, y, n_points, method=method)
+                  for _, parte in data.groupby(group, sort=False, observed=True)]
+        return pd.concat(partes, ignore_index=True)
+
+    data = data.dropna(subset=[y])
+    if len(data) <= n_points:
+        return data
+    if method == "lttb":
+        eixo_x = pd.to_datetime(data[x]).astype("int64") if np.issubdtype(data[x].dtype, np.datetime64) else data[x]
+        indices = lttb(eixo_x.to_numpy(), data[y].to_numpy(), n_points)
+    else:
+        indices = minmax(data[y].to_numpy(), n_points // 2)
+    return data.iloc[indices]
@@ -0,0 +1,136 @@
+import os
+import time
+import random
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Colunas no formato devolvido por baixar_dados
+FETCH_COLUMNS = ['Datetime', 'Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']
+
+
+class YahooSource:
+    """Fonte de dados do Yahoo Finance."""
+
+    # Limite padrão de requisições por segundo (conservador, para não ser bloqueado pelo Yahoo)
+    calls_per_second = 2.0
+
+    def download(self, ticker, start_date, end_date, interval="1d"):
+        import yfinance as yf
+
+        # yf.Ticker().history é seguro para uso em threads, ao contrário de yf.download
+        data = yf.Ticker(ticker).history(
+            start=start_date,
+            end=end_date,
+            interval=interval,
+            auto_adjust=False,
+        )
+        if data.empty:
+            return pd.DataFrame(columns=FETCH_COLUMNS)
+
+        data = data.reset_index()
+        data = data.rename(columns={data.columns[0]: 'Datetime'})
+        data['Datetime'] = pd.to_datetime(data['Datetime']).dt.tz_localize(None)
+        return data[FETCH_COLUMNS]
+
+
+class LocalFileSource:
+    """
+    Fonte de dados local: lê <diretorio>/<ticker>.csv com as colunas de FETCH_COLUMNS.
+    Substitui o Yahoo em testes e em máquinas sem acesso à internet.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def download(self, ticker, start_date, end_date, interval="1d"):
+        path = os.path.join(self.directory, f"{ticker}.csv")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=FETCH_COLUMNS)
+
+        data = pd.read_csv(path, parse_dates=['Datetime'])
+        data = data[(data['Datetime'] >= pd.Timestamp(start_date)) & (data['Datetime'] < pd.Timestamp(end_date))]
+        return data[FETCH_COLUMNS].reset_index(drop=True)
+
+
+def default_source():
+    """
+    Fonte usada quando nenhuma é informada, escolhida pela variável de ambiente MARKET_DATA_SOURCE:
+    'yahoo' (padrão), 'synthetic' (dados gerados por synthetic_data, sem internet)
+    ou 'local:<diretorio>' (arquivos CSV lidos por LocalFileSource).
+    """
+    escolha = os.getenv("MARKET_DATA_SOURCE", "yahoo")
+    if escolha == "synthetic":
+        from synthetic_data import SyntheticSource
+        return SyntheticSource()
+    if escolha.startswith("local:"):
+        return LocalFileSource(escolha[len("local:"):])
+    if escolha != "yahoo":
+        raise ValueError(f"MARKET_DATA_SOURCE desconhecida: {escolha}")
+    return YahooSource()
+
+
+class RateLimiter:
+    """Limita o número de requisições por segundo compartilhado entre as threads."""
+
+    def __init__(self, calls_per_second):
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_call = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def fetch_with_retry(source, ticker, start_date, end_date, retries=3, backoff=1.0, limiter=None, interval="1d"):
+    """Baixa um ticker tentando novamente com espera exponencial. Dados vazios contam como falha."""
+    for tentativa in range(retries):
+        if limiter is not None:
+            limiter.wait()
+        try:
+            data = source.download(ticker, start_date, end_date, interval)
+            if data.empty:
+                raise ValueError("nenhum dado retornado")
+            return data
+        except Exception:
+            if tentativa == retries - 1:
+                raise
+            time.sleep(backoff * 2 ** tentativa + random.uniform(0, backoff))
+
+
+def fetch_many(tickers, start_dates, end_date, source=None, max_workers=8, retries=3, backoff=1.0,
+               calls_per_second=None, interval="1d"):
+    """
+    Baixa vários tickers em paralelo.
+    start_dates pode ser uma data única ou um dicionário {ticker: data inicial}.
+    Sem `calls_per_second`, vale o limite da fonte (atributo calls_per_second; fontes locais não têm limite).
+    Retorna (dados, falhas): {ticker: DataFrame} e {ticker: mensagem de erro}.
+    """
+    source = source or default_source()
+    if calls_per_second is None:
+        calls_per_second = getattr(source, 'calls_per_second', None)
+    limiter = RateLimiter(calls_per_second)
+    if not isinstance(start_dates, dict):
+        start_dates = {ticker: start_dates for ticker in tickers}
+
+    dados, falhas = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_with_retry, source, ticker, start_dates[ticker], end_date,
+                            retries, backoff, limiter, interval): ticker
+            for ticker in tickers
+        }
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                dados[ticker] = future.result()
+            except Exception as e:
+                falhas[ticker] = str(e)
+    return dados, falhas
@@ -0,0 +1,75 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Câmbio: a cotação diária do dólar em reais (BRL=X no Yahoo) é coletada e armazenada
+# como qualquer outro ticker, e a conversão é feita sobre a matriz de preços inteira.
+
+FX_TICKER = 'BRL=X'  # preço de 1 USD em BRL
+CURRENCIES = ['BRL', 'USD']
+BRL_INDEXES = {'^BVSP'}
+
+_B3 = re.compile(r'^[A-Z]{4}\d{1,2}$')
+
+
+def currency_of(ticker):
+    """
+    Moeda de cotação de um ticker: BRL para os ativos da B3 (com ou sem o sufixo .SA)
+    e índices brasileiros; USD para os demais (ações americanas, criptomoedas -USD, etc.).
+    A própria série de câmbio não tem moeda (None).
+    """
+    ticker = str(ticker)
+    if ticker == FX_TICKER:
+        return None
+    if ticker.endswith('.SA') or _B3.match(ticker) or ticker in BRL_INDEXES:
+        return 'BRL'
+    return 'USD'
+
+
+def fx_rate(matrix):
+    """
+    Cotação do dólar em reais alinhada às datas da matriz (último valor conhecido em cada dia;
+    NaN antes do início da série). Levanta ValueError se a série de câmbio não foi coletada.
+    """
+    if FX_TICKER not in matrix.columns:
+        raise ValueError(f"A cotação do dólar ({FX_TICKER}) não foi coletada. Colete os dados novamente.")
+    return pd.Series(np.asarray(matrix.values)[:, matrix.columns[FX_TICKER]]).ffill().to_numpy()
+
+
+def _factors(currencies, rate, currency):
+    """Fator de conversão elemento a elemento (com broadcasting) de `currencies` para `currency`."""
+    currencies = np.asarray(currencies, dtype=object)
+    rate = np.asarray(rate, dtype=np.float64)
+    if currency == 'BRL':
+        return np.where(currencies == 'USD', rate, 1.0)
+    if currency == 'USD':
+        return np.where(currencies == 'BRL', 1 / rate, 1.0)
+    raise ValueError(f"Moeda não suportada: {currency}")
+
+
+def conversion_factors(currencies, rate, currency):
+    """
+    Fatores (dias x ativos) que levam preços nas moedas `currencies` para `currency`.
+    `rate` é a cotação do dólar em reais de cada dia.
+    """
+    return _factors(np.asarray(currencies, dtype=object)[None, :], np.asarray(rate, dtype=np.float64)[:, None], currency)
+
+
+def convert_values(values, tickers, rate, currency):
+    """Converte a matriz de preços (datas x tickers) para `currency` de uma só vez."""
+    return np.asarray(values, dtype=np.float64) * conversion_factors([currency_of(t) for t in tickers], rate, currency)
+
+
+def convert_amounts(amounts, currencies, rate, currency):
+    """Converte valores avulsos (ex.: lançamentos), cada um com sua moeda e a cotação do seu dia."""
+    return np.asarray(amounts, dtype=np.float64) * _factors(currencies, rate, currency)
+
+
+def rate_at(matrix, dates):
+    """
+    Cotação do dólar em reais em cada data (a última disponível até a data).
+    Datas anteriores ao início da série usam a primeira cotação disponível.
+    """
+    taxa = pd.Series(fx_rate(matrix)).bfill().to_numpy()
+    linhas = matrix.dates.searchsorted(pd.DatetimeIndex(dates), side='right') - 1
+    return taxa[np.maximum(linhas, 0)]
@@ -0,0 +1,336 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from contextlib import closing, contextmanager
+
+from data_collector import DATA_DIR
+
+LEDGER_FILE = os.path.join(DATA_DIR, "lancamentos.db")
+CSV_FILE = os.path.join(DATA_DIR, "lancamentos.csv")  # formato antigo, usado apenas para migração
+COLUNAS = ['ID', 'Ativo', 'Operação', 'Quantidade', 'Preço', 'Valor', 'Data de Compra']
+OPERACOES = ['Compra', 'Venda']
+
+# Livro de lançamentos em SQLite: cada inclusão, alteração ou remoção é uma transação
+# de uma única linha, então o custo de uma edição não depende do tamanho do histórico
+# e duas sessões editando ao mesmo tempo não sobrescrevem o trabalho uma da outra.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lancamentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ativo TEXT NOT NULL,
+    quantidade REAL NOT NULL,
+    preco REAL NOT NULL,
+    valor REAL NOT NULL,
+    data_compra TEXT NOT NULL,
+    operacao TEXT NOT NULL DEFAULT 'Compra' CHECK (operacao IN ('Compra', 'Venda'))
+);
+CREATE INDEX IF NOT EXISTS idx_lancamentos_ativo ON lancamentos (ativo, data_compra);
+CREATE INDEX IF NOT EXISTS idx_lancamentos_data ON lancamentos (data_compra);
+CREATE TABLE IF NOT EXISTS revisao (id INTEGER PRIMARY KEY CHECK (id = 1), numero INTEGER NOT NULL);
+INSERT OR IGNORE INTO revisao (id, numero) VALUES (1, 0);
+"""
+
+_iniciado = set()
+_lock = threading.Lock()
+
+_CAMPOS = {'Ativo': 'ativo', 'Operação': 'operacao', 'Quantidade': 'quantidade', 'Preço': 'preco', 'Data de Compra': 'data_compra'}
+
+
+def connect():
+    """Abre uma conexão com o livro, criando as tabelas (e migrando o CSV antigo) na primeira vez."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(LEDGER_FILE, timeout=30)
+    with _lock:
+        if LEDGER_FILE not in _iniciado:
+            # WAL: leituras não bloqueiam a escrita de outra sessão
+            conn.execute("PRAGMA journal_mode=WAL")
+            vazio = conn.execute("SELECT name FROM sqlite_master WHERE name = 'lancamentos'").fetchone() is None
+            conn.executescript(_SCHEMA)
+            # Livros criados antes das vendas não têm a coluna da operação
+            colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(lancamentos)")]
+            if 'operacao' not in colunas:
+                conn.execute("ALTER TABLE lancamentos ADD COLUMN operacao TEXT NOT NULL DEFAULT 'Compra'")
+                conn.commit()
+            if vazio and os.path.exists(CSV_FILE):
+                migrate_csv_ledger(conn)
+            _iniciado.add(LEDGER_FILE)
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Conexão cujas operações formam uma única transação: tudo é gravado ao final, ou nada em caso de erro."""
+    with closing(connect()) as conn:
+        with conn:
+            yield conn
+
+
+def migrate_csv_ledger(conn):
+    """Copia o antigo data/lancamentos.csv para o livro, preservando a ordem como ordem dos IDs."""
+    data = pd.read_csv(CSV_FILE)
+    if data.empty:
+        return
+    with conn:
+        conn.executemany(
+            "INSERT INTO lancamentos (ativo, quantidade, preco, valor, data_compra) VALUES (?, ?, ?, ?, ?)",
+            data[['Ativo', 'Quantidade', 'Preço', 'Valor', 'Data de Compra']].itertuples(index=False, name=None),
+        )
+        _bump(conn)
+    print(f"Lançamentos de {CSV_FILE} migrados para {LEDGER_FILE}.")
+
+
+def _bump(conn):
+    conn.execute("UPDATE revisao SET numero = numero + 1 WHERE id = 1")
+
+
+def _data(valor):
+    return pd.Timestamp(valor).strftime("%Y-%m-%d")
+
+
+def revision():
+    """Número que aumenta a cada alteração do livro; permite a uma sessão saber se sua cópia está atual."""
+    with transaction() as conn:
+        return conn.execute("SELECT numero FROM revisao WHERE id = 1").fetchone()[0]
+
+
+def list_lancamentos(ativo=None):
+    """Lançamentos (todos ou de um ativo) em ordem de ID, com as colunas de COLUNAS."""
+    sql = "SELECT id, ativo, operacao, quantidade, preco, valor, data_compra FROM lancamentos"
+    params = ()
+    if ativo is not None:
+        sql += " WHERE ativo = ?"
+        params = (ativo,)
+    with transaction() as conn:
+        linhas = conn.execute(sql + " ORDER BY id", params).fetchall()
+    return pd.DataFrame(linhas, columns=COLUNAS)
+
+
+def add_lancamento(ativo, quantidade, preco, data_compra, operacao='Compra'):
+    """Inclui um lançamento (operação 'Compra' ou 'Venda') e devolve o seu ID."""
+    if operacao not in OPERACOES:
+        raise ValueError(f"Operação desconhecida: {operacao}")
+    with transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO lancamentos (ativo, operacao, quantidade, preco, valor, data_compra) VALUES (?, ?, ?, ?, ?, ?)",
+            (ativo, operacao, float(quantidade), float(preco), float(quantidade) * float(preco), _data(data_compra)),
+        )
+        _bump(conn)
+        return cursor.lastrowid
+
+
+def update_lancamento(id_lancamento, **campos):
+    """
+    Altera somente os campos informados de um lançamento (Ativo, Operação, Quantidade, Preço, Data de Compra),
+    recalculando o Valor na mesma instrução. Levanta KeyError se o ID não existir.
+    """
+    campos = {_CAMPOS[nome]: (_data(valor) if nome == 'Data de Compra' else valor) for nome, valor in campos.items()}
+    if not campos:
+        return
+    atribuicoes = ", ".join(f"{coluna} = ?" for coluna in campos)
+    # O lado direito do SET enxerga os valores antigos da linha; o Valor usa os novos quando informados
+    quantidade = "?" if 'quantidade' in campos else "quantidade"
+    preco = "?" if 'preco' in campos else "preco"
+    parametros_valor = [campos[c] for c in ('quantidade', 'preco') if c in campos]
+    with transaction() as conn:
+        cursor = conn.execute(
+            f"UPDATE lancamentos SET {atribuicoes}, valor = {quantidade} * {preco} WHERE id = ?",
+            (*campos.values(), *parametros_valor, int(id_lancamento)),
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(f"Lançamento {id_lancamento} não encontrado")
+        _bump(conn)
+
+
+def delete_lancamento(id_lancamento):
+    """Remove um lançamento. Levanta KeyError se o ID não existir."""
+    with transaction() as conn:
+        cursor = conn.execute("DELETE FROM lancamentos WHERE id = ?", (int(id_lancamento),))
+        if cursor.rowcount == 0:
+            raise KeyError(f"Lançamento {id_lancamento} não encontrado")
+        _bump(conn)
+
+
+# Importação de extratos de corretora / B3: nomes de coluna aceitos para cada campo do livro
+IMPORT_ALIASES = {
+    'Ativo': ['Ativo', 'Código de Negociação', 'Codigo de Negociacao', 'Produto', 'Ticker'],
+    'Quantidade': ['Quantidade', 'Qtd', 'Qtde'],
+    'Preço': ['Preço', 'Preco', 'Preço Unitário', 'Preço unitário', 'Preco Unitario'],
+    'Data de Compra': ['Data de Compra', 'Data do Negócio', 'Data do Negocio', 'Data'],
+    'Operação': ['Operação', 'Operacao', 'Tipo de Movimentação', 'Tipo de Movimentacao', 'Compra/Venda', 'C/V'],
+    # Extrato de movimentação da B3: o sentido vem de Entrada/Saída e o tipo de evento de Movimentação
+    'Entrada/Saída': ['Entrada/Saída', 'Entrada/Saida', 'Entrada / Saída', 'Entrada / Saida'],
+    'Movimentação': ['Movimentação', 'Movimentacao'],
+}
+# Campos opcionais; ao menos um dos campos de IMPORT_OPERATION_FIELDS é exigido
+IMPORT_OPTIONAL = ('Operação', 'Entrada/Saída', 'Movimentação')
+IMPORT_OPERATION_FIELDS = ('Operação', 'Entrada/Saída')
+# Movimentações da B3 que são negociações; as demais (proventos, desdobramentos, transferências
+# de custódia etc.) não entram no livro
+B3_TRADE_MOVEMENTS = ['transferência - liquidação', 'transferencia - liquidacao', 'compra / venda', 'compra', 'venda']
+NOT_A_TRADE = "movimentação sem negociação"
+IMPORT_CHUNK_SIZE = 50_000
+MAX_REJECTED_REPORT = 1_000
+_CHAVE = ['ativo', 'operacao', 'quantidade', 'preco', 'data_compra']
+
+
+def _sniff_separator(file):
+    """';' (padrão dos extratos brasileiros, com vírgula decimal) ou ','."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, encoding='utf-8', errors='ignore') as f:
+            cabecalho = f.readline()
+    else:
+        posicao = file.tell()
+        cabecalho = file.readline()
+        file.seek(posicao)
+        if isinstance(cabecalho, bytes):
+            cabecalho = cabecalho.decode('utf-8', errors='ignore')
+    return ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+
+
+def _resolve_columns(cabecalho):
+    """Mapeia as colunas do extrato para os campos do livro; levanta ValueError se faltar algum."""
+    normalizados = {coluna.strip().lstrip('\ufeff').lower(): coluna for coluna in cabecalho}
+    mapa = {}
+    for campo, nomes in IMPORT_ALIASES.items():
+        encontrado = next((normalizados[n.lower()] for n in nomes if n.lower() in normalizados), None)
+        if encontrado is not None:
+            mapa[encontrado] = campo
+    faltando = [campo for campo in IMPORT_ALIASES if campo not in IMPORT_OPTIONAL and campo not in mapa.values()]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no extrato: {', '.join(faltando)}")
+    if not any(campo in mapa.values() for campo in IMPORT_OPERATION_FIELDS):
+        raise ValueError("O extrato não indica se cada linha é compra ou venda "
+                         "(coluna Operação, C/V, Tipo de Movimentação ou Entrada/Saída).")
+    return mapa
+
+
+def _parse_number(valores, decimal):
+    texto = valores.str.replace('R$', '', regex=False).str.strip()
+    if decimal == ',':
+        texto = texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def normalize_statement(chunk, decimal=','):
+    """
+    Normaliza um lote do extrato (colunas já renomeadas para os campos do livro, como texto).
+    Retorna (válidos, motivos): válidos com ativo, operacao, quantidade, preco, valor e data_compra,
+    e uma Series com o motivo de rejeição das demais linhas (mesmo índice do lote).
+    A operação vem de 'Operação' ou, no extrato de movimentação da B3, de 'Entrada/Saída'
+    (crédito é compra, débito é venda); linhas sem operação reconhecida são rejeitadas.
+    Com 'Movimentação', as linhas que não são negociações recebem o motivo NOT_A_TRADE.
+    """
+    ativo = chunk['Ativo'].fillna('').str.strip().str.upper()
+    # "PETR4 - PETROLEO BRASILEIRO" -> PETR4; mercado fracionário (PETR4F) -> PETR4
+    ativo = ativo.str.split(' - ', n=1).str[0].str.replace(r'^([A-Z]{4}\d{1,2})F$', r'\1', regex=True)
+    quantidade = _parse_number(chunk['Quantidade'].fillna(''), decimal)
+    preco = _parse_number(chunk['Preço'].fillna(''), decimal)
+    datas = chunk['Data de Compra'].fillna('').str.strip()
+    data = pd.to_datetime(datas, format='%d/%m/%Y', errors='coerce')
+    iso = data.isna()
+    if iso.any():
+        data[iso] = pd.to_datetime(datas[iso].str[:10], format='%Y-%m-%d', errors='coerce')
+
+    motivos = pd.Series(None, index=chunk.index, dtype=object)
+    if 'Movimentação' in chunk:
+        movimentacao = chunk['Movimentação'].fillna('').str.strip().str.lower()
+        motivos[~movimentacao.isin(B3_TRADE_MOVEMENTS)] = NOT_A_TRADE
+
+    if 'Operação' in chunk:
+        texto = chunk['Operação'].fillna('').str.strip().str.lower()
+        compras, vendas = ['compra', 'c', 'credito', 'crédito'], ['venda', 'v', 'debito', 'débito']
+    else:
+        texto = chunk['Entrada/Saída'].fillna('').str.strip().str.lower()
+        compras, vendas = ['credito', 'crédito', 'entrada'], ['debito', 'débito', 'saida', 'saída']
+    operacao = pd.Series(None, index=chunk.index, dtype=object)
+    operacao[texto.isin(compras)] = 'Compra'
+    operacao[texto.isin(vendas)] = 'Venda'
+    motivos[motivos.isna() & operacao.isna()] = "operação desconhecida"
+    motivos[motivos.isna() & (data > pd.Timestamp.today())] = "data no futuro"
+    motivos[motivos.isna() & data.isna()] = "data inválida"
+    motivos[motivos.isna() & ~(preco > 0)] = "preço inválido"
+    motivos[motivos.isna() & ~(quantidade > 0)] = "quantidade inválida"
+    motivos[motivos.isna() & (ativo == '')] = "ativo ausente"
+
+    validos = motivos.isna()
+    normalizados = pd.DataFrame({
+        'ativo': ativo[validos],
+        'operacao': operacao[validos],
+        'quantidade': quantidade[validos].round(8),
+        'preco': preco[validos].round(8),
+        'data_compra': data[validos].dt.strftime('%Y-%m-%d'),
+    })
+    normalizados['valor'] = normalizados['quantidade'] * normalizados['preco']
+    return normalizados, motivos.dropna()
+
+
+def _existing_counts(conn):
+    """Quantas vezes cada (ativo, operação, quantidade, preço, data) já aparece no livro."""
+    linhas = conn.execute(
+        "SELECT ativo, operacao, ROUND(quantidade, 8), ROUND(preco, 8), data_compra, COUNT(*) FROM lancamentos "
+        "GROUP BY 1, 2, 3, 4, 5"
+    ).fetchall()
+    existentes = pd.DataFrame(linhas, columns=_CHAVE + ['n'])
+    return existentes.set_index(_CHAVE)['n']
+
+
+def import_statement(file, chunksize=IMPORT_CHUNK_SIZE, encoding='utf-8'):
+    """
+    Importa um extrato CSV de corretora/B3 para o livro em uma única transação.
+    O arquivo é lido em lotes de `chunksize` linhas (só as colunas usadas) e cada lote é
+    validado de forma vetorizada. Linhas já presentes no livro não são importadas de novo:
+    uma linha repetida k vezes no extrato só gera os lançamentos que faltam para chegar a k.
+    Movimentações que não são negociações (proventos, desdobramentos etc.) são contadas em
+    'ignoradas', sem aparecer entre as rejeitadas.
+    Retorna um resumo com as contagens e até MAX_REJECTED_REPORT linhas rejeitadas com o motivo.
+    """
+    separador = _sniff_separator(file)
+    decimal = ',' if separador == ';' else '.'
+    cabecalho = pd.read_csv(file, sep=separador, nrows=0, encoding=encoding).columns
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    mapa = _resolve_columns(cabecalho)
+
+    resumo = {'lidas': 0, 'importadas': 0, 'duplicadas': 0, 'ignoradas': 0, 'rejeitadas': 0}
+    rejeicoes = []
+    with transaction() as conn:
+        existentes = _existing_counts(conn)
+        vistos = pd.Series(dtype=np.int64, index=existentes.index[:0])
+        lotes = pd.read_csv(file, sep=separador, usecols=list(mapa), dtype=str, chunksize=chunksize,
+                            encoding=encoding, skipinitialspace=True)
+        for lote in lotes:
+            lote = lote.rename(columns=mapa)
+            resumo['lidas'] += len(lote)
+            validos, motivos = normalize_statement(lote, decimal)
+            ignoradas = motivos == NOT_A_TRADE
+            resumo['ignoradas'] += int(ignoradas.sum())
+            motivos = motivos[~ignoradas]
+
+            resumo['rejeitadas'] += len(motivos)
+            if len(motivos) and sum(map(len, rejeicoes)) < MAX_REJECTED_REPORT:
+                # Linha do arquivo: índice do lote + 2 (cabeçalho e numeração a partir de 1)
+                rejeitadas = lote.loc[motivos.index].assign(Motivo=motivos)
+                rejeitadas.insert(0, 'Linha', rejeitadas.index + 2)
+                rejeicoes.append(rejeitadas)
+
+            if validos.empty:
+                continue
+            chave = pd.MultiIndex.from_frame(validos[_CHAVE])
+            ocorrencia = (validos.groupby(_CHAVE, sort=False).cumcount().to_numpy()
+                          + vistos.reindex(chave, fill_value=0).to_numpy())
+            novos = validos[ocorrencia >= existentes.reindex(chave, fill_value=0).to_numpy()]
+            vistos = vistos.add(validos.groupby(_CHAVE).size(), fill_value=0).astype(np.int64)
+
+            resumo['duplicadas'] += len(validos) - len(novos)
+            resumo['importadas'] += len(novos)
+            conn.executemany(
+                "INSERT INTO lancamentos (ativo, operacao, quantidade, preco, valor, data_compra) VALUES (?, ?, ?, ?, ?, ?)",
+                novos[['ativo', 'operacao', 'quantidade', 'preco', 'valor', 'data_compra']].itertuples(index=False, name=None),
+            )
+        if resumo['importadas']:
+            _bump(conn)
+
+    resumo['rejeicoes'] = pd.concat(rejeicoes).head(MAX_REJECTED_REPORT) if rejeicoes else pd.DataFrame()
+    return resumo
@@ -0,0 +1,162 @@
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from assistant import MODEL, load_api_key, make_client
+from response_cache import stream_cached
+
+# Executor único do processo para as chamadas ao modelo, fora da execução do script do
+# Streamlit: a página enfileira a pergunta, continua respondendo a outros widgets e consulta
+# o andamento (o texto parcial chega em streaming). O cliente é criado uma única vez e
+# reutilizado por todas as sessões. Cada sessão tem sua fila, com no máximo
+# MAX_PER_SESSION chamadas simultâneas e MAX_QUEUED pendentes; o processo inteiro usa até
+# MAX_WORKERS threads.
+
+MAX_WORKERS = 4
+MAX_PER_SESSION = 1
+MAX_QUEUED = 5
+REQUEST_TIMEOUT = 60  # segundos desde o envio até o fim da resposta
+JOB_TTL = 600  # segundos que um resultado fica disponível depois de concluído
+
+QUEUED, RUNNING, DONE, FAILED, TIMED_OUT = "na fila", "em andamento", "concluída", "erro", "tempo esgotado"
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="llm")
+_lock = threading.Lock()
+_client = None
+_jobs = {}  # id -> Job
+_sessions = {}  # sessão -> {"fila": deque de Jobs, "ativos": chamadas em andamento}
+
+
+class Job:
+    """Uma pergunta enviada ao modelo: estado, texto recebido até agora, latências e erro."""
+
+    def __init__(self, session_id, messages, model, params):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.messages = messages
+        self.model = model
+        self.params = params
+        self.status = QUEUED
+        self.parts = []
+        self.stats = {}
+        self.error = None
+        self.created = time.monotonic()
+        self.finished = None
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def pending(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def expired(self):
+        return time.monotonic() - self.created > REQUEST_TIMEOUT
+
+
+def get_client():
+    """Cliente do modelo compartilhado (criado na primeira chamada)."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = make_client(load_api_key(), timeout=REQUEST_TIMEOUT)
+        return _client
+
+
+def _finish(job, status, error=None):
+    """Encerra a pergunta; a primeira conclusão vale (ex.: o tempo esgotado marcado por `poll`)."""
+    with _lock:
+        if job.pending:
+            job.status, job.error, job.finished = status, error, time.monotonic()
+
+
+def _run(job):
+    respostas = None
+    try:
+        if job.expired():
+            _finish(job, TIMED_OUT, "A pergunta esperou demais na fila.")
+            return
+        with _lock:
+            if not job.pending:
+                return
+            job.status = RUNNING
+        respostas = stream_cached(get_client(), job.messages, job.model, stats=job.stats,
+                                  wait_timeout=REQUEST_TIMEOUT, **job.params)
+        for trecho in respostas:
+            if not job.pending or job.expired():
+                _finish(job, TIMED_OUT, f"A resposta não terminou em {REQUEST_TIMEOUT} s.")
+                return
+            job.parts.append(trecho)
+        _finish(job, DONE)
+    except Exception as e:
+        _finish(job, FAILED, str(e))
+    finally:
+        if respostas is not None:
+            respostas.close()
+        _next(job.session_id, concluido=True)
+
+
+def _next(session_id, concluido=False):
+    """Inicia as próximas perguntas da fila da sessão, respeitando MAX_PER_SESSION."""
+    with _lock:
+        sessao = _sessions[session_id]
+        if concluido:
+            sessao["ativos"] -= 1
+        while sessao["fila"] and sessao["ativos"] < MAX_PER_SESSION:
+            sessao["ativos"] += 1
+            _pool.submit(_run, sessao["fila"].popleft())
+        if not sessao["fila"] and not sessao["ativos"]:
+            del _sessions[session_id]
+
+
+def _cleanup():
+    """Descarta resultados concluídos há mais de JOB_TTL segundos. Chamar com _lock."""
+    limite = time.monotonic() - JOB_TTL
+    for job_id in [j.id for j in _jobs.values() if j.finished is not None and j.finished < limite]:
+        del _jobs[job_id]
+
+
+def submit(session_id, messages, model=MODEL, **params):
+    """
+    Enfileira uma pergunta da sessão e devolve o id para acompanhá-la com `poll`.
+    Levanta RuntimeError se a sessão já tem MAX_QUEUED perguntas pendentes ou se o cliente
+    do modelo não pode ser criado (ex.: chave de API ausente).
+    """
+    get_client()
+    job = Job(session_id, list(messages), model, params)
+    with _lock:
+        _cleanup()
+        sessao = _sessions.setdefault(session_id, {"fila": deque(), "ativos": 0})
+        if len(sessao["fila"]) + sessao["ativos"] >= MAX_QUEUED:
+            raise RuntimeError("Há perguntas demais aguardando resposta. Aguarde as anteriores.")
+        sessao["fila"].append(job)
+        _jobs[job.id] = job
+    _next(session_id)
+    return job.id
+
+
+def poll(job_id):
+    """Pergunta enviada por `submit` (com o texto parcial, se ainda em andamento), ou None se já descartada."""
+    job = _jobs.get(job_id)
+    if job is not None and job.pending and job.expired():
+        # O worker pode estar preso esperando o primeiro trecho: a página não espera mais por ele
+        _finish(job, TIMED_OUT, f"A resposta não terminou em {REQUEST_TIMEOUT} s.")
+    return job
+
+
+def discard(job_id):
+    """Esquece o resultado de uma pergunta já consumida pela página."""
+    with _lock:
+        _jobs.pop(job_id, None)
+
+
+def executor_stats():
+    """Perguntas por estado e número de sessões com perguntas pendentes."""
+    with _lock:
+        estados = {}
+        for job in _jobs.values():
+            estados[job.status] = estados.get(job.status, 0) + 1
+        return {**estados, "sessions": len(_sessions)}
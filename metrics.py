@@ -0,0 +1,216 @@
+import warnings
+import functools
+import numpy as np
+import pandas as pd
+
+from data_collector import data_version
+from price_matrix import get_price_matrix
+
+TRADING_DAYS = 252
+BENCHMARK = '^GSPC'
+
+# Todas as métricas são calculadas para todos os tickers de uma vez sobre a matriz
+# de preços (datas x tickers), com somas acumuladas em vez de janelas recalculadas.
+# A grade de datas é a união dos calendários (inclui os fins de semana das criptomoedas), então
+# janelas e durações são contadas nos pregões de cada ticker, não nas linhas da grade.
+
+
+def daily_returns(values):
+    """
+    Retornos diários (fração) contra a última cotação anterior.
+    Dias sem cotação do ticker (ex.: fins de semana das ações na grade das criptomoedas) ficam NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    anteriores = pd.DataFrame(values).ffill().to_numpy()
+    retornos = np.full_like(values, np.nan)
+    retornos[1:] = values[1:] / anteriores[:-1] - 1
+    return retornos
+
+
+def _rolling_sum(x, window):
+    """Soma móvel O(n) ignorando NaN; devolve também a quantidade de valores válidos na janela."""
+    validos = ~np.isnan(x)
+    acumulado = np.cumsum(np.where(validos, x, 0.0), axis=0)
+    contagem = np.cumsum(validos, axis=0)
+    soma = acumulado.copy()
+    soma[window:] -= acumulado[:-window]
+    n = contagem.copy()
+    n[window:] -= contagem[:-window]
+    return soma, n
+
+
+def session_order(validos):
+    """
+    Ordem (por coluna) que leva as linhas válidas para o topo, mantendo a sequência, e a posição
+    de cada linha da grade entre as válidas da sua coluna (-1 antes da primeira).
+    """
+    return np.argsort(~validos, axis=0, kind="stable"), np.cumsum(validos, axis=0) - 1
+
+
+def compact_sessions(x, ordem):
+    """Cada coluna só com as suas linhas válidas, no topo (as demais ficam embaixo)."""
+    return np.take_along_axis(x, ordem, axis=0)
+
+
+def expand_sessions(x, posicao):
+    """
+    Leva para a grade o resultado calculado sobre as linhas válidas (… x linhas x colunas),
+    repetindo o último valor nas demais.
+    """
+    indices = np.maximum(posicao, 0).reshape((1,) * (x.ndim - 2) + posicao.shape)
+    return np.where(posicao < 0, np.nan, np.take_along_axis(x, indices, axis=-2))
+
+
+def _rolling_mean_std(x, window, min_periods):
+    soma, n = _rolling_sum(x, window)
+    soma2, _ = _rolling_sum(x * x, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = soma / n
+        variancia = (soma2 - n * media ** 2) / (n - 1)
+    insuficiente = n < min_periods
+    media[insuficiente] = np.nan
+    variancia[insuficiente] = np.nan
+    return media, np.sqrt(np.maximum(variancia, 0))
+
+
+def rolling_mean_std(x, window, min_periods=None):
+    """
+    Média e desvio padrão móveis por somas acumuladas de x e x², com janelas de `window`
+    observações válidas de cada coluna; nas linhas sem valor repete o resultado anterior.
+    """
+    ordem, posicao = session_order(~np.isnan(x))
+    media, desvio = _rolling_mean_std(compact_sessions(x, ordem), window, min_periods or window)
+    return expand_sessions(media, posicao), expand_sessions(desvio, posicao)
+
+
+def drawdowns(values):
+    """Queda percentual em relação ao pico anterior, para cada dia e ticker."""
+    precos = pd.DataFrame(values).ffill().to_numpy()
+    pico = np.fmax.accumulate(precos, axis=0)
+    return precos / pico - 1
+
+
+def max_drawdown_duration(values):
+    """Maior número de pregões consecutivos abaixo do pico anterior, por ticker (contando só os seus pregões)."""
+    values = np.asarray(values, dtype=np.float64)
+    ordem, _ = session_order(~np.isnan(values))
+    precos = compact_sessions(values, ordem)
+    no_pico = precos >= np.fmax.accumulate(precos, axis=0)
+    linhas = np.arange(len(precos))[:, None]
+    ultimo_pico = np.maximum.accumulate(np.where(no_pico, linhas, 0), axis=0)
+    duracao = np.where(np.isnan(precos), 0, linhas - ultimo_pico)
+    return duracao.max(axis=0, initial=0)
+
+
+def summary_metrics(values, dates, tickers, benchmark=None, risk_free=0.0):
+    """
+    Métricas do período para cada ticker: CAGR, volatilidade anual, Sharpe, Sortino,
+    drawdown máximo e sua duração, beta e correlação contra o benchmark (se informado).
+    `risk_free` é a taxa livre de risco anual (fração).
+    """
+    retornos = daily_returns(values)
+    with warnings.catch_warnings():
+        # Tickers sem cotação no período resultam em NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        media = np.nanmean(retornos, axis=0)
+        desvio = np.nanstd(retornos, axis=0, ddof=1)
+    negativos = np.where(retornos < 0, retornos, np.where(np.isnan(retornos), np.nan, 0.0))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        desvio_neg = np.sqrt(np.nanmean(negativos ** 2, axis=0))
+    rf_diario = (1 + risk_free) ** (1 / TRADING_DAYS) - 1
+
+    validos = ~np.isnan(values)
+    primeiro = validos.argmax(axis=0)
+    ultimo = len(values) - 1 - validos[::-1].argmax(axis=0)
+    colunas = np.arange(values.shape[1])
+    datas = pd.DatetimeIndex(dates)
+    anos = (datas[ultimo] - datas[primeiro]).days.to_numpy() / 365.25
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cagr = (values[ultimo, colunas] / values[primeiro, colunas]) ** (1 / anos) - 1
+
+        tabela = pd.DataFrame({
+            "CAGR (%)": cagr * 100,
+            "Volatilidade (%)": desvio * np.sqrt(TRADING_DAYS) * 100,
+            "Sharpe": (media - rf_diario) / desvio * np.sqrt(TRADING_DAYS),
+            "Sortino": (media - rf_diario) / desvio_neg * np.sqrt(TRADING_DAYS),
+            "Drawdown Máximo (%)": np.nanmin(drawdowns(values), axis=0) * 100,
+            "Duração do Drawdown (pregões)": max_drawdown_duration(values),
+        }, index=pd.Index(tickers, name="Ticker"))
+
+    if benchmark is not None:
+        ret_bench = daily_returns(np.asarray(benchmark, dtype=np.float64).reshape(-1, 1))
+        ambos = ~np.isnan(retornos) & ~np.isnan(ret_bench)
+        x = np.where(ambos, ret_bench, np.nan)
+        y = np.where(ambos, retornos, np.nan)
+        dx = x - np.nanmean(x, axis=0)
+        dy = y - np.nanmean(y, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = np.nansum(dx * dy, axis=0)
+            tabela["Beta"] = cov / np.nansum(dx * dx, axis=0)
+            tabela["Correlação"] = cov / np.sqrt(np.nansum(dx * dx, axis=0) * np.nansum(dy * dy, axis=0))
+
+    return tabela.replace([np.inf, -np.inf], np.nan).round(2)
+
+
+def rolling_metrics(values, benchmark=None, window=TRADING_DAYS, risk_free=0.0):
+    """
+    Séries móveis (datas x tickers): volatilidade anual, Sharpe, drawdown e, com benchmark, beta.
+    As janelas têm `window` pregões do ticker (o beta, `window` pregões com cotação do ticker e do
+    benchmark). Cada série custa O(n) por ticker, independentemente do tamanho da janela.
+    """
+    retornos = daily_returns(values)
+    media, desvio = rolling_mean_std(retornos, window)
+    rf_diario = (1 + risk_free) ** (1 / TRADING_DAYS) - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        resultado = {
+            "Volatilidade (%)": desvio * np.sqrt(TRADING_DAYS) * 100,
+            "Sharpe": (media - rf_diario) / desvio * np.sqrt(TRADING_DAYS),
+            "Drawdown (%)": drawdowns(values) * 100,
+        }
+        if benchmark is not None:
+            ret_bench = daily_returns(np.asarray(benchmark, dtype=np.float64).reshape(-1, 1))
+            ambos = ~np.isnan(retornos) & ~np.isnan(ret_bench)
+            ordem, posicao = session_order(ambos)
+            x = compact_sessions(np.where(ambos, ret_bench, np.nan), ordem)
+            y = compact_sessions(np.where(ambos, retornos, np.nan), ordem)
+            media_x, desvio_x = _rolling_mean_std(x, window, window)
+            media_y, _ = _rolling_mean_std(y, window, window)
+            soma_xy, n = _rolling_sum(x * y, window)
+            cov = (soma_xy - n * media_x * media_y) / (n - 1)
+            resultado["Beta"] = expand_sessions(cov / desvio_x ** 2, posicao)
+    return resultado
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_summary(version, start_date, end_date, risk_free, currency):
+    matrix = get_price_matrix(currency=currency)
+    valores, datas, tickers = matrix.select(None, start_date, end_date)
+    valores = np.asarray(valores)
+    benchmark = valores[:, tickers.index(BENCHMARK)] if BENCHMARK in tickers else None
+    return summary_metrics(valores, datas, tickers, benchmark, risk_free)
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_rolling(version, window, risk_free, currency):
+    matrix = get_price_matrix(currency=currency)
+    valores = np.asarray(matrix.values)
+    benchmark = valores[:, matrix.columns[BENCHMARK]] if BENCHMARK in matrix.columns else None
+    series = rolling_metrics(valores, benchmark, window, risk_free)
+    return {nome: pd.DataFrame(v, index=matrix.dates, columns=matrix.tickers) for nome, v in series.items()}
+
+
+def get_summary_metrics(start_date=None, end_date=None, risk_free=0.0, currency=None):
+    """
+    Métricas do período para todos os tickers, calculadas uma vez por versão dos dados e período.
+    Com `currency` ('BRL' ou 'USD') as métricas usam os preços convertidos para a moeda.
+    O resultado é compartilhado; não o altere.
+    """
+    start_date = None if start_date is None else pd.Timestamp(start_date)
+    end_date = None if end_date is None else pd.Timestamp(end_date)
+    return _cached_summary(data_version(), start_date, end_date, risk_free, currency)
+
+
+def get_rolling_metrics(window=TRADING_DAYS, risk_free=0.0, currency=None):
+    """Séries móveis de todos os tickers no histórico completo, calculadas uma vez por versão dos dados."""
+    return _cached_rolling(data_version(), window, risk_free, currency)
@@ -2,22 +2,17 @@ import streamlit as st
 import plotly.express as px
 import pandas as pd
 import numpy as np
-from data_collector import load_stock_data
+from dataset_cache import get_tickers, get_date_bounds
+from price_matrix import get_price_matrix
+from backtest_engine import buy_and_hold, yearly_returns, growth_curves, tickers_with_data
+import strategies
+import sweeps
+import simulation
+from metrics import get_summary_metrics
+from downsampling import downsample_frame, points_for_range
 import os
 from dotenv import load_dotenv
 
-def calcular_variacao_anual(df):
-    df_ano = df.groupby('Year').agg(
-        inicial=('Close', 'first'),
-        final=('Close', 'last')).reset_index()
-    df_ano['Percentual_Variacao'] = ((df_ano['final'] / df_ano['inicial']) - 1) * 100
-    return df_ano[['Year', 'Percentual_Variacao']]
-
-def calcular_variacao_percentual(df):
-    df = df.sort_values(by="Datetime")  
-    df["Percentual_Crescimento"] = (df["Close"] / df["Close"].iloc[0] - 1) * 100  # Variação percentual
-    return df
-
 senha = os.getenv("GROQ_API_KEY")
 
 
@@ -29,14 +24,16 @@ st.set_page_config(
 st.header("Backtest de Múltiplos Ativos")
 st.markdown("Compare o investimento em vários ativos ao mesmo tempo.")
 
-df = load_stock_data()
-
-monitor_tickers = st.multiselect("Escolha as ações para análise:", df["Ticker"].unique(), default=["MSFT", "AAPL"])
+monitor_tickers = st.multiselect("Escolha as ações para análise:", get_tickers(), default=["MSFT", "AAPL"])
 st.markdown('')
 investment = st.number_input("Valor inicial do investimento por Ativo:", min_value=1.0, step=100.0, value=1000.0)
+moeda = st.radio("Moeda:", ["Original", "BRL", "USD"], horizontal=True,
+                 help="Original: cada ativo na sua moeda de cotação. BRL/USD: preços convertidos pelo câmbio de cada dia.")
+currency = None if moeda == "Original" else moeda
 
-min_date = df['Datetime'].min().date()
-max_date = df['Datetime'].max().date()
+min_date, max_date = get_date_bounds()
+min_date = min_date.date()
+max_date = max_date.date()
 st.markdown('')
 
 selected_dates = st.slider(
@@ -46,13 +43,21 @@ selected_dates = st.slider(
 
 start_date, end_date = selected_dates
 
-df_filtered = df[(df['Datetime'] >= pd.to_datetime(start_date)) & (df['Datetime'] <= pd.to_datetime(end_date))]
-tickers = set(monitor_tickers).intersection(df_filtered['Ticker'].unique())
+# Recorte da matriz de preços (datas x tickers) com a seleção; todos os cálculos partem dele
+try:
+    precos = get_price_matrix(currency=currency)
+except ValueError as e:
+    st.warning(str(e))
+    currency = None
+    precos = get_price_matrix()
+valores, datas, selecionados = precos.select(monitor_tickers, start_date, end_date)
+tickers = tickers_with_data(valores, selecionados)
 sem_dados = set(monitor_tickers).symmetric_difference(tickers)
 
-df_filtered = df_filtered[df_filtered['Ticker'].isin(tickers)]
+valores, datas, tickers = precos.select(tickers, start_date, end_date)
+sem_resultados = not tickers
 
-if df_filtered.empty:
+if sem_resultados:
     st.info('Nenhum valor encontrado para os filtros aplicados. Verifique as opções selecionadas.')
 else:
     if len(sem_dados)==1 :
@@ -68,10 +73,10 @@ else:
 
 
 
-tab1, tab2 = st.tabs(['Resultados', 'Gráficos de Comparação'])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(['Resultados', 'Gráficos de Comparação', 'Estratégias', 'Otimização', 'Projeção'])
 
 with tab1:
-    if not df_filtered.empty:
+    if not sem_resultados:
         if monitor_tickers:
             st.header("Tabela de Retornos",
                     help="""
@@ -80,33 +85,19 @@ with tab1:
         Data Inicial: Data do primeiro registro de preço no período.  
         Preço Final : Preço do ativo no final do período.  
         Ganho: Valor total de retorno obtido.  
-        Retorno (%): Porcentagem de crescimento ou queda da ação no período.
+        Retorno (%): Porcentagem de crescimento ou queda da ação no período.  
+        CAGR (%): Retorno médio anual composto.  
+        Volatilidade (%): Desvio padrão anualizado dos retornos diários.  
+        Sharpe / Sortino: Retorno por unidade de risco (total / apenas quedas).  
+        Drawdown Máximo (%): Maior queda a partir de um pico; a duração é o maior período abaixo do pico.  
+        Beta / Correlação: Sensibilidade e correlação em relação ao ^GSPC.
             """)
-            results = []
-            for ticker in tickers:
-                df_filtered2 = df_filtered[df_filtered["Ticker"] == ticker]
-                
-                # Verifica os preços de abertura e fechamento para o cálculo de retorno
-                initial_price = float(df_filtered2.iloc[0]["Close"])
-                initial_date = (df_filtered2.iloc[0]["Datetime"]).strftime("%Y-%m-%d")
-                final_price = float(df_filtered2.iloc[-1]["Close"])
-                
-                # Calcula o retorno em reais e em porcentagem
-                profit = (final_price - initial_price) / initial_price * investment
-                profit_percentage = (final_price - initial_price) / initial_price * 100
-                
-                results.append({
-                    "Ticker": ticker,
-                    "Data Inicial": initial_date,
-                    "Preço Inicial": initial_price,
-                    "Preço Final": final_price,
-                    "Ganho": round(profit,2),
-                    "Retorno (%)": round(profit_percentage,2)
-                })
-            results_df = pd.DataFrame(results)
+            results_df = buy_and_hold(valores, datas, tickers, investment)
+            # Métricas de risco calculadas uma vez por versão dos dados e período, para todos os tickers
+            metricas = get_summary_metrics(start_date, end_date, currency=currency)
+            results_df = results_df.join(metricas, on="Ticker")
             st.dataframe(
                     results_df,
-                    width=600,
                     column_config={
                         "Preço Inicial": st.column_config.NumberColumn(
                             help="Description",
@@ -129,11 +120,7 @@ with tab1:
 
             st.markdown("---")
 
-            df_filtered['Year'] = df_filtered['Datetime'].dt.year
-
-            tabela_variacao = pd.concat([
-                calcular_variacao_anual(df_filtered[df_filtered['Ticker'] == ticker]).set_index('Year').rename(
-                                columns={'Percentual_Variacao': ticker}) for ticker in monitor_tickers], axis=1)
+            tabela_variacao = yearly_returns(valores, datas, tickers)
 
             tabela_variacao = tabela_variacao.fillna(0)  
 
@@ -156,14 +143,12 @@ with tab1:
             ))
 
 with tab2:
-    if not df_filtered.empty:
+    if not sem_resultados:
             if monitor_tickers:
-                df_filtered['Datetime'] = pd.to_datetime(df_filtered['Datetime'])
-
-                df_filtered = df_filtered[df_filtered["Ticker"].isin(tickers)]
-
-                df_percentual = pd.concat([calcular_variacao_percentual(df_filtered[df_filtered['Ticker'] == ticker]) 
-                                            for ticker in tickers])
+                df_percentual = growth_curves(valores, datas, tickers)
+                # Limita os pontos por ativo enviados ao navegador conforme o intervalo escolhido
+                df_percentual = downsample_frame(df_percentual, "Datetime", "Percentual_Crescimento",
+                                                 points_for_range(start_date, end_date), group="Ticker")
 
                 st.markdown("")
                 st.markdown("")
@@ -182,4 +167,122 @@ with tab2:
                 
                 st.plotly_chart(fig, use_container_width=True)
 
-
+with tab3:
+    if not sem_resultados:
+        st.subheader("Simulação de Estratégias",
+                     help="""
+            Aportes Mensais: investe o valor informado em cada ativo no primeiro pregão de cada mês.  
+            Carteira Rebalanceada: divide o investimento igualmente entre os ativos e volta aos pesos iguais a cada período.  
+            Médias Móveis: fica comprado enquanto a média curta estiver acima da longa.  
+            Momentum: fica comprado enquanto o retorno dos últimos pregões for positivo.  
+            O ^GSPC recebe os mesmos aportes da estratégia para comparação.
+            """)
+        estrategia = st.selectbox("Estratégia:", ["Aportes Mensais", "Carteira Rebalanceada", "Médias Móveis", "Momentum"])
+        matriz_sel = np.asarray(valores)
+
+        if estrategia == "Aportes Mensais":
+            aporte = st.number_input("Aporte mensal por ativo:", min_value=1.0, step=50.0, value=100.0)
+            resultado = strategies.monthly_contributions(matriz_sel, datas, tickers, aporte)
+        elif estrategia == "Carteira Rebalanceada":
+            frequencia = st.radio("Rebalanceamento:", ["Mensal", "Trimestral", "Anual"], horizontal=True)
+            resultado = strategies.rebalanced_portfolio(
+                matriz_sel, datas, tickers, np.ones(len(tickers)), investment * len(tickers),
+                freq={"Mensal": "M", "Trimestral": "Q", "Anual": "Y"}[frequencia])
+        elif estrategia == "Médias Móveis":
+            col1, col2 = st.columns(2)
+            curta = col1.number_input("Média curta (pregões):", min_value=2, value=50, step=5)
+            longa = col2.number_input("Média longa (pregões):", min_value=3, value=200, step=10)
+            sinal = strategies.moving_average_signal(matriz_sel, int(curta), int(longa))
+            resultado = strategies.signal_strategy(matriz_sel, datas, tickers, sinal, investment)
+        else:
+            janela = st.number_input("Janela do momentum (pregões):", min_value=5, value=126, step=21)
+            sinal = strategies.momentum_signal(matriz_sel, int(janela))
+            resultado = strategies.signal_strategy(matriz_sel, datas, tickers, sinal, investment)
+
+        if resultado.total.empty:
+            st.info("Não há um período em comum entre os ativos selecionados para esta estratégia.")
+        else:
+            curvas = pd.DataFrame({estrategia: resultado.total, "Total Aportado": resultado.invested})
+            gspc = precos.series('^GSPC', start_date, end_date)
+            if not gspc.empty:
+                curvas['^GSPC'] = strategies.benchmark(gspc, resultado.invested)
+
+            st.dataframe(pd.DataFrame([resultado.summary()]), hide_index=True)
+
+            curvas = curvas.rename_axis("Datetime").reset_index().melt(id_vars="Datetime", var_name="Série", value_name="Valor")
+            curvas = downsample_frame(curvas, "Datetime", "Valor", points_for_range(start_date, end_date), group="Série")
+            fig = px.line(curvas, x="Datetime", y="Valor", color="Série", labels={"Valor": "Valor da Carteira", "Datetime": ""})
+            st.plotly_chart(fig, use_container_width=True)
+
+            with st.expander("Operações realizadas"):
+                st.dataframe(resultado.trades, hide_index=True)
+
+with tab4:
+    if not sem_resultados:
+        st.subheader("Otimização de Médias Móveis",
+                     help="""
+            Testa todas as combinações de média curta x média longa nos ativos selecionados.  
+            Walk-forward: escolhe a melhor combinação em cada janela de treino e mede o resultado no ano seguinte.
+            """)
+        col1, col2 = st.columns(2)
+        curtas = col1.multiselect("Médias curtas:", [5, 10, 20, 50, 100], default=[10, 20, 50])
+        longas = col2.multiselect("Médias longas:", [50, 100, 150, 200, 250], default=[100, 200])
+        modo = st.radio("Modo:", ["Grade completa", "Walk-forward"], horizontal=True)
+
+        combinacoes = [
+            combinacao for combinacao in sweeps.parameter_grid(
+                strategy=['ma_cross'], tickers=[tuple(tickers)], fast=curtas, slow=longas, investment=[investment])
+            if combinacao['fast'] < combinacao['slow']
+        ]
+
+        if st.button("Executar Otimização", disabled=not combinacoes):
+            progresso = st.progress(0.0, text="Executando...")
+            tabela = st.empty()
+            linhas = []
+            if modo == "Grade completa":
+                combinacoes = [{**c, 'start_date': start_date, 'end_date': end_date} for c in combinacoes]
+                # Os resultados aparecem à medida que cada lote termina
+                for concluidas, total, lote in sweeps.run_sweep(combinacoes, currency=currency):
+                    linhas.extend(lote)
+                    progresso.progress(concluidas / total, text=f"{concluidas} de {total} combinações")
+                    tabela.dataframe(pd.DataFrame(linhas).drop(columns=['strategy', 'start_date', 'end_date'])
+                                     .sort_values("Retorno (%)", ascending=False), hide_index=True)
+            else:
+                janelas = sweeps.walk_forward_windows(start_date, end_date)
+                for linha in sweeps.walk_forward(combinacoes, start_date, end_date, currency=currency):
+                    linhas.append(linha)
+                    progresso.progress(len(linhas) / max(len(janelas), 1), text=f"Janela {len(linhas)} de {len(janelas)}")
+                    tabela.dataframe(pd.DataFrame(linhas), hide_index=True)
+                if not janelas:
+                    st.info("Selecione um período de pelo menos 4 anos para o walk-forward.")
+            progresso.empty()
+
+with tab5:
+    if not sem_resultados:
+        st.subheader("Projeção de Resultados Futuros",
+                     help="""
+            Simula milhares de trajetórias futuras da carteira com pesos iguais entre os ativos selecionados,
+            reamostrando os retornos diários históricos do período escolhido.  
+            Bootstrap: sorteia blocos de um mês de retornos reais.  
+            Paramétrico: sorteia retornos de uma distribuição normal com a média e a volatilidade históricas.
+            """)
+        col1, col2, col3 = st.columns(3)
+        anos = col1.slider("Horizonte (anos):", 1, 30, 10)
+        trajetorias = col2.select_slider("Trajetórias:", [1_000, 5_000, 10_000, 50_000, 100_000], value=10_000)
+        metodo = col3.radio("Método:", ["Bootstrap", "Paramétrico"], horizontal=True)
+
+        capital = investment * len(tickers)
+        try:
+            # Simulada uma vez por combinação de parâmetros: as demais interações da página reaproveitam o resultado
+            bandas, distribuicao = simulation.get_projection(
+                tickers, start_date=start_date, end_date=end_date, years=anos, n_paths=trajetorias,
+                method={"Bootstrap": "bootstrap", "Paramétrico": "parametric"}[metodo], initial=capital, start=end_date,
+                currency=currency)
+        except ValueError as e:
+            st.info(str(e))
+        else:
+            st.dataframe(pd.DataFrame([distribuicao]), hide_index=True)
+
+            fig = px.line(bandas.rename_axis("Data").reset_index().melt(id_vars="Data", var_name="Percentil", value_name="Valor"),
+                          x="Data", y="Valor", color="Percentil", labels={"Valor": f"Valor Projetado ({currency})" if currency else "Valor Projetado", "Data": ""})
+            st.plotly_chart(fig, use_container_width=True)
@@ -7,70 +7,124 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 
-from groq import Groq
 from datetime import datetime
 
-FILE_LANCAMENTO = "data/lancamentos.csv"
+import ledger
+import assistant
+import chat_context
+import chat_history
+import llm_executor
+import fx
+import simulation
+from valuation import PortfolioValuation, asset_currency
+from positions import PositionBook
+from dataset_cache import get_tickers
+from price_matrix import get_price_matrix
+from downsampling import downsample_frame, points_for_range
 
 # config = toml.load("senhas.toml")
 # API_KEY = config['api_key']['GROQ_API_KEY']
-API_KEY = st.secrets['api_key']['GROQ_API_KEY']
+# A chave é lida uma única vez pelo executor do assistente (llm_executor.get_client)
 
-data_stocks = pd.read_csv('data/lancamentos.csv')
-
-TICKERS = data_stocks['Ativo'].unique()
-
-def carregar_carteira(lancamentos):
-    df_fin = lancamentos.groupby('Ativo').agg(
-                        Quantidade=('Quantidade', 'sum'),
-                        Valor = ('Valor', 'sum'),
-                        Média=('Preço', 'mean')
-                        ).reset_index()
-    df_fin.columns = ['Ativo', 'Quantidade', 'Valor', 'Preço Médio']
-    return df_fin
+def carregar_carteira(posicoes, metodo='media'):
+    # Posições em aberto, com preço médio ponderado (ou pelos lotes FIFO) e resultado realizado
+    return posicoes.table(metodo)
     
 def carregar_lancamentos():
-    if os.path.exists(FILE_LANCAMENTO):
-        df = pd.read_csv(FILE_LANCAMENTO)
-        # Validar colunas
-        colunas_esperadas = ['Ativo', 'Quantidade', 'Preço', 'Valor', 'Data de Compra']
-        df = df[colunas_esperadas]
-        return df
-    return pd.DataFrame(columns=['Ativo', 'Quantidade', 'Preço', 'Valor', 'Data de Compra'])
-
-def salvar_dados(data):
-    data = data[['Ativo', 'Quantidade', 'Preço', 'Valor', 'Data de Compra']]
-    data.to_csv(FILE_LANCAMENTO, index=False)
-
-if "lancamentos" not in st.session_state:
-    st.session_state.lancamentos = carregar_lancamentos()
-
-if "carteira" not in st.session_state:
-    st.session_state.carteira = carregar_carteira(st.session_state.lancamentos)
-
-def novo_lancamento(nome_ativo, quantidade, preco, data_compra):
+    # Os lançamentos ficam no livro SQLite (data/lancamentos.db), com IDs estáveis
+    return ledger.list_lancamentos()
+
+def sincronizar_sessao():
+    # Recarrega a cópia da sessão apenas quando o livro foi alterado (por esta ou por outra sessão)
+    revisao = ledger.revision()
+    if st.session_state.get("revisao_livro") != revisao:
+        st.session_state.lancamentos = carregar_lancamentos()
+        st.session_state.posicoes = PositionBook(st.session_state.lancamentos)
+        st.session_state.carteira = carregar_carteira(st.session_state.posicoes)
+        st.session_state.pop("avaliacao", None)
+        st.session_state.revisao_livro = revisao
+
+sincronizar_sessao()
+
+TICKERS = st.session_state.lancamentos['Ativo'].unique()
+
+SIMBOLOS = {"BRL": "R$", "USD": "US$"}
+
+def com_moeda(tabela):
+    # Moeda de cada ativo (custos e resultados ficam na moeda em que o ativo é negociado)
+    return tabela.assign(Moeda=tabela['Ativo'].map(asset_currency))
+
+def por_moeda(tabela, coluna):
+    # Soma da coluna em cada moeda, com o símbolo: reais e dólares não se somam
+    totais = com_moeda(tabela).groupby('Moeda')[coluna].sum()
+    return " | ".join(f"{SIMBOLOS.get(moeda, moeda)} {valor:,.2f}" for moeda, valor in totais.items()) or "0.00"
+
+def lancamentos_aplicados():
+    # Lançamentos aceitos pelo livro de posições: vendas maiores que a posição (posicoes.errors) ficam de fora
+    lancamentos = st.session_state.lancamentos
+    return lancamentos[~lancamentos['ID'].isin(list(st.session_state.posicoes.errors))]
+
+def obter_avaliacao(moeda=None):
+    # A avaliação a mercado fica na sessão e só é refeita quando os preços mudam, o dia vira ou a moeda muda
+    avaliacao = st.session_state.get("avaliacao")
+    if avaliacao is None or not avaliacao.is_current() or avaliacao.currency != moeda:
+        avaliacao = PortfolioValuation(lancamentos_aplicados(), currency=moeda)
+        st.session_state.avaliacao = avaliacao
+    return avaliacao
+
+def novo_lancamento(nome_ativo, quantidade, preco, data_compra, operacao='Compra'):
     if quantidade <= 0 or preco <= 0:
         st.error("Quantidade e preço devem ser positivos.")
-        return
+        return False
 
     # Usando a data de compra fornecida pelo usuário
     data_compra_formatada = data_compra.strftime("%Y-%m-%d")  # Converte para o formato "YYYY-MM-DD"
-    
-    # Criar um novo registro para o ativo
-    novo_registro = pd.DataFrame([
-        [nome_ativo, quantidade, preco, quantidade * preco, data_compra_formatada]
-    ], columns=['Ativo', 'Quantidade', 'Preço', 'Valor', 'Data de Compra'])
 
-    # Copiar a carteira da sessão
-    lancamentos = st.session_state.lancamentos.copy()
+    # Vendas não podem exceder a posição na data
+    try:
+        st.session_state.posicoes.check(nome_ativo, operacao, quantidade, preco, data_compra_formatada)
+    except ValueError as e:
+        st.error(str(e))
+        return False
+    
+    revisao_anterior = st.session_state.get("revisao_livro")
+    id_novo = ledger.add_lancamento(nome_ativo, quantidade, preco, data_compra_formatada, operacao)
 
-    lancamentos = pd.concat([lancamentos, novo_registro], ignore_index=True)
+    if ledger.revision() != revisao_anterior + 1:
+        # Outra sessão também alterou o livro: recarrega tudo
+        sincronizar_sessao()
+        return True
 
-    # Atualizar a sessão com a nova carteira
+    # Criar um novo registro para o ativo
+    novo_registro = pd.DataFrame([
+        [id_novo, nome_ativo, operacao, quantidade, preco, quantidade * preco, data_compra_formatada]
+    ], columns=ledger.COLUNAS)
+
+    # Atualizar a sessão com a nova carteira: só a posição do ativo é recalculada
+    st.session_state.lancamentos = pd.concat([st.session_state.lancamentos, novo_registro], ignore_index=True)
+    st.session_state.posicoes.apply(id_novo, nome_ativo, operacao, quantidade, preco, data_compra_formatada)
+    st.session_state.carteira = carregar_carteira(st.session_state.posicoes)
+    st.session_state.revisao_livro = revisao_anterior + 1
+
+    # Atualiza a avaliação a mercado só a partir da data da nova operação
+    if "avaliacao" in st.session_state:
+        st.session_state.avaliacao.add(nome_ativo, quantidade, preco, data_compra_formatada, operacao=operacao)
+    return True
+
+def aplicar_na_sessao(revisao_anterior, lancamentos):
+    # Depois de gravar uma alteração já aplicada ao livro de posições da sessão: atualiza a cópia da sessão,
+    # ou recarrega tudo se outra sessão também alterou o livro (ou a gravação falhou)
+    if revisao_anterior is None or ledger.revision() != revisao_anterior + 1:
+        st.session_state.revisao_livro = None
+        sincronizar_sessao()
+        return
     st.session_state.lancamentos = lancamentos
-    salvar_dados(lancamentos)
+    st.session_state.carteira = carregar_carteira(st.session_state.posicoes)
+    st.session_state.revisao_livro = revisao_anterior + 1
+    # A avaliação a mercado é refeita na próxima exibição
+    st.session_state.pop("avaliacao", None)
 
-def atualiza_lancamento(id_lancamento, novo_preco=None, nova_quantidade=None, novo_nome=None, nova_data = None, df_lancamentos = None ):
+def atualiza_lancamento(id_lancamento, novo_preco=None, nova_quantidade=None, novo_nome=None, nova_data = None):
     if novo_preco is not None and novo_preco <= 0:
         st.error("O preço deve ser positivo.")
         return
@@ -78,30 +132,61 @@ def atualiza_lancamento(id_lancamento, novo_preco=None, nova_quantidade=None, no
         st.error("A quantidade não pode ser negativa.")
         return
 
+    campos = {}
     if novo_preco is not None:
-        df_lancamentos.loc[df_lancamentos['ID'] == id_lancamento, 'Preço'] = novo_preco
+        campos['Preço'] = novo_preco
 
     if nova_quantidade is not None:
-        df_lancamentos.loc[df_lancamentos['ID'] == id_lancamento, 'Quantidade'] = nova_quantidade
+        campos['Quantidade'] = nova_quantidade
 
     if novo_nome is not None:
-        df_lancamentos.loc[df_lancamentos['ID'] == id_lancamento, 'Ativo'] = novo_nome
+        campos['Ativo'] = novo_nome
 
     if nova_data:
-        df_lancamentos.loc[df_lancamentos['ID'] == id_lancamento, 'Data de Compra'] = nova_data
+        campos['Data de Compra'] = pd.Timestamp(nova_data).strftime("%Y-%m-%d")
+
+    lancamentos = st.session_state.lancamentos.copy()
+    linha = lancamentos['ID'] == id_lancamento
+    if not linha.any():
+        st.error("O lançamento foi removido em outra sessão.")
+        sincronizar_sessao()
+        return
+    for campo, valor in campos.items():
+        lancamentos.loc[linha, campo] = valor
+    lancamentos.loc[linha, 'Valor'] = lancamentos.loc[linha, 'Quantidade'] * lancamentos.loc[linha, 'Preço']
+    _, ativo, operacao, quantidade, preco, _, data = lancamentos.loc[linha, ledger.COLUNAS].iloc[0]
 
-    # Atualizar o valor e data de atualização
-    df_lancamentos.loc[df_lancamentos['ID'] == id_lancamento, 'Valor'] = (
-        df_lancamentos.loc[df_lancamentos['ID'] == id_lancamento, 'Quantidade'] * 
-        df_lancamentos.loc[df_lancamentos['ID'] == id_lancamento, 'Preço']
-    )
-    st.session_state.lancamentos = df_lancamentos
-    salvar_dados(df_lancamentos)
+    # Valida e aplica só no livro de posições da sessão (refazendo apenas os ativos afetados):
+    # a alteração não pode deixar nenhuma venda maior que a posição na data
+    try:
+        st.session_state.posicoes.update(id_lancamento, ativo, operacao, quantidade, preco, data)
+    except ValueError as e:
+        st.error(f"Alteração não realizada: {e}")
+        return
 
-def remove_lancamento(id_ativo, df_lancamentos):
-    df_lancamentos = df_lancamentos.loc[df_lancamentos['ID'] != id_ativo]
-    st.session_state.lancamentos = df_lancamentos
-    salvar_dados(df_lancamentos)
+    # Altera só a linha do lançamento (o Valor é recalculado no próprio livro)
+    revisao_anterior = st.session_state.get("revisao_livro")
+    try:
+        ledger.update_lancamento(id_lancamento, **campos)
+    except KeyError:
+        st.error("O lançamento foi removido em outra sessão.")
+        revisao_anterior = None
+    aplicar_na_sessao(revisao_anterior, lancamentos)
+
+def remove_lancamento(id_lancamento):
+    try:
+        st.session_state.posicoes.remove(id_lancamento)
+    except ValueError as e:
+        st.error(f"Remoção não realizada: {e}")
+        return
+    revisao_anterior = st.session_state.get("revisao_livro")
+    try:
+        ledger.delete_lancamento(id_lancamento)
+    except KeyError:
+        st.error("O lançamento já havia sido removido em outra sessão.")
+        revisao_anterior = None
+    lancamentos = st.session_state.lancamentos
+    aplicar_na_sessao(revisao_anterior, lancamentos[lancamentos['ID'] != id_lancamento].reset_index(drop=True))
 
 # layout streamlit
 st.set_page_config(
@@ -116,7 +201,17 @@ tab1, tab2, tab3, tab4 = st.tabs(["Visualizar Carteira", "Fazer Lançamento", "A
 with tab1:
     # Mostrar a planilha atual
     st.subheader("Carteira:")
-    df_carteira = st.session_state.carteira.copy()
+    metodo_custo = st.radio("Custo das posições:", ["Custo médio", "FIFO"], horizontal=True,
+                            help="FIFO: as vendas consomem primeiro os lotes comprados há mais tempo.")
+    if metodo_custo == "FIFO":
+        df_carteira = carregar_carteira(st.session_state.posicoes, 'fifo')
+    else:
+        df_carteira = st.session_state.carteira.copy()
+    df_carteira = com_moeda(df_carteira)
+
+    if st.session_state.posicoes.errors:
+        st.warning("Lançamentos ignorados por venderem mais que a posição: "
+                   + ", ".join(str(id_lanc) for id_lanc in st.session_state.posicoes.errors))
 
     st.dataframe(
         df_carteira,
@@ -130,28 +225,71 @@ with tab1:
             "Valor": st.column_config.NumberColumn(
                 "Valor Investido",
                 help="Description",
-                format="R$ %.2f",
+                format="%.2f",
             ),
             "Preço Médio": st.column_config.NumberColumn(
                 "Preço Médio",
                 help="Description",
-                format="R$ %.2f",
-            )
+                format="%.2f",
+            ),
+            "Resultado Realizado": st.column_config.NumberColumn(
+                "Resultado Realizado",
+                help="Ganho ou perda das vendas já realizadas",
+                format="%.2f",
+            ),
+            "Moeda": st.column_config.TextColumn(
+                "Moeda",
+                help="Moeda do ativo, em que estão o valor investido, o preço médio e o resultado",
+            ),
         },
         hide_index=True,
         )
 
-    # Mostrar o valor total da carteira
+    # Mostrar o valor total da carteira, em cada moeda (custos na moeda de cada ativo)
     st.subheader("Valor total da carteira")
-    st.write(f"R$ {st.session_state.carteira['Valor'].sum():.2f}")
+    st.write(por_moeda(df_carteira, 'Valor'))
+    metodo = 'fifo' if metodo_custo == "FIFO" else 'media'
+    realizado = st.session_state.posicoes.table(metodo, abertas=False)
+    st.write(f"Resultado realizado em vendas: {por_moeda(realizado, 'Resultado Realizado')}")
 
-    gaph1, gaph2 = st.tabs(["Crescimento da Carteira", "Distribuição de Ativos"])
+    with st.expander("Lotes em aberto"):
+        ativo_lotes = st.selectbox("Ativo:", df_carteira['Ativo'], key="ativo_lotes")
+        if ativo_lotes:
+            st.dataframe(st.session_state.posicoes.lots(ativo_lotes), hide_index=True)
+
+    if not st.session_state.lancamentos.empty:
+        moeda = st.radio("Moeda da avaliação:", ["Original", "BRL", "USD"], horizontal=True,
+                         help="Original: cada ativo na sua moeda. BRL/USD: convertidos pelo câmbio de cada dia.")
+        st.session_state.moeda_avaliacao = None if moeda == "Original" else moeda
+        try:
+            avaliacao = obter_avaliacao(st.session_state.moeda_avaliacao)
+        except ValueError as e:
+            st.warning(str(e))
+            st.session_state.moeda_avaliacao = None
+            avaliacao = obter_avaliacao()
+        # Na moeda original os totais são separados por moeda: reais e dólares não se somam
+        moedas_avaliacao = avaliacao.currencies()
+        for moeda_total in moedas_avaliacao:
+            simbolo = SIMBOLOS.get(moeda_total, "")
+            sufixo = f" ({moeda_total})" if len(moedas_avaliacao) > 1 else ""
+            totais = avaliacao.totals(asset_currency=moeda_total).iloc[-1]
+            col_investido, col_mercado, col_resultado = st.columns(3)
+            col_investido.metric(f"Valor Investido{sufixo}", f"{simbolo} {totais['Valor Investido']:,.2f}")
+            col_mercado.metric(f"Valor de Mercado{sufixo}", f"{simbolo} {totais['Valor de Mercado']:,.2f}")
+            col_resultado.metric(f"Resultado{sufixo}", f"{simbolo} {totais['Resultado']:,.2f}", f"{totais['Retorno (%)']:.2f}%")
+        with st.expander("Posição a mercado por ativo"):
+            st.caption("Ativos sem histórico de preços são avaliados pelo preço do último lançamento.")
+            st.dataframe(avaliacao.by_asset(), hide_index=True)
+
+    gaph1, gaph2, gaph3 = st.tabs(["Crescimento da Carteira", "Distribuição de Ativos", "Projeção"])
     
     with gaph1:
         if 'lancamentos' not in st.session_state or st.session_state.lancamentos.empty:
             st.info("Adicione ativos para visualizar a composição da carteira.")
             st.stop()
-        lancamentos = st.session_state.lancamentos.copy()
+        lancamentos = lancamentos_aplicados().copy()
+        # Vendas retiram capital: entram negativas no valor investido acumulado
+        lancamentos['Valor'] = lancamentos['Valor'].where(lancamentos['Operação'] != 'Venda', -lancamentos['Valor'])
         # Seleção de opções
         tipo_grafico = st.radio("Escolha a escala do gráfico:", ("Anual", "Mensal", "Diário"))
         periodo_opcao = st.selectbox("Selecione o período:", ["Máximo", "Últimos 6 meses", "Últimos 12 meses", "Últimos 2 anos", "Últimos 5 anos"])
@@ -181,44 +319,35 @@ with tab1:
             st.warning("Nenhum lançamento encontrado no intervalo selecionado.")
             st.stop()
 
-        # Agrupamento de dados e cálculo do valor acumulado
-        lancamentos['dia'] = lancamentos['Data de Compra'].dt.date
-
+        # Agrupamento de dados e cálculo do valor acumulado, separado por moeda (reais e dólares não se somam)
+        lancamentos['Moeda'] = lancamentos['Ativo'].map(asset_currency)
+        freq = {'Diário': 'D', 'Mensal': 'MS', 'Anual': 'YS'}[tipo_grafico]
         if tipo_grafico == "Diário":
-            df_growth = lancamentos.groupby('dia').agg({'Valor': 'sum'}).reset_index()
-        elif tipo_grafico == 'Mensal':
-            lancamentos['mes'] = lancamentos['Data de Compra'].dt.to_period('M')
-            df_growth = lancamentos.groupby('mes').agg({'Valor': 'sum'}).reset_index()
-            df_growth['dia'] = df_growth['mes'].dt.start_time
+            lancamentos['dia'] = lancamentos['Data de Compra'].dt.normalize()
         else:
-            lancamentos['ano'] = lancamentos['Data de Compra'].dt.to_period('Y')
-            df_growth = lancamentos.groupby('ano').agg({'Valor': 'sum'}).reset_index()
-            df_growth['dia'] = df_growth['ano'].dt.start_time
-
-        df_growth['Valor Acumulado'] = df_growth['Valor'].cumsum()
-
-        # Reindexar para incluir todos os intervalos e preencher valores ausentes
-        freq = {'Diário': 'D', 'Mensal': 'MS', 'Anual': 'YS'}[tipo_grafico]
-        all_dates = pd.date_range(df_growth['dia'].min(), df_growth['dia'].max(), freq=freq)
+            lancamentos['dia'] = lancamentos['Data de Compra'].dt.to_period('M' if tipo_grafico == 'Mensal' else 'Y').dt.start_time
+        aportes = lancamentos.pivot_table(index='dia', columns='Moeda', values='Valor', aggfunc='sum', fill_value=0)
 
-        df_growth = df_growth.set_index('dia').reindex(all_dates).ffill().reset_index()
-        df_growth = df_growth.rename(columns={'index': 'dia'})
+        # Reindexar para incluir todos os intervalos (sem aportes no intervalo, o acumulado se mantém)
+        all_dates = pd.date_range(aportes.index.min(), aportes.index.max(), freq=freq)
+        df_growth = (aportes.reindex(all_dates, fill_value=0).cumsum().rename_axis('dia').reset_index()
+                     .melt(id_vars='dia', var_name='Moeda', value_name='Valor Acumulado'))
 
         # Limitar o número de ticks no eixo X
         max_ticks = 6
-        tick_step = max(1, len(df_growth) // max_ticks)
-        tick_vals = df_growth['dia'][::tick_step]
+        tick_step = max(1, len(all_dates) // max_ticks)
+        tick_vals = all_dates[::tick_step]
 
         # Criando o gráfico de barras
-        fig_growth = px.bar(df_growth, x='dia', y='Valor Acumulado', 
+        fig_growth = px.bar(df_growth, x='dia', y='Valor Acumulado', color='Moeda', barmode='group',
                             title=f"Crescimento do Valor Acumulado Investido - {tipo_grafico}",
-                            labels={'Valor Acumulado': 'Valor Total Investido (R$)', 'dia': 'Data'})
+                            labels={'Valor Acumulado': 'Valor Total Investido', 'dia': 'Data'})
 
         # Ajustando o layout
         fig_growth.update_layout(
             xaxis_title='',
-            yaxis_title='Valor Total Investido Acumulado (R$)',
-            showlegend=False,
+            yaxis_title='Valor Total Investido Acumulado',
+            showlegend=aportes.shape[1] > 1,
             xaxis=dict(
                 tickvals=tick_vals,
                 tickformat="%d/%m/%Y" if tipo_grafico == "Diário" else "%m/%Y",
@@ -228,31 +357,51 @@ with tab1:
 
         # Adicionando os valores nas barras
         fig_growth.update_traces(
-            text=df_growth['Valor Acumulado'],
+            texttemplate='%{y:,.2f}',
             textposition='inside',
             textfont=dict(size=12)
         )
 
         st.plotly_chart(fig_growth)
 
+        # Valor de mercado diário contra o valor investido acumulado (uma curva por moeda na moeda original)
+        avaliacao = obter_avaliacao(st.session_state.get("moeda_avaliacao"))
+        for moeda_total in avaliacao.currencies():
+            evolucao = avaliacao.totals(pd.Timestamp(data_inicio), pd.Timestamp(data_fim), asset_currency=moeda_total)
+            evolucao = downsample_frame(evolucao.reset_index(), 'Data', 'Valor de Mercado',
+                                        points_for_range(data_inicio, data_fim))
+            fig_mercado = px.line(evolucao.melt(id_vars='Data', value_vars=['Valor Investido', 'Valor de Mercado'],
+                                                var_name='Série', value_name='Valor'),
+                                  x='Data', y='Valor', color='Série',
+                                  title=f"Valor de Mercado x Valor Investido ({SIMBOLOS.get(moeda_total, moeda_total)})",
+                                  labels={'Data': ''})
+            st.plotly_chart(fig_mercado)
+
     with gaph2:
         if not st.session_state.carteira.empty:
             st.subheader("Composição da Carteira")
-            carteira_agrupada = st.session_state.carteira.copy()
+            carteira_moedas = com_moeda(st.session_state.carteira)
+            # Uma distribuição por moeda: custos em reais e em dólares não entram na mesma pizza
+            moeda_pizza = carteira_moedas['Moeda'].iloc[0]
+            if carteira_moedas['Moeda'].nunique() > 1:
+                moeda_pizza = st.radio("Moeda:", sorted(carteira_moedas['Moeda'].unique()), horizontal=True,
+                                       key="moeda_pizza")
+            carteira_agrupada = carteira_moedas[carteira_moedas['Moeda'] == moeda_pizza].reset_index(drop=True)
+            simbolo = SIMBOLOS.get(moeda_pizza, moeda_pizza)
 
             # Criar o gráfico de pizza com Plotly
             fig = px.pie(
                 carteira_agrupada,
                 values='Valor',
                 names='Ativo',
-                title="Distribuição dos Ativos",
+                title=f"Distribuição dos Ativos ({simbolo})",
                 hole=0,  # Sem formato de rosca
             )
 
             # Adicionar slider para controlar qual fatia será "expandida"
             selected_ativo = st.selectbox("Escolha o ativo para expandir:", carteira_agrupada['Ativo'])
-            valor_investido = float(carteira_agrupada.loc[carteira_agrupada['Ativo'] == selected_ativo, 'Valor'])
-            st.markdown(f'{selected_ativo} - Valor investido: R${valor_investido}')
+            valor_investido = float(carteira_agrupada.loc[carteira_agrupada['Ativo'] == selected_ativo, 'Valor'].iloc[0])
+            st.markdown(f'{selected_ativo} - Valor investido: {simbolo} {valor_investido:,.2f}')
 
             # Encontrar o índice da fatia selecionada
             ativo_index = carteira_agrupada[carteira_agrupada['Ativo'] == selected_ativo].index[0]
@@ -285,21 +434,77 @@ with tab1:
         else:
             st.info("Adicione ativos para visualizar a composição da carteira.")
 
+    with gaph3:
+        # Ativos da carteira com histórico de preços armazenado, com peso proporcional ao valor investido
+        carteira_proj = st.session_state.carteira.copy()
+        carteira_proj['Ticker'] = carteira_proj['Ativo'].str.replace('.SA', '', regex=False)
+        carteira_proj = carteira_proj[carteira_proj['Ticker'].isin(get_tickers())]
+
+        if carteira_proj.empty:
+            st.info("Nenhum ativo da carteira possui histórico de preços para a projeção.")
+        else:
+            anos_proj = st.slider("Horizonte (anos):", 1, 30, 10, key="anos_projecao")
+            # Pesos e capital numa só moeda: a da avaliação ou, sem ela, a dos ativos (reais se misturados)
+            moedas_proj = carteira_proj['Ativo'].map(asset_currency)
+            moeda_proj = st.session_state.get("moeda_avaliacao")
+            if moeda_proj is None:
+                moeda_proj = moedas_proj.iloc[0] if moedas_proj.nunique() == 1 else "BRL"
+            try:
+                if (moedas_proj == moeda_proj).all():
+                    moeda_simulacao, pesos = None, carteira_proj['Valor'].to_numpy()
+                else:
+                    # Custos convertidos pelo câmbio mais recente; os retornos também na moeda escolhida
+                    taxa = fx.rate_at(get_price_matrix(), [pd.Timestamp.today()])[0]
+                    moeda_simulacao = moeda_proj
+                    pesos = fx.convert_amounts(carteira_proj['Valor'], moedas_proj, taxa, moeda_proj)
+                capital = float(pesos.sum())
+                bandas, distribuicao = simulation.get_projection(
+                    carteira_proj['Ticker'], pesos, years=anos_proj, initial=capital,
+                    start=pd.Timestamp.today(), currency=moeda_simulacao)
+            except ValueError as e:
+                st.info(str(e))
+            else:
+                st.markdown(f"Ativos considerados: {', '.join(carteira_proj['Ticker'])}")
+                st.dataframe(pd.DataFrame([distribuicao]), hide_index=True)
+                fig_proj = px.line(bandas.rename_axis("Data").reset_index().melt(id_vars="Data", var_name="Percentil", value_name="Valor"),
+                                   x="Data", y="Valor", color="Percentil", labels={"Valor": f"Valor Projetado ({SIMBOLOS.get(moeda_proj, moeda_proj)})", "Data": ""})
+                st.plotly_chart(fig_proj)
+
 with tab2:
     st.subheader("Fazer Lançamento")
+    operacao = st.radio("Operação:", ledger.OPERACOES, horizontal=True)
     nome_ativo = st.selectbox("Selecione ou busque o ativo:", options=TICKERS)
 
     quantidade = st.number_input("Quantidade:", min_value=0.00, step=0.001)
     preco = st.number_input("Preço:", min_value=0.0, step=0.01)
-    data_compra = st.date_input("Data de compra:", min_value=datetime(2000, 1, 1), max_value=datetime.today())
+    data_compra = st.date_input("Data da operação:", min_value=datetime(2000, 1, 1), max_value=datetime.today())
 
     if st.button("Adicionar"):
         if nome_ativo and quantidade > 0 and preco > 0:
             # Chama a função adiciona_ativo passando a data de compra
-            novo_lancamento(nome_ativo, quantidade, preco, data_compra)
-            st.success(f"Ativo {nome_ativo} adicionado com sucesso!")
+            if novo_lancamento(nome_ativo, quantidade, preco, data_compra, operacao):
+                st.success(f"{operacao} de {nome_ativo} registrada com sucesso!")
         else:
             st.error("Por favor, preencha todos os campos corretamente.")
+
+    st.subheader("Importar Extrato")
+    st.caption("CSV da corretora ou da B3 com as colunas de ativo (ex.: Código de Negociação), quantidade, "
+               "preço, data do negócio e operação (Compra/Venda, ou Entrada/Saída no extrato de movimentação). "
+               "Proventos e outras movimentações sem negociação são ignorados. "
+               "Lançamentos já existentes não são duplicados.")
+    extrato = st.file_uploader("Arquivo do extrato:", type=["csv"])
+    if extrato is not None and st.button("Importar"):
+        try:
+            resumo = ledger.import_statement(extrato)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            sincronizar_sessao()
+            st.success(f"{resumo['importadas']} lançamentos importados de {resumo['lidas']} linhas "
+                       f"({resumo['duplicadas']} já existentes, {resumo['ignoradas']} movimentações sem negociação).")
+            if resumo['rejeitadas']:
+                st.warning(f"{resumo['rejeitadas']} linhas rejeitadas.")
+                st.dataframe(resumo['rejeicoes'], hide_index=True)
             
 with tab3:
     # Atualizar/Remover lancamento
@@ -308,13 +513,13 @@ with tab3:
 
         # Mostrar lista de lancamentos com suas quantidades e preços
         lancamentos_att = st.session_state.lancamentos.copy()
-        lancamentos_att['ID'] = lancamentos_att.index + 1
         lancamentos_disponiveis = lancamentos_att.iloc[::-1]
         lancamentos_disponiveis['Ativo'] = (" Lançamento: " + lancamentos_disponiveis['ID'].astype(str)+ 
                                                 " | "+                lancamentos_disponiveis['Ativo'] + 
                                             " | Quantidade: " + lancamentos_disponiveis['Quantidade'].astype(str) + 
                                             " | Preço: R$ " + lancamentos_disponiveis['Preço'].astype(str) + 
-                                            " | Data: "+lancamentos_disponiveis['Data de Compra']
+                                            " | Data: "+lancamentos_disponiveis['Data de Compra'] +
+                                            " | Operação: " + lancamentos_disponiveis['Operação']
                                             )
 
         ativo_atualizar = st.selectbox("Selecione o lançamento a atualizar", lancamentos_disponiveis['Ativo'].values)
@@ -327,7 +532,7 @@ with tab3:
             nova_quantidade = st.number_input("Nova quantidade:", min_value=0.00, step=0.01, key="atualizar_quantidade")
             if st.button("Atualizar Quantidade"):
                 if nova_quantidade >= 0:
-                    atualiza_lancamento(id_lancamento, nova_quantidade=nova_quantidade, df_lancamentos = lancamentos_att)
+                    atualiza_lancamento(id_lancamento, nova_quantidade=nova_quantidade)
                     st.success("Quantidade atualizada com sucesso!")
                 else:
                     st.error("Por favor, insira uma quantidade válida.")
@@ -337,7 +542,7 @@ with tab3:
             novo_nome = st.text_input("Novo Nome:", max_chars=20, key="atualizar_nome")
             if st.button("Atualizar Nome"):
                 if novo_nome:
-                    atualiza_lancamento(id_lancamento, novo_nome=novo_nome, df_lancamentos = lancamentos_att)
+                    atualiza_lancamento(id_lancamento, novo_nome=novo_nome)
                     st.success("Nome atualizado com sucesso!")
                 else:
                     st.error("Por favor, insira um nome válido.")
@@ -347,7 +552,7 @@ with tab3:
             novo_preco = st.number_input("Novo Preço:", min_value=0.0, step=0.001, key="atualizar_preco")
             if st.button("Atualizar Preço"):
                 if novo_preco > 0:
-                    atualiza_lancamento(id_lancamento, novo_preco=novo_preco, df_lancamentos = lancamentos_att)
+                    atualiza_lancamento(id_lancamento, novo_preco=novo_preco)
                     st.success("Preço atualizado com sucesso!")
                 else:
                     st.error("Por favor, insira um preço válido.")
@@ -358,21 +563,22 @@ with tab3:
             nova_data = st.date_input(label = "Nova data:", value = data_lanc)
             if st.button("Atualizar Data"):
                 if nova_data:
-                    atualiza_lancamento(id_lancamento, nova_data=nova_data, df_lancamentos = lancamentos_att)
+                    atualiza_lancamento(id_lancamento, nova_data=nova_data)
                     st.success("Data atualizada com sucesso!")
                 else:
                     st.error("Por favor, insira uma data.")
 
         with st.expander("Remover Lançamento"):
             if st.button("Remover Lançamento"):
-                remove_lancamento(id_lancamento, df_lancamentos=lancamentos_att)
+                remove_lancamento(id_lancamento)
                 st.success("Ativo removido com sucesso!")
     else:
         st.info("Adicione ativos à lançamentos para atualizá-los.")
 
 def atualizar_contexto(df):
-    if "message" not in st.session_state:
-        st.session_state.message = []
+    # Conversa gravada em disco; a sessão mantém só as mensagens recentes
+    if "historico_carteira" not in st.session_state:
+        st.session_state.historico_carteira = chat_history.ChatHistory(f"carteira:{chat_history.session_id()}")
 
     # Gerar o texto da tabela com os dados atualizados
     descricao_colunas = """
@@ -381,6 +587,7 @@ def atualizar_contexto(df):
                         - 'Quantidade': A quantidade de unidades do ativo que o cliente possui.
                         - 'Preço Médio': O preço médio do ativo no momento da última atualização.
                         - 'Valor': O valor total investido no ativo (Quantidade * Preço).
+                        - 'Resultado Realizado': O ganho ou a perda das vendas já realizadas do ativo.
                         - 'Última Atualização': A data e hora da última atualização dos dados.
                         """
     
@@ -402,11 +609,8 @@ def atualizar_contexto(df):
                 {df.to_string(index=False)}
                 """
 
-    # Atualizar a mensagem do tipo 'system' no histórico
-    st.session_state.message = [
-        msg for msg in st.session_state.message if msg["role"] != "system"
-    ]
-    st.session_state.message.insert(0, {"role": "system", "content": contexto})
+    # Atualizar a mensagem do tipo 'system' (não é gravada no histórico)
+    st.session_state.historico_carteira.set_system(contexto)
 
 carteira_agrupada = st.session_state.carteira.copy()
 atualizar_contexto(carteira_agrupada)
@@ -415,70 +619,94 @@ with tab4:
 
     st.title("Pergunte sobre investimentos")
 
-    try:
-        client = Groq(api_key=API_KEY)
-    except Exception as e:
-        st.error(f"Erro ao configurar o cliente Groq: {str(e)}")
-        st.stop()
-
-    if "message" not in st.session_state:
-        st.session_state.message = [
-            {
-            "role": "system",
-            "content": (
-                "Responda em no máximo 10 palavras, focando em precisão."
-
-            ),}
-        ]
+    historico = st.session_state.historico_carteira
     
     if "user_input" not in st.session_state:
      st.session_state.user_input = ""
 
-  
+    if "perguntas_carteira" not in st.session_state:
+        st.session_state.perguntas_carteira = []
+
     def send_message():
+        # Enfileira a pergunta no executor em segundo plano; a página segue respondendo enquanto isso.
+        # A pergunta só entra no histórico junto com a resposta, para manter a ordem com várias na fila.
         if st.session_state.user_input:
-            user_message = st.session_state.user_input
-
-            st.session_state.message.append({"role": "user", "content": user_message})
-
+            pergunta = {"role": "user", "content": st.session_state.user_input}
             st.session_state.user_input = ""
-
+            # Conversas longas: só as mensagens recentes vão ao modelo, as antigas resumidas
+            mensagens = chat_context.build_messages(historico.messages + [pergunta])
             try:
-                response = client.chat.completions.create(
-                    messages=st.session_state.message,
-                    model="llama3-8b-8192",
-                    temperature=0.05,
-                    max_tokens=1000
-                )
-                assistant_message = response.choices[0].message.content
-                st.session_state.message.append({"role": "assistant", "content": assistant_message})
-            except Exception as e:
-                st.error(f"Erro ao consultar o modelo: {str(e)}")
+                job_id = llm_executor.submit(chat_history.session_id(), mensagens, temperature=0.05, max_tokens=1000)
+            except RuntimeError as e:
+                st.session_state.erro_carteira = str(e)
+                return
+            st.session_state.perguntas_carteira.append(
+                {"id": job_id, "pergunta": pergunta, "tokens": chat_context.payload_tokens(mensagens)}
+            )
+
+    @st.fragment(run_every=0.5 if st.session_state.perguntas_carteira else None)
+    def resposta_assistente():
+        # Só este trecho é refeito enquanto as respostas chegam; o resto da página não espera por elas
+        perguntas = st.session_state.perguntas_carteira
+        historico = st.session_state.historico_carteira
+        concluidas = 0
+        while perguntas:
+            job = llm_executor.poll(perguntas[0]["id"])
+            if job is not None and job.pending:
+                break
+            pendente = perguntas.pop(0)
+            concluidas += 1
+            if job is not None and job.status == llm_executor.DONE:
+                historico.append(pendente["pergunta"], {"role": "assistant", "content": job.text})
+                st.session_state.latencia_carteira = {**job.stats, "tokens": pendente["tokens"]}
+            else:
+                st.session_state.erro_carteira = f"Erro ao consultar o modelo: {job.error if job else 'resposta descartada'}"
+            if job is not None:
+                llm_executor.discard(job.id)
+        if concluidas:
+            # Atualiza o histórico da página inteira e encerra a consulta periódica se não há mais perguntas
+            st.rerun()
+
+        if "erro_carteira" in st.session_state:
+            st.error(st.session_state.pop("erro_carteira"))
+        if perguntas:
+            for pendente in perguntas:
+                job = llm_executor.poll(pendente["id"])
+                st.markdown(f"**Usuário:** {pendente['pergunta']['content']}")
+                if job is not None and job.text:
+                    st.markdown(f"**Assistente:** {job.text}▌")
+                else:
+                    st.caption(f"Pergunta {job.status if job else 'descartada'}...")
+        elif historico.recent:
+            last_user_message = historico.last("user")
+            last_assistant_message = historico.last("assistant")
+            
+            if last_user_message:
+                st.markdown(f"**Usuário:** {last_user_message['content']}")
+            if last_assistant_message:
+                st.markdown(f"**Assistente:** {last_assistant_message['content']}")
+
+        if st.session_state.get("latencia_carteira") and not perguntas:
+            st.caption(assistant.latency_caption(st.session_state.latencia_carteira))
 
     with st.container(border = True):
         st.text_input(
         "Digite sua pergunta:",
         key="user_input",
-        on_change=send_message(),
+        on_change=send_message,
         help = 'Meta AI Llama3-8b-8192 ',
         placeholder="Escreva algo e pressione Enter...",)
 
-        if len(st.session_state.message) > 1:
-            last_user_message = next((msg for msg in reversed(st.session_state.message) if msg["role"] == "user"), None)
-            last_assistant_message = next((msg for msg in reversed(st.session_state.message) if msg["role"] == "assistant"), None)
-            
-            if last_user_message:
-                st.markdown(f"**Usuário:** {last_user_message['content']}")
-            if last_assistant_message:
-                st.markdown(f"**Assistente:** {last_assistant_message['content']}")
+        resposta_assistente()
         
     st.markdown("")
     st.markdown("")
 
     
     with st.expander("**Últimas mensagens:**"):
+        # Última página de mensagens e as anteriores já carregadas (cada clique lê só mais uma página do disco)
         with st.container(border = True, height=600):
-            recent_messages = st.session_state.message[-10:][::1]
+            recent_messages = historico.page()
             
             for msg in recent_messages:
                 if msg["role"] == "user":
@@ -488,6 +716,11 @@ with tab4:
 
                     st.markdown("---")
 
+        if historico.has_more():
+            if st.button("Carregar mensagens anteriores", key="anteriores_carteira"):
+                historico.load_more()
+                st.rerun()
+
     st.markdown("")
     st.markdown("")
 
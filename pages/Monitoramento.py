@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import numpy as np
-from data_collector import load_stock_data
-
-df = load_stock_data()
+from dataset_cache import get_dataset, get_tickers, get_date_bounds, get_bars, slice_dates
+from data_collector import OHLCV_COLUMNS
+from price_matrix import get_price_matrix
+from metrics import get_summary_metrics, get_rolling_metrics
+from downsampling import downsample_frame, points_for_range
 
 st.set_page_config(
     page_title="Monitoramento",  
@@ -18,10 +21,11 @@ st.markdown("Acompanhe a variação das ações desde 2000.")
 if "monitor_tickers" not in st.session_state:
     st.session_state.monitor_tickers = ["AAPL", "MSFT"]
 
-monitor_tickers = st.multiselect("Escolha as ações para monitorar:", df['Ticker'].unique(), default=st.session_state.monitor_tickers)
+monitor_tickers = st.multiselect("Escolha as ações para monitorar:", get_tickers(), default=st.session_state.monitor_tickers)
 
-min_date = df['Datetime'].min().date()
-max_date = df['Datetime'].max().date()
+min_date, max_date = get_date_bounds()
+min_date = min_date.date()
+max_date = max_date.date()
 
 if "selected_dates" not in st.session_state:
     st.session_state.selected_dates = (min_date, max_date)  
@@ -40,21 +44,63 @@ selected_dates = st.sidebar.slider(
 start_date, end_date = selected_dates
 st.write(f"Intervalo selecionado: {start_date} até {end_date}")
 
-df_filtered = df[(df['Datetime'] >= pd.to_datetime(start_date)) & (df['Datetime'] <= pd.to_datetime(end_date))]
+# Lê os tickers selecionados uma vez por versão dos dados; o período do slider é fatiado em memória
+df_filtered = slice_dates(get_dataset(tickers=monitor_tickers), start_date, end_date)
+
+precos = get_price_matrix()
+metricas = get_summary_metrics(start_date, end_date)
+metricas_moveis = get_rolling_metrics()
+# Quantidade de pontos enviada ao navegador por gráfico, conforme o intervalo escolhido
+pontos = points_for_range(start_date, end_date)
+
+tipo_grafico = st.sidebar.radio("Tipo de gráfico:", ["Linha", "Candles"])
+PERIODICIDADES = {"Diário": None, "Semanal": "W", "Mensal": "M"}
+periodicidade = st.sidebar.selectbox("Periodicidade dos candles:", list(PERIODICIDADES),
+                                     disabled=tipo_grafico != "Candles")
 
 for ticker in monitor_tickers:
-    ticker_data = df_filtered[df_filtered['Ticker'] == ticker]
+    # Fatia a coluna do ticker na matriz de preços em vez de filtrar o DataFrame inteiro
+    ticker_data = precos.series(ticker, start_date, end_date).rename('Close').rename_axis('Datetime').reset_index()
+    if ticker_data.empty:
+        continue
     
     ticker_data['Variation'] = ticker_data['Close'].pct_change() * 100  # Variação em %
 
-    fig = px.line(ticker_data, x='Datetime', y='Close', title=f"Preço de Fechamento - {ticker}")
-    st.plotly_chart(fig, use_container_width=True)
+    if tipo_grafico == "Candles":
+        regra = PERIODICIDADES[periodicidade]
+        if regra is None:
+            candles = slice_dates(get_dataset(tickers=[ticker], columns=OHLCV_COLUMNS), start_date, end_date)
+        else:
+            # Agregação feita em lotes no armazenamento, sem carregar o histórico diário; os períodos
+            # (indexados pelo início) são fatiados em memória a partir do que contém a data inicial
+            inicio_periodo = pd.Timestamp(start_date).to_period(regra).start_time
+            candles = slice_dates(get_bars(regra, tickers=[ticker]), inicio_periodo, end_date)
+        candles = candles.dropna(subset=['Open'])
+        if candles.empty:
+            st.info(f"Sem dados de abertura/máxima/mínima para {ticker}. Colete os dados novamente.")
+        else:
+            fig = go.Figure(go.Candlestick(x=candles['Datetime'], open=candles['Open'], high=candles['High'],
+                                           low=candles['Low'], close=candles['Close']))
+            fig.update_layout(title=f"{periodicidade} - {ticker}", xaxis_rangeslider_visible=False)
+            st.plotly_chart(fig, use_container_width=True)
+    else:
+        grafico = downsample_frame(ticker_data, 'Datetime', 'Close', pontos)
+        fig = px.line(grafico, x='Datetime', y='Close', title=f"Preço de Fechamento - {ticker}")
+        st.plotly_chart(fig, use_container_width=True)
 
     last_row = ticker_data.iloc[-1]
     st.markdown(f"**Resultado do {ticker} no final do dia**")
     st.markdown(f"Preço de Fechamento: {last_row['Close']:.2f}")
     st.markdown(f"Variação do Dia: {last_row['Variation']:.2f}%")
 
+    if ticker in metricas.index:
+        st.dataframe(metricas.loc[[ticker]], hide_index=True)
+    with st.expander(f"Risco móvel de 12 meses - {ticker}"):
+        indicador = st.radio("Indicador:", list(metricas_moveis), horizontal=True, key=f"indicador_{ticker}")
+        serie = metricas_moveis[indicador][ticker].loc[pd.Timestamp(start_date):pd.Timestamp(end_date)].rename(indicador).rename_axis("Datetime").reset_index()
+        serie = downsample_frame(serie, "Datetime", indicador, pontos)
+        st.plotly_chart(px.line(serie, x="Datetime", y=indicador, labels={"Datetime": ""}), use_container_width=True)
+
 st.markdown("### Dados das Ações")
 st.dataframe(df_filtered)
 
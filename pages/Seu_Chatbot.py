@@ -3,110 +3,159 @@ import csv
 import json
 import ast
 import toml
+import hashlib
 import streamlit as st
 
-from groq import Groq
 from dotenv import load_dotenv
 
+import assistant
+import chat_context
+import chat_history
+import llm_executor
+
 
 st.title("Chat com LLaMA 3 usando Groq API")
 
 # config = toml.load("senhas.toml")
 # API_KEY = config['api_key']['GROQ_API_KEY']
-API_KEY = st.secrets['api_key']['GROQ_API_KEY']
-
-try:
-    client = Groq(api_key=API_KEY)
-except Exception as e:
-    st.error(f"Erro ao configurar o cliente Groq: {str(e)}")
-    st.stop()
+# A chave é lida uma única vez pelo executor do assistente (llm_executor.get_client)
 
-if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {"role": "system", "content": "Responda sempre em portugues."}
-    ]
+# Conversa gravada em disco; a sessão mantém só as mensagens recentes
+if "historico_chatbot" not in st.session_state:
+    st.session_state.historico_chatbot = chat_history.ChatHistory(
+        f"chatbot:{chat_history.session_id()}",
+        system=[{"role": "system", "content": "Responda sempre em portugues."}],
+    )
 
 # Inicializar estado do campo de texto
 if "user_input" not in st.session_state:
     st.session_state.user_input = ""
 
-MAX_CHARACTERS = 10000  # Limite de caracteres para o conteúdo do arquivo
+if "perguntas_chatbot" not in st.session_state:
+    st.session_state.perguntas_chatbot = []
 
 def process_file(uploaded_file):
+    """Texto do arquivo e, para CSV, a linha de cabeçalho (repetida em cada trecho indexado)."""
     try:
         # Identificar o tipo de arquivo pela extensão
         file_extension = uploaded_file.name.split(".")[-1].lower()
+        file_content = uploaded_file.getvalue().decode("utf-8")
+        header = None
         
         if file_extension == "csv":
-            file_content = uploaded_file.read().decode("utf-8")
             reader = csv.reader(file_content.splitlines())
-            content_as_text = "\n".join([", ".join(row) for row in reader])
+            rows = [", ".join(row) for row in reader]
+            header, content_as_text = (rows[0], "\n".join(rows[1:])) if rows else (None, "")
         
         elif file_extension == "json":
-            file_content = uploaded_file.read().decode("utf-8")
             json_data = json.loads(file_content)
-            content_as_text = json.dumps(json_data, indent=2)
+            content_as_text = json.dumps(json_data, indent=2, ensure_ascii=False)
         
         elif file_extension == "py":
-            file_content = uploaded_file.read().decode("utf-8")
             ast.parse(file_content)  # Garante que o código é válido
             content_as_text = file_content
 
         elif file_extension == "txt":
-            file_content = uploaded_file.read().decode("utf-8")
             content_as_text = file_content
         
         else:
             st.error(f"Formato de arquivo não suportado: {file_extension}")
             return None
         
-        # Verificar tamanho do conteúdo
-        if len(content_as_text) > MAX_CHARACTERS:
-            st.warning(f"O arquivo {uploaded_file.name} é muito extenso. Apenas os primeiros {MAX_CHARACTERS} caracteres foram considerados.")
-            return content_as_text[:MAX_CHARACTERS]
-        
-        return content_as_text
+        return content_as_text, header
     
     except Exception as e:
         st.error(f"Erro ao processar o arquivo {uploaded_file.name}: {str(e)}")
         return None
 
-def send_message(uploaded_files=None):
+def index_files(uploaded_files):
+    """
+    Índice dos trechos dos arquivos anexados, guardado na sessão: cada arquivo é lido e indexado
+    uma única vez; o índice só é refeito quando algum arquivo é removido.
+    """
+    arquivos = {
+        (f.name, f.size, hashlib.md5(f.getvalue()).hexdigest()): f for f in (uploaded_files or [])
+    }
+    index = st.session_state.get("chunk_index")
+    if index is None or any(key not in arquivos for key in st.session_state.get("chunk_keys", ())):
+        index = st.session_state.chunk_index = chat_context.ChunkIndex()
+    for key, uploaded_file in arquivos.items():
+        if key not in index:
+            processed = process_file(uploaded_file)
+            if processed:
+                index.add(key, uploaded_file.name, *processed)
+    st.session_state.chunk_keys = list(arquivos)
+    return index
+
+def send_message():
     if st.session_state.user_input:
-        # Adicionar mensagem do usuário ao histórico
-        user_message = st.session_state.user_input
-        
-        file_contents = []  # Lista para armazenar os conteúdos dos arquivos
-        if uploaded_files:
-            for uploaded_file in uploaded_files:
-                processed_content = process_file(uploaded_file)
-                if processed_content:
-                    file_contents.append(f"\n\nArquivo: {uploaded_file.name}\n\n{processed_content}")
-        
-        # Atualizar o histórico com a mensagem do usuário
-        st.session_state.messages.append({"role": "user", "content": user_message})
+        # A pergunta é enviada no corpo da página, onde os arquivos anexados estão disponíveis
+        st.session_state.nova_pergunta = {"role": "user", "content": st.session_state.user_input}
 
         # Limpar o campo de entrada
         st.session_state.user_input = ""
 
-        try:
-            # Combinar a mensagem do usuário com os dados dos arquivos
-            if file_contents:
-                combined_message = user_message + "\n".join(file_contents)
-                st.session_state.messages.append({"role": "user", "content": combined_message})
 
-            # Realizar a consulta ao modelo com o histórico completo
-            response = client.chat.completions.create(
-                messages=st.session_state.messages,
-                model="llama3-8b-8192",
-                temperature=0.05
-            )
-
-            # Adicionar a resposta do assistente ao histórico
-            assistant_message = response.choices[0].message.content
-            st.session_state.messages.append({"role": "assistant", "content": assistant_message})
-        except Exception as e:
-            st.error(f"Erro ao consultar o modelo: {str(e)}")
+def submit_question(pergunta, index):
+    """
+    Enfileira a pergunta no executor em segundo plano com as mensagens recentes (as antigas resumidas,
+    dentro do orçamento de tokens) e os trechos dos arquivos mais relevantes para ela.
+    A pergunta só entra no histórico junto com a resposta, para manter a ordem com várias na fila.
+    """
+    contexto = index.context(pergunta["content"]) if len(index) else None
+    mensagens = chat_context.build_messages(st.session_state.historico_chatbot.messages + [pergunta], context=contexto)
+    try:
+        job_id = llm_executor.submit(chat_history.session_id(), mensagens, temperature=0.05)
+    except RuntimeError as e:
+        st.session_state.erro_chatbot = str(e)
+        return
+    st.session_state.perguntas_chatbot.append(
+        {"id": job_id, "pergunta": pergunta, "tokens": chat_context.payload_tokens(mensagens)}
+    )
+
+
+def show_answers():
+    # Só este trecho é refeito enquanto as respostas chegam; o resto da página não espera por elas
+    perguntas = st.session_state.perguntas_chatbot
+    historico = st.session_state.historico_chatbot
+    concluidas = 0
+    while perguntas:
+        job = llm_executor.poll(perguntas[0]["id"])
+        if job is not None and job.pending:
+            break
+        pendente = perguntas.pop(0)
+        concluidas += 1
+        if job is not None and job.status == llm_executor.DONE:
+            historico.append(pendente["pergunta"], {"role": "assistant", "content": job.text})
+            st.session_state.latencia_chatbot = {**job.stats, "tokens": pendente["tokens"]}
+        else:
+            st.session_state.erro_chatbot = f"Erro ao consultar o modelo: {job.error if job else 'resposta descartada'}"
+        if job is not None:
+            llm_executor.discard(job.id)
+    if concluidas:
+        # Atualiza o histórico da página inteira e encerra a consulta periódica se não há mais perguntas
+        st.rerun()
+
+    if "erro_chatbot" in st.session_state:
+        st.error(st.session_state.pop("erro_chatbot"))
+    if perguntas:
+        for pendente in perguntas:
+            job = llm_executor.poll(pendente["id"])
+            st.write(f"**Usuário:** {pendente['pergunta']['content']}")
+            if job is not None and job.text:
+                st.write(f"**LLaMA 3:** {job.text}▌")
+            else:
+                st.caption(f"Pergunta {job.status if job else 'descartada'}...")
+    elif historico.recent:
+        last_user_message = historico.last("user")
+        last_assistant_message = historico.last("assistant")
+        if last_user_message:
+            st.write(f"**Usuário:** {last_user_message['content']}")
+        if last_assistant_message:
+            st.write(f"**LLaMA 3:** {last_assistant_message['content']}")
+
+    if st.session_state.get("latencia_chatbot") and not perguntas:
+        st.caption(assistant.latency_caption(st.session_state.latencia_chatbot))
 
 
 # Entrada de texto e upload de múltiplos arquivos
@@ -119,24 +168,22 @@ st.text_input(
     "Digite sua mensagem:",
     key="user_input",
     on_change=send_message,
-    args=(uploaded_files,),
     placeholder="Escreva algo e pressione Enter...",
 )
 
-if len(st.session_state.messages) > 1:
-    last_user_message = next((msg for msg in reversed(st.session_state.messages) if msg["role"] == "user"), None)
-    last_assistant_message = next((msg for msg in reversed(st.session_state.messages) if msg["role"] == "assistant"), None)
-    if last_user_message:
-        st.write(f"**Usuário:** {last_user_message['content']}")
-    if last_assistant_message:
-        st.write(f"**LLaMA 3:** {last_assistant_message['content']}")
+if "nova_pergunta" in st.session_state:
+    submit_question(st.session_state.pop("nova_pergunta"), index_files(uploaded_files))
+
+# Fragmento refeito a cada meio segundo enquanto houver perguntas aguardando resposta
+st.fragment(show_answers, run_every=0.5 if st.session_state.perguntas_chatbot else None)()
 
 st.markdown("")
 st.markdown("")
 
 with st.expander("**Últimas mensagens:**"):
+    # Última página de mensagens e as anteriores já carregadas (cada clique lê só mais uma página do disco)
     with st.container(border = True, height=600):
-        recent_messages = st.session_state.messages[-10:][::1]
+        recent_messages = st.session_state.historico_chatbot.page()
         
         for msg in recent_messages:
             if msg["role"] == "user":
@@ -145,5 +192,10 @@ with st.expander("**Últimas mensagens:**"):
                 st.write(f"**Assistente:** {msg['content']}")
                 st.markdown("---")
 
+    if st.session_state.historico_chatbot.has_more():
+        if st.button("Carregar mensagens anteriores", key="anteriores_chatbot"):
+            st.session_state.historico_chatbot.load_more()
+            st.rerun()
+
 st.markdown("")
 st.markdown("")
@@ -0,0 +1,235 @@
+import bisect
+import pandas as pd
+from collections import deque
+
+# Posições da carteira mantidas lançamento a lançamento: aplicar uma operação custa O(1)
+# (mais os lotes consumidos por uma venda), sem reagrupar o livro inteiro a cada execução.
+# Só uma operação com data anterior à última já aplicada refaz a posição, e apenas do seu ativo;
+# alterações e remoções de lançamentos também refazem apenas os ativos envolvidos.
+
+EPS = 1e-9
+
+
+class Position:
+    """
+    Posição de um ativo pelo custo médio ponderado e pelos lotes FIFO em aberto.
+    `history` guarda os lançamentos aplicados, em ordem de (data, ID).
+    """
+
+    def __init__(self, ativo):
+        self.ativo = ativo
+        self.history = []
+        self._reset()
+
+    def _reset(self):
+        self.quantidade = 0.0
+        self.custo = 0.0
+        self.realizado = 0.0
+        self.lotes = deque()
+        self.realizado_fifo = 0.0
+
+    @property
+    def preco_medio(self):
+        return self.custo / self.quantidade if self.quantidade > EPS else 0.0
+
+    def _apply(self, data, id_lancamento, operacao, quantidade, preco):
+        if operacao == 'Compra':
+            self.quantidade += quantidade
+            self.custo += quantidade * preco
+            self.lotes.append([data, quantidade, preco])
+            return
+        if operacao != 'Venda':
+            raise ValueError(f"Operação desconhecida: {operacao}")
+        if quantidade > self.quantidade + EPS:
+            raise ValueError(f"Venda de {quantidade:g} {self.ativo} em {data:%Y-%m-%d} maior que a posição "
+                             f"de {self.quantidade:g} na data.")
+
+        medio = self.preco_medio
+        self.realizado += quantidade * (preco - medio)
+        self.custo -= quantidade * medio
+        self.quantidade -= quantidade
+
+        restante = quantidade
+        while restante > EPS:
+            lote = self.lotes[0]
+            usado = min(lote[1], restante)
+            self.realizado_fifo += usado * (preco - lote[2])
+            lote[1] -= usado
+            restante -= usado
+            if lote[1] <= EPS:
+                self.lotes.popleft()
+
+        if self.quantidade <= EPS:
+            self.quantidade = self.custo = 0.0
+            self.lotes.clear()
+
+    def _replay(self, history):
+        self._reset()
+        for registro in history:
+            self._apply(*registro)
+
+    def add(self, data, id_lancamento, operacao, quantidade, preco):
+        """Aplica um lançamento; levanta ValueError (sem alterar a posição) se a venda exceder a posição."""
+        registro = (pd.Timestamp(data), id_lancamento, operacao, float(quantidade), float(preco))
+        if not self.history or registro[:2] >= self.history[-1][:2]:
+            self._apply(*registro)
+            self.history.append(registro)
+            return
+
+        # Operação retroativa: refaz a posição deste ativo com o lançamento na ordem certa
+        historico = list(self.history)
+        bisect.insort(historico, registro, key=lambda r: r[:2])
+        try:
+            self._replay(historico)
+        except ValueError:
+            self._replay(self.history)
+            raise
+        self.history = historico
+
+    def remove(self, id_lancamento):
+        """Desfaz um lançamento; levanta ValueError se isso deixar alguma venda posterior sem posição."""
+        historico = [registro for registro in self.history if registro[1] != id_lancamento]
+        try:
+            self._replay(historico)
+        except ValueError:
+            self._replay(self.history)
+            raise
+        self.history = historico
+
+
+class PositionBook:
+    """Posições de todos os ativos; `errors` lista os lançamentos do livro que não puderam ser aplicados."""
+
+    def __init__(self, lancamentos=None):
+        self.positions = {}
+        self.errors = {}
+        self._ativos = {}
+        self._rejected = {}  # ID -> (ativo, operação, quantidade, preço, data) dos lançamentos em `errors`
+        if lancamentos is not None:
+            self.apply_many(lancamentos)
+
+    def apply(self, id_lancamento, ativo, operacao, quantidade, preco, data):
+        """Aplica um lançamento à posição do ativo. Levanta ValueError se for uma venda a descoberto."""
+        posicao = self.positions.get(ativo)
+        if posicao is None:
+            posicao = self.positions[ativo] = Position(ativo)
+        posicao.add(data, id_lancamento, operacao, quantidade, preco)
+        self._ativos[id_lancamento] = ativo
+
+    def apply_many(self, lancamentos):
+        """Aplica os lançamentos do livro em ordem cronológica; os inválidos vão para `errors`."""
+        ordenados = lancamentos.assign(**{'Data de Compra': pd.to_datetime(lancamentos['Data de Compra'])})
+        ordenados = ordenados.sort_values(['Data de Compra', 'ID'], kind='stable')
+        colunas = ['ID', 'Ativo', 'Operação', 'Quantidade', 'Preço', 'Data de Compra']
+        for id_lancamento, ativo, operacao, quantidade, preco, data in ordenados[colunas].itertuples(index=False):
+            try:
+                self.apply(id_lancamento, ativo, operacao, quantidade, preco, data)
+            except ValueError as e:
+                self.errors[id_lancamento] = str(e)
+                self._rejected[id_lancamento] = (ativo, operacao, quantidade, preco, data)
+
+    def check(self, ativo, operacao, quantidade, preco, data):
+        """Valida um lançamento ainda não gravado sem alterar as posições (levanta ValueError)."""
+        if operacao != 'Venda':
+            return
+        posicao = self.positions.get(ativo)
+        teste = Position(ativo)
+        historico = list(posicao.history) if posicao else []
+        # ID infinito: o novo lançamento fica depois dos existentes na mesma data
+        bisect.insort(historico, (pd.Timestamp(data), float('inf'), operacao, float(quantidade), float(preco)),
+                      key=lambda r: r[:2])
+        teste._replay(historico)
+
+    def _records(self, ativo):
+        """Lançamentos do ativo, aplicados e rejeitados: {ID: (data, operação, quantidade, preço)}."""
+        posicao = self.positions.get(ativo)
+        registros = {id_lancamento: (data, operacao, quantidade, preco)
+                     for data, id_lancamento, operacao, quantidade, preco in (posicao.history if posicao else [])}
+        for id_lancamento, (outro, operacao, quantidade, preco, data) in self._rejected.items():
+            if outro == ativo:
+                registros[id_lancamento] = (pd.Timestamp(data), operacao, float(quantidade), float(preco))
+        return registros
+
+    def _replace(self, id_lancamento, novo=None):
+        """
+        Troca o lançamento por `novo` (ativo, operação, quantidade, preço, data), ou o remove com novo=None,
+        refazendo só os ativos envolvidos na mesma ordem de apply_many. Levanta ValueError, sem alterar
+        nada, se algum lançamento aceito passar a ser rejeitado (venda maior que a posição).
+        """
+        anterior = self._ativos.get(id_lancamento, self._rejected.get(id_lancamento, (None,))[0])
+        afetados = {ativo for ativo in (anterior, novo[0] if novo else None) if ativo is not None}
+        registros = {ativo: self._records(ativo) for ativo in afetados}
+        if anterior is not None:
+            del registros[anterior][id_lancamento]
+        if novo is not None:
+            ativo, operacao, quantidade, preco, data = novo
+            registros[ativo][id_lancamento] = (pd.Timestamp(data), operacao, float(quantidade), float(preco))
+
+        teste = PositionBook()
+        for ativo, lancamentos in registros.items():
+            for id_teste, (data, operacao, quantidade, preco) in sorted(lancamentos.items(),
+                                                                         key=lambda item: (item[1][0], item[0])):
+                try:
+                    teste.apply(id_teste, ativo, operacao, quantidade, preco, data)
+                except ValueError as e:
+                    teste.errors[id_teste] = str(e)
+                    teste._rejected[id_teste] = (ativo, operacao, quantidade, preco, data)
+        novos = [id_teste for id_teste in teste.errors if id_teste not in self.errors]
+        if novos:
+            raise ValueError(teste.errors[novos[0]])
+
+        for ativo in afetados:
+            self.positions.pop(ativo, None)
+        for id_antigo in [i for i, registro in self._rejected.items() if registro[0] in afetados]:
+            del self._rejected[id_antigo]
+            del self.errors[id_antigo]
+        self._ativos = {i: ativo for i, ativo in self._ativos.items() if ativo not in afetados}
+        self.positions.update(teste.positions)
+        self._ativos.update(teste._ativos)
+        self.errors.update(teste.errors)
+        self._rejected.update(teste._rejected)
+
+    def update(self, id_lancamento, ativo, operacao, quantidade, preco, data):
+        """
+        Altera um lançamento refazendo só as posições afetadas. Levanta ValueError, sem alterar as posições,
+        se a alteração deixar alguma venda aceita maior que a posição na data.
+        """
+        self._replace(id_lancamento, (ativo, operacao, quantidade, preco, data))
+
+    def remove(self, id_lancamento):
+        """Remove um lançamento refazendo só o seu ativo (ValueError como em `update`)."""
+        self._replace(id_lancamento)
+
+    def table(self, metodo='media', abertas=True):
+        """
+        Posição por ativo: Quantidade, Preço Médio, Valor (custo da posição em aberto) e Resultado Realizado.
+        metodo: 'media' (custo médio ponderado) ou 'fifo' (lotes mais antigos vendidos primeiro).
+        """
+        linhas = []
+        for ativo, posicao in self.positions.items():
+            if abertas and posicao.quantidade <= EPS:
+                continue
+            if metodo == 'fifo':
+                custo = sum(quantidade * preco for _, quantidade, preco in posicao.lotes)
+                realizado = posicao.realizado_fifo
+            else:
+                custo = posicao.custo
+                realizado = posicao.realizado
+            linhas.append({
+                'Ativo': ativo,
+                'Quantidade': posicao.quantidade,
+                'Valor': custo,
+                'Preço Médio': custo / posicao.quantidade if posicao.quantidade > EPS else 0.0,
+                'Resultado Realizado': realizado,
+            })
+        colunas = ['Ativo', 'Quantidade', 'Valor', 'Preço Médio', 'Resultado Realizado']
+        return pd.DataFrame(linhas, columns=colunas).round({'Valor': 2, 'Preço Médio': 4, 'Resultado Realizado': 2})
+
+    def realized(self, metodo='media'):
+        """Resultado realizado total (inclusive de posições já encerradas)."""
+        return sum(p.realizado_fifo if metodo == 'fifo' else p.realizado for p in self.positions.values())
+
+    def lots(self, ativo):
+        """Lotes em aberto do ativo (Data, Quantidade, Preço), do mais antigo ao mais novo."""
+        posicao = self.positions.get(ativo)
+        return pd.DataFrame(list(posicao.lotes) if posicao else [], columns=['Data', 'Quantidade', 'Preço'])
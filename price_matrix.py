@@ -0,0 +1,152 @@
+import os
+import json
+import glob
+import threading
+import numpy as np
+import pandas as pd
+
+from data_collector import DATA_DIR, data_version
+from dataset_cache import get_dataset
+import fx
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+# Campos que podem ser convertidos de moeda (variacao e Volume não são preços)
+PRICE_FIELDS = ('Open', 'High', 'Low', 'Close', 'Adj Close')
+
+_matrices = {}
+_lock = threading.Lock()
+
+
+class PriceMatrix:
+    """
+    Matriz densa de preços (datas x tickers) alinhada por data.
+    Dias sem cotação de um ticker ficam como NaN.
+    """
+
+    def __init__(self, values, dates, tickers):
+        self.values = values
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = list(tickers)
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @property
+    def empty(self):
+        return self.values.size == 0
+
+    def date_slice(self, start_date=None, end_date=None):
+        """Intervalo de linhas entre as datas (inclusive), por busca binária no índice de datas."""
+        inicio = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date), side='left')
+        fim = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), side='right')
+        return slice(inicio, fim)
+
+    def select(self, tickers=None, start_date=None, end_date=None):
+        """
+        Recorte da matriz para os tickers e o período.
+        Retorna (valores, datas, tickers); os valores são uma visão da matriz original
+        quando todos os tickers são selecionados.
+        """
+        linhas = self.date_slice(start_date, end_date)
+        if tickers is None:
+            return self.values[linhas], self.dates[linhas], self.tickers
+        tickers = [ticker for ticker in tickers if ticker in self.columns]
+        colunas = [self.columns[ticker] for ticker in tickers]
+        return self.values[linhas][:, colunas], self.dates[linhas], tickers
+
+    def series(self, ticker, start_date=None, end_date=None, dropna=True):
+        """Série de preços de um ticker no período."""
+        if ticker not in self.columns:
+            return pd.Series(dtype=np.float64, index=pd.DatetimeIndex([]), name=ticker)
+        linhas = self.date_slice(start_date, end_date)
+        serie = pd.Series(self.values[linhas, self.columns[ticker]], index=self.dates[linhas], name=ticker)
+        return serie.dropna() if dropna else serie
+
+    def to_frame(self, tickers=None, start_date=None, end_date=None):
+        valores, datas, tickers = self.select(tickers, start_date, end_date)
+        return pd.DataFrame(valores, index=datas, columns=tickers)
+
+
+def build_price_matrix(data, field='Close'):
+    """Monta a PriceMatrix a partir dos dados no formato longo (Datetime, Ticker, field)."""
+    if data.empty:
+        return PriceMatrix(np.empty((0, 0)), [], [])
+    data = data.drop_duplicates(['Datetime', 'Ticker'], keep='last').astype({'Ticker': str})
+    tabela = data.pivot(index='Datetime', columns='Ticker', values=field).sort_index()
+    return PriceMatrix(tabela.to_numpy(dtype=np.float64), tabela.index, tabela.columns)
+
+
+def _cache_paths(field, version):
+    base = os.path.join(CACHE_DIR, f"{field}-{version}")
+    return base + ".npy", base + ".dates.npy", base + ".tickers.json"
+
+
+def _save(matrix, field, version):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    valores, datas, tickers = _cache_paths(field, version)
+    # Grava em arquivos temporários e renomeia, para outros processos nunca lerem um arquivo pela metade
+    for path, salvar in (
+        (valores, lambda f: np.save(f, matrix.values)),
+        (datas, lambda f: np.save(f, matrix.dates.asi8)),
+        (tickers, lambda f: f.write(json.dumps(matrix.tickers).encode())),
+    ):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            salvar(f)
+        os.replace(tmp, path)
+
+    # Remove versões antigas da mesma matriz
+    for path in glob.glob(os.path.join(CACHE_DIR, f"{field}-*")):
+        if not path.startswith(os.path.join(CACHE_DIR, f"{field}-{version}.")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _load(field, version):
+    valores, datas, tickers = _cache_paths(field, version)
+    if not all(os.path.exists(path) for path in (valores, datas, tickers)):
+        return None
+    with open(tickers) as f:
+        lista_tickers = json.load(f)
+    # mmap: vários processos compartilham as mesmas páginas do arquivo em vez de copiar a matriz
+    return PriceMatrix(np.load(valores, mmap_mode='r'), pd.to_datetime(np.load(datas)), lista_tickers)
+
+
+def _get(field, currency, version, persist):
+    nome = field if currency is None else f"{field}_{currency}"
+    chave = (nome, version)
+    if chave in _matrices:
+        return _matrices[chave]
+
+    matrix = _load(nome, version) if persist else None
+    if matrix is None:
+        if currency is None:
+            matrix = build_price_matrix(get_dataset(columns=['Datetime', field, 'Ticker']), field)
+        else:
+            # Conversão de todas as colunas de uma vez sobre a matriz original alinhada por data
+            original = _get(field, None, version, persist)
+            valores = fx.convert_values(original.values, original.tickers, fx.fx_rate(original), currency)
+            matrix = PriceMatrix(valores, original.dates, original.tickers)
+        if persist and not matrix.empty:
+            _save(matrix, nome, version)
+            matrix = _load(nome, version)
+
+    for antiga in [k for k in _matrices if k[0] == nome]:
+        del _matrices[antiga]
+    _matrices[chave] = matrix
+    return matrix
+
+
+def get_price_matrix(field='Close', persist=True, currency=None):
+    """
+    Retorna a PriceMatrix do campo para a versão atual dos dados.
+    A matriz é montada uma única vez por versão dos dados e, com persist=True,
+    salva como .npy em data/cache para ser reaberta via memory map.
+    Com `currency` ('BRL' ou 'USD') os preços são convertidos pela cotação do dólar do dia;
+    a matriz convertida também é calculada uma vez por versão e guardada no cache.
+    """
+    if currency is not None and field not in PRICE_FIELDS:
+        raise ValueError(f"O campo {field} não é um preço e não pode ser convertido de moeda.")
+    version = data_version()
+    with _lock:
+        return _get(field, currency, version, persist)
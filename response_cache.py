@@ -0,0 +1,129 @@
+import time
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from assistant import MODEL, stream_completion
+
+# Cache único do processo para as respostas do assistente, compartilhado por todas as sessões.
+# A chave é (modelo, hash do contexto de sistema, conversa, parâmetros): a mesma pergunta sobre
+# a mesma carteira volta do cache sem nova chamada à API. As entradas expiram após TTL_SECONDS
+# e, acima de MAX_ENTRIES, as menos usadas são descartadas. Perguntas idênticas feitas ao mesmo
+# tempo geram uma única chamada: as demais esperam a resposta da primeira por até WAIT_SECONDS
+# e, se ela não chegar, consultam o modelo elas mesmas.
+
+MAX_ENTRIES = 256
+TTL_SECONDS = 600
+WAIT_SECONDS = 60
+
+_entries = OrderedDict()  # chave -> (expira_em, texto)
+_in_flight = {}  # chave -> threading.Event da chamada em andamento
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "deduplicated": 0, "expired": 0}
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def cache_key(messages, model=MODEL, **params):
+    """Chave da resposta: modelo, hash das mensagens de sistema, hash da conversa e parâmetros da chamada."""
+    sistema = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    conversa = json.dumps([(m["role"], m["content"]) for m in messages if m["role"] != "system"], ensure_ascii=False)
+    return (model, _digest(sistema), _digest(conversa), tuple(sorted(params.items())))
+
+
+def _lookup(key):
+    """Texto em cache para a chave (ou None), descartando a entrada se já expirou. Chamar com _lock."""
+    entrada = _entries.get(key)
+    if entrada is None:
+        return None
+    if entrada[0] < time.monotonic():
+        del _entries[key]
+        _stats["expired"] += 1
+        return None
+    _entries.move_to_end(key)
+    return entrada[1]
+
+
+def _store(key, texto):
+    with _lock:
+        _entries[key] = (time.monotonic() + TTL_SECONDS, texto)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def _acquire(key, timeout=WAIT_SECONDS):
+    """
+    Resposta em cache, ou a vez de consultar o modelo. Devolve (texto, None) num acerto e
+    (None, evento) quando esta chamada deve consultar o modelo e avisar os que esperam pelo evento.
+    Se a mesma pergunta já em andamento não termina em `timeout` segundos, devolve (None, None):
+    esta chamada consulta o modelo sem esperar mais (e sem avisar ninguém).
+    """
+    limite = time.monotonic() + timeout
+    while True:
+        with _lock:
+            texto = _lookup(key)
+            if texto is not None:
+                _stats["hits"] += 1
+                return texto, None
+            evento = _in_flight.get(key)
+            if evento is None:
+                _stats["misses"] += 1
+                evento = _in_flight[key] = threading.Event()
+                return None, evento
+            _stats["deduplicated"] += 1
+        # Mesma pergunta já em andamento: espera por ela e consulta o cache de novo
+        # (se a outra chamada falhou, esta passa a consultar o modelo)
+        if not evento.wait(max(limite - time.monotonic(), 0)):
+            return None, None
+
+
+def _release(key, evento):
+    with _lock:
+        _in_flight.pop(key, None)
+    evento.set()
+
+
+def stream_cached(client, messages, model=MODEL, stats=None, wait_timeout=WAIT_SECONDS, **params):
+    """
+    Como assistant.stream_completion, mas consultando o cache antes do modelo.
+    Num acerto, a resposta inteira é devolvida de uma vez e `stats` recebe cached=True.
+    A espera por uma pergunta idêntica em andamento é limitada a `wait_timeout` segundos.
+    Só respostas completas são guardadas; erros e respostas interrompidas não entram no cache.
+    """
+    stats = {} if stats is None else stats
+    inicio = time.perf_counter()
+    key = cache_key(messages, model, **params)
+    texto, evento = _acquire(key, wait_timeout)
+    if texto is not None:
+        stats.update(ttft=time.perf_counter() - inicio, chunks=1, cached=True)
+        yield texto
+        stats['total'] = time.perf_counter() - inicio
+        return
+
+    try:
+        trechos = []
+        for trecho in stream_completion(client, messages, model, stats=stats, **params):
+            trechos.append(trecho)
+            yield trecho
+        stats['cached'] = False
+        _store(key, "".join(trechos))
+    finally:
+        # Sempre avisa quem espera, inclusive em erros e respostas interrompidas
+        if evento is not None:
+            _release(key, evento)
+
+
+def invalidate():
+    """Descarta todas as respostas em cache."""
+    with _lock:
+        _entries.clear()
+
+
+def cache_stats():
+    """Contadores de acertos, faltas, chamadas deduplicadas e expiradas, mais o número de entradas."""
+    with _lock:
+        return {**_stats, "entries": len(_entries), "in_flight": len(_in_flight)}
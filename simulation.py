@@ -0,0 +1,133 @@
+import functools
+import numpy as np
+import pandas as pd
+
+from data_collector import data_version
+from price_matrix import get_price_matrix
+
+TRADING_DAYS = 252
+PERCENTILES = (5, 25, 50, 75, 95)
+SEED = 0  # semente padrão das projeções: os mesmos parâmetros dão sempre as mesmas faixas
+
+
+def portfolio_returns(tickers, weights=None, start_date=None, end_date=None, currency=None):
+    """
+    Retornos diários históricos (fração) de uma carteira com pesos fixos, a partir da coluna `variacao`.
+    Usa apenas os dias em que todos os ativos têm cotação, preservando a correlação entre eles.
+    Com `currency` ('BRL' ou 'USD') os retornos vêm dos fechamentos convertidos para a moeda,
+    entre dias consecutivos em que todos os ativos têm cotação (incluindo a variação do câmbio).
+    """
+    tickers = list(tickers)
+    pesos = pd.Series(np.ones(len(tickers)) if weights is None else np.asarray(weights, dtype=np.float64),
+                      index=tickers).groupby(level=0, sort=False).sum()
+
+    if currency is None:
+        valores, _, tickers = get_price_matrix('variacao').select(pesos.index, start_date, end_date)
+        retornos = np.asarray(valores, dtype=np.float64) / 100
+        retornos = retornos[~np.isnan(retornos).any(axis=1)]
+    else:
+        valores, _, tickers = get_price_matrix(currency=currency).select(pesos.index, start_date, end_date)
+        precos = np.asarray(valores, dtype=np.float64)
+        precos = precos[~np.isnan(precos).any(axis=1)]
+        retornos = precos[1:] / precos[:-1] - 1
+
+    pesos = pesos.reindex(tickers).to_numpy()
+    return retornos @ (pesos / pesos.sum())
+
+
+def _sample_block_bootstrap(rng, returns, n_paths, horizon, block_size):
+    """Sorteia blocos contíguos de retornos históricos e os concatena até completar o horizonte."""
+    n_blocos = -(-horizon // block_size)
+    inicios = rng.integers(0, len(returns) - block_size + 1, size=(n_paths, n_blocos))
+    indices = (inicios[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :horizon]
+    return returns[indices]
+
+
+def _sample_parametric(rng, returns, n_paths, horizon):
+    """Retornos diários normais com a média e o desvio padrão históricos."""
+    return rng.normal(returns.mean(), returns.std(ddof=1), size=(n_paths, horizon))
+
+
+def simulate_paths(returns, years=10, n_paths=10_000, method="bootstrap", block_size=21,
+                   initial=1000.0, step=21, chunk_size=2_000, seed=None):
+    """
+    Simula a evolução de `initial` ao longo de `years` anos reamostrando os retornos diários.
+    method: 'bootstrap' (blocos de `block_size` pregões) ou 'parametric' (normal).
+    As trajetórias são geradas em lotes de `chunk_size` para limitar a memória, e de cada
+    trajetória só são guardados os valores a cada `step` pregões (e o valor final).
+    Retorna uma matriz (trajetórias x pontos) e os pregões correspondentes a cada ponto.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    horizonte = int(years * TRADING_DAYS)
+    if len(returns) < 2:
+        raise ValueError("Não há histórico em comum entre os ativos para simular.")
+    if method == "bootstrap" and len(returns) < block_size:
+        raise ValueError("Histórico curto demais para o tamanho de bloco escolhido.")
+
+    pontos = np.unique(np.append(np.arange(0, horizonte, step), horizonte - 1))
+    rng = np.random.default_rng(seed)
+    resultado = np.empty((n_paths, len(pontos)), dtype=np.float64)
+
+    for inicio in range(0, n_paths, chunk_size):
+        n = min(chunk_size, n_paths - inicio)
+        if method == "bootstrap":
+            amostra = _sample_block_bootstrap(rng, returns, n, horizonte, block_size)
+        elif method == "parametric":
+            amostra = _sample_parametric(rng, returns, n, horizonte)
+        else:
+            raise ValueError(f"Método desconhecido: {method}")
+        # Soma de log-retornos é mais barata e estável que o produto acumulado
+        caminho = np.cumsum(np.log1p(amostra), axis=1)
+        resultado[inicio:inicio + n] = initial * np.exp(caminho[:, pontos])
+
+    return resultado, pontos + 1
+
+
+def percentile_bands(paths, days, percentiles=PERCENTILES, start_date=None):
+    """
+    Faixas de percentis por ponto da simulação, prontas para o gráfico.
+    Com `start_date` os pregões viram datas contando TRADING_DAYS pregões por ano, como na simulação.
+    """
+    bandas = np.percentile(paths, percentiles, axis=0).T
+    if start_date is not None:
+        anos = np.asarray(days, dtype=np.float64) / TRADING_DAYS
+        indice = (pd.Timestamp(start_date) + pd.to_timedelta(anos * 365.25, unit='D')).normalize()
+    else:
+        indice = pd.Index(days, name="Pregão")
+    return pd.DataFrame(bandas, index=indice, columns=[f"P{p}" for p in percentiles])
+
+
+def final_distribution(paths, initial):
+    """Resumo da distribuição dos valores finais."""
+    finais = paths[:, -1]
+    return {
+        "Mediana": round(float(np.median(finais)), 2),
+        "Média": round(float(finais.mean()), 2),
+        "Percentil 5": round(float(np.percentile(finais, 5)), 2),
+        "Percentil 95": round(float(np.percentile(finais, 95)), 2),
+        "Prob. de Perda (%)": round(float((finais < initial).mean() * 100), 2),
+    }
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_projection(version, tickers, weights, start_date, end_date, years, n_paths, method, initial, seed, start,
+                       currency):
+    retornos = portfolio_returns(tickers, weights, start_date, end_date, currency)
+    caminhos, dias = simulate_paths(retornos, years, n_paths, method, initial=initial, seed=seed)
+    return percentile_bands(caminhos, dias, start_date=start), final_distribution(caminhos, initial)
+
+
+def get_projection(tickers, weights=None, start_date=None, end_date=None, years=10, n_paths=10_000,
+                   method="bootstrap", initial=1000.0, seed=SEED, start=None, currency=None):
+    """
+    Faixas de percentis (percentile_bands) e distribuição final (final_distribution) da projeção da
+    carteira, simulada uma vez por combinação de parâmetros e versão dos dados.
+    `start` é a data inicial do eixo do gráfico; com `currency` a carteira é simulada na moeda
+    (portfolio_returns) e `initial` deve estar nela. O resultado é compartilhado; não o altere.
+    """
+    pesos = None if weights is None else tuple(float(p) for p in weights)
+    start_date = None if start_date is None else pd.Timestamp(start_date)
+    end_date = None if end_date is None else pd.Timestamp(end_date)
+    start = None if start is None else pd.Timestamp(start).normalize()
+    return _cached_projection(data_version(), tuple(tickers), pesos, start_date, end_date, years, n_paths,
+                              method, float(initial), seed, start, currency)
@@ -0,0 +1,243 @@
+import numpy as np
+import pandas as pd
+
+from metrics import session_order, compact_sessions, expand_sessions
+
+# Todas as estratégias recebem o recorte da matriz de preços (datas x tickers)
+# e operam sobre todos os ativos de uma vez, sem laços por dia.
+# Aportes e janelas dos sinais seguem os pregões de cada ativo, não as linhas da grade de
+# datas (que inclui os fins de semana das criptomoedas).
+
+
+class StrategyResult:
+    """
+    Resultado de uma estratégia.
+    equity: valor de mercado por ativo (datas x tickers); total: soma dos ativos;
+    invested: capital aportado acumulado; trades: registro das operações.
+    """
+
+    def __init__(self, equity, invested, trades):
+        self.equity = equity
+        self.total = equity.sum(axis=1, min_count=1)
+        self.invested = invested
+        self.trades = trades
+
+    def summary(self):
+        return summarize(self.total.iloc[-1], self.invested.iloc[-1], len(self.trades))
+
+
+def summarize(final, invested, trades):
+    """Resumo de um resultado: valor final, capital aportado, ganho, retorno (%) e número de operações."""
+    return {
+        "Valor Final": round(float(final), 2),
+        "Total Aportado": round(float(invested), 2),
+        "Ganho": round(float(final - invested), 2),
+        "Retorno (%)": round(float((final / invested - 1) * 100), 2),
+        "Operações": int(trades),
+    }
+
+
+def _ffill(values):
+    """Preenche dias sem cotação com o último preço conhecido (coluna a coluna)."""
+    return pd.DataFrame(values).ffill().to_numpy()
+
+
+def _trade_log(dates, tickers, shares_delta, prices):
+    linhas, colunas = np.nonzero(shares_delta)
+    quantidade = shares_delta[linhas, colunas]
+    preco = prices[linhas, colunas]
+    return pd.DataFrame({
+        "Data": pd.DatetimeIndex(dates)[linhas],
+        "Ticker": np.asarray(tickers, dtype=object)[colunas],
+        "Operação": np.where(quantidade > 0, "Compra", "Venda"),
+        "Quantidade": np.abs(quantidade),
+        "Preço": preco,
+        "Valor": np.abs(quantidade) * preco,
+    }).sort_values(["Data", "Ticker"], ignore_index=True)
+
+
+def period_starts(dates, freq="M"):
+    """Máscara do primeiro pregão de cada período ('M' mês, 'Q' trimestre, 'Y' ano)."""
+    periodos = pd.DatetimeIndex(dates).to_period(freq).asi8
+    inicio = np.ones(len(periodos), dtype=bool)
+    inicio[1:] = periodos[1:] != periodos[:-1]
+    return inicio
+
+
+def first_sessions(values, dates, freq="M"):
+    """Máscara (datas x tickers) do primeiro pregão de cada ativo em cada período ('M', 'Q' ou 'Y')."""
+    validos = ~np.isnan(values)
+    periodos = pd.DatetimeIndex(dates).to_period(freq).asi8.astype(np.float64)[:, None]
+    # Período do último pregão anterior de cada ativo
+    anterior = np.full(values.shape, np.nan)
+    anterior[1:] = pd.DataFrame(np.where(validos, periodos, np.nan)).ffill().to_numpy()[:-1]
+    return validos & (anterior != periodos)
+
+
+def monthly_contributions(values, dates, tickers, amount, freq="M"):
+    """
+    Aportes periódicos (DCA): no primeiro pregão de cada ativo em cada período compra `amount` dele.
+    Ativos sem nenhuma cotação no período não recebem aquele aporte.
+    """
+    precos = _ffill(values)
+    aporte = first_sessions(values, dates, freq)
+
+    compras = np.where(aporte, amount / np.where(aporte, values, 1.0), 0.0)
+    cotas = np.cumsum(compras, axis=0)
+    equity = pd.DataFrame(np.nan_to_num(cotas * precos), index=dates, columns=tickers)
+    invested = pd.Series(np.cumsum(aporte.sum(axis=1) * amount), index=dates, dtype=float)
+    return StrategyResult(equity, invested, _trade_log(dates, tickers, compras, values))
+
+
+def rebalanced_portfolio(values, dates, tickers, weights, initial, freq="M"):
+    """
+    Carteira com pesos fixos rebalanceada no primeiro pregão de cada período.
+    A simulação começa na primeira data em que todos os ativos têm cotação.
+    Entre dois rebalanceamentos as quantidades ficam constantes, então o valor em cada
+    dia é o valor no último rebalanceamento vezes a variação ponderada desde então.
+    """
+    pesos = np.asarray(weights, dtype=float)
+    pesos = pesos / pesos.sum()
+    precos = _ffill(values)
+
+    completos = ~np.isnan(precos).any(axis=1)
+    inicio = int(np.argmax(completos)) if completos.any() else len(precos)
+    precos, dates = precos[inicio:], pd.DatetimeIndex(dates)[inicio:]
+    if len(precos) == 0:
+        vazio = np.zeros((0, len(tickers)))
+        return StrategyResult(pd.DataFrame(vazio, columns=tickers), pd.Series(dtype=float),
+                              _trade_log([], tickers, vazio, vazio))
+
+    rebal = period_starts(dates, freq)
+    rebal[0] = True
+    linhas_rebal = np.flatnonzero(rebal)
+    segmento = np.cumsum(rebal) - 1
+    base = precos[linhas_rebal]
+
+    # Crescimento de cada segmento até o próximo rebalanceamento
+    fator = (precos[linhas_rebal[1:]] / base[:-1]) @ pesos
+    valor_rebal = initial * np.concatenate([[1.0], np.cumprod(fator)])
+
+    cotas_rebal = valor_rebal[:, None] * pesos / base
+    cotas = cotas_rebal[segmento]
+    equity = pd.DataFrame(cotas * precos, index=dates, columns=tickers)
+    invested = pd.Series(float(initial), index=dates)
+
+    delta = np.zeros_like(precos)
+    delta[linhas_rebal] = np.diff(cotas_rebal, axis=0, prepend=0.0)
+    delta[np.isclose(delta, 0.0, atol=1e-12)] = 0.0
+    return StrategyResult(equity, invested, _trade_log(dates, tickers, delta, precos))
+
+
+def _rolling_means(values, janelas):
+    """
+    Médias móveis simples de todas as janelas de uma vez, por somas acumuladas: array (janelas x datas x tickers).
+    Cada janela tem `janela` pregões do ativo; nos dias sem cotação vale a média do último pregão.
+    Como em rolling(janela, min_periods=janela), a média é NaN enquanto não houver pregões suficientes.
+    """
+    ordem, posicao = session_order(~np.isnan(values))
+    precos = compact_sessions(values, ordem)
+    janelas = np.asarray(janelas, dtype=np.int64)[:, None]
+    validos = ~np.isnan(precos)
+    zeros = np.zeros((1, precos.shape[1]))
+    soma = np.concatenate([zeros, np.cumsum(np.where(validos, precos, 0.0), axis=0)])
+    contagem = np.concatenate([zeros, np.cumsum(validos, axis=0)])
+    fim = np.arange(1, len(precos) + 1)[None, :]
+    inicio = np.maximum(fim - janelas, 0)
+    completas = contagem[fim] - contagem[inicio] == janelas[..., None]
+    return expand_sessions(np.where(completas, (soma[fim] - soma[inicio]) / janelas[..., None], np.nan), posicao)
+
+
+def moving_average_signal(values, fast=50, slow=200):
+    """Posição comprada quando a média móvel dos últimos `fast` pregões do ativo está acima da de `slow`."""
+    return moving_average_signals(values, [(fast, slow)])[0]
+
+
+def moving_average_signals(values, pairs):
+    """Sinais de moving_average_signal para vários pares (fast, slow) de uma vez: array (pares x datas x tickers)."""
+    janelas, posicoes = np.unique(np.asarray(pairs, dtype=np.int64), return_inverse=True)
+    posicoes = posicoes.reshape(len(pairs), 2)
+    medias = _rolling_means(np.asarray(values, dtype=np.float64), janelas)
+    with np.errstate(invalid="ignore"):
+        return medias[posicoes[:, 0]] > medias[posicoes[:, 1]]
+
+
+def momentum_signal(values, lookback=126):
+    """Posição comprada quando o retorno dos últimos `lookback` pregões do ativo é positivo."""
+    return momentum_signals(values, [lookback])[0]
+
+
+def momentum_signals(values, lookbacks):
+    """Sinais de momentum_signal para vários `lookback` de uma vez: array (lookbacks x datas x tickers)."""
+    values = np.asarray(values, dtype=np.float64)
+    ordem, posicao = session_order(~np.isnan(values))
+    precos = compact_sessions(values, ordem)
+    origem = np.arange(len(precos))[None, :] - np.asarray(lookbacks, dtype=np.int64)[:, None]
+    anterior = np.where((origem >= 0)[..., None], precos[np.maximum(origem, 0)], np.nan)
+    with np.errstate(invalid="ignore"):
+        return expand_sessions(precos / anterior - 1, posicao) > 0
+
+
+def _signal_positions(precos, signal, investment):
+    """
+    Capital e variação de cotas de signal_strategy, com `signal` (… x datas x tickers) e `investment`
+    com as mesmas dimensões iniciais: vários sinais são simulados de uma vez.
+    """
+    retornos = np.zeros_like(precos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        retornos[1:] = precos[1:] / precos[:-1] - 1
+    retornos = np.nan_to_num(retornos)
+
+    posicao = np.zeros(signal.shape, dtype=bool)
+    posicao[..., 1:, :] = signal[..., :-1, :]
+    capital = np.asarray(investment, dtype=float)[..., None, None] * np.cumprod(
+        1 + np.where(posicao, retornos, 0.0), axis=-2)
+
+    # Entradas e saídas: a posição do dia t é montada/desfeita no fechamento de t-1, o dia do sinal
+    mudanca = np.diff(posicao.astype(np.int8), axis=-2)
+    delta = np.zeros(signal.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta[..., :-1, :] = np.nan_to_num(mudanca * capital[..., :-1, :] / precos[:-1])
+    return capital, delta
+
+
+def signal_strategy(values, dates, tickers, signal, investment):
+    """
+    Aplica um sinal booleano (datas x tickers) a cada ativo com `investment` de capital por ativo.
+    O sinal de um dia é executado no fechamento desse mesmo dia, e a posição só rende a partir do
+    dia seguinte. Fora do mercado o capital fica parado.
+    """
+    precos = _ffill(values)
+    capital, delta = _signal_positions(precos, signal, investment)
+
+    ativos = ~np.isnan(values).all(axis=0)
+    equity = pd.DataFrame(np.where(ativos, capital, np.nan), index=dates, columns=tickers)
+    invested = pd.Series(investment * ativos.sum(), index=dates, dtype=float)
+    return StrategyResult(equity, invested, _trade_log(dates, tickers, delta, precos))
+
+
+def signal_strategy_batch(values, signals, investments):
+    """
+    signal_strategy para vários sinais (sinais x datas x tickers), cada um com seu `investments`,
+    em uma única operação sobre o eixo dos sinais. Retorna (total, invested, operações):
+    o valor total por sinal e data (sinais x datas), o capital aportado e o número de operações por sinal.
+    """
+    investments = np.asarray(investments, dtype=float)
+    capital, delta = _signal_positions(_ffill(values), signals, investments)
+    ativos = ~np.isnan(values).all(axis=0)
+    total = np.where(ativos, capital, 0.0).sum(axis=-1)
+    if not ativos.any():
+        total[:] = np.nan
+    return total, investments * ativos.sum(), np.count_nonzero(delta, axis=(-2, -1))
+
+
+def benchmark(prices, invested):
+    """
+    Curva de comparação: aplica no benchmark (ex.: ^GSPC) os mesmos aportes da estratégia.
+    `prices` é a série de preços do benchmark e `invested` o capital aportado acumulado da estratégia.
+    """
+    precos = prices.reindex(invested.index).ffill().bfill().to_numpy()
+    aportes = np.diff(invested.to_numpy(), prepend=0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cotas = np.cumsum(np.where(aportes != 0, aportes / precos, 0.0))
+    return pd.Series(cotas * precos, index=invested.index)
@@ -0,0 +1,232 @@
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import strategies
+from price_matrix import get_price_matrix
+
+# Cada processo do pool abre a matriz de preços uma única vez, via memory map do
+# cache em data/cache; as tarefas recebem apenas os parâmetros, nunca os preços.
+_matrix = None
+
+# Parâmetros que formam o eixo de parâmetros de cada estratégia: combinações que só diferem
+# neles (mesmos ativos, período e demais parâmetros) são simuladas juntas, como arrays.
+BATCH_AXES = {
+    'ma_cross': ('fast', 'slow', 'investment'),
+    'momentum': ('lookback', 'investment'),
+    'dca': ('amount',),
+    'rebalance': ('investment',),
+}
+
+
+def _init_worker(field, currency):
+    global _matrix
+    _matrix = get_price_matrix(field, currency=currency)
+
+
+def parameter_grid(**params):
+    """Combinações de parâmetros: parameter_grid(fast=[20, 50], slow=[100, 200]) -> lista de dicionários."""
+    nomes = list(params)
+    return [dict(zip(nomes, valores)) for valores in itertools.product(*params.values())]
+
+
+def _max_drawdown(total):
+    pico = np.maximum.accumulate(total)
+    return float(np.nanmin(total / pico - 1) * 100)
+
+
+def run_strategy(matrix, params):
+    """
+    Executa uma estratégia descrita por `params`.
+    Chaves: strategy ('dca', 'rebalance', 'ma_cross' ou 'momentum'), tickers, start_date, end_date
+    e os parâmetros específicos (amount, freq, investment, fast, slow, lookback).
+    """
+    valores, datas, tickers = matrix.select(params['tickers'], params.get('start_date'), params.get('end_date'))
+    valores = np.asarray(valores)
+    estrategia = params['strategy']
+
+    if estrategia == 'dca':
+        return strategies.monthly_contributions(valores, datas, tickers, params.get('amount', 100.0),
+                                                params.get('freq', 'M'))
+    if estrategia == 'rebalance':
+        return strategies.rebalanced_portfolio(valores, datas, tickers, np.ones(len(tickers)),
+                                               params.get('investment', 1000.0) * len(tickers),
+                                               params.get('freq', 'M'))
+    if estrategia == 'ma_cross':
+        sinal = strategies.moving_average_signal(valores, params['fast'], params['slow'])
+    elif estrategia == 'momentum':
+        sinal = strategies.momentum_signal(valores, params['lookback'])
+    else:
+        raise ValueError(f"Estratégia desconhecida: {estrategia}")
+    return strategies.signal_strategy(valores, datas, tickers, sinal, params.get('investment', 1000.0))
+
+
+def _params_row(params):
+    return {chave: (', '.join(valor) if chave == 'tickers' else valor) for chave, valor in params.items()}
+
+
+def _metrics_row(params, total, invested, trades):
+    linha = _params_row(params)
+    linha.update(strategies.summarize(total[-1], invested, trades))
+    linha["Drawdown Máximo (%)"] = round(_max_drawdown(total), 2)
+    return linha
+
+
+def evaluate(matrix, params):
+    """Executa a estratégia e resume o resultado em uma linha de métricas junto com os parâmetros."""
+    resultado = run_strategy(matrix, params)
+    if resultado.total.empty:
+        return _params_row(params)
+    return _metrics_row(params, resultado.total.to_numpy(), resultado.invested.iloc[-1], len(resultado.trades))
+
+
+def _group_key(params):
+    eixo = BATCH_AXES.get(params['strategy'], ())
+    return tuple(sorted((chave, tuple(valor) if isinstance(valor, list) else valor)
+                        for chave, valor in params.items() if chave not in eixo and chave != 'combinacao'))
+
+
+def _evaluate_group(matrix, grupo):
+    """Avalia combinações que só diferem nos parâmetros de BATCH_AXES, todas de uma vez."""
+    params = grupo[0]
+    estrategia = params['strategy']
+    if estrategia not in BATCH_AXES:
+        return [evaluate(matrix, p) for p in grupo]
+    valores, datas, tickers = matrix.select(params['tickers'], params.get('start_date'), params.get('end_date'))
+    if len(datas) == 0:
+        return [_params_row(p) for p in grupo]
+    valores = np.asarray(valores)
+
+    if estrategia in ('dca', 'rebalance'):
+        # O resultado é proporcional ao valor aportado: simula uma vez com valor unitário e escala
+        chave, padrao = ('amount', 100.0) if estrategia == 'dca' else ('investment', 1000.0)
+        escala = np.array([p.get(chave, padrao) for p in grupo], dtype=float)
+        base = run_strategy(matrix, {**params, chave: 1.0})
+        if base.total.empty:
+            return [_params_row(p) for p in grupo]
+        total = escala[:, None] * base.total.to_numpy()
+        aportado = escala * base.invested.iloc[-1]
+        operacoes = np.where(escala != 0, len(base.trades), 0)
+    else:
+        if estrategia == 'ma_cross':
+            sinais = strategies.moving_average_signals(valores, [(p['fast'], p['slow']) for p in grupo])
+        else:
+            sinais = strategies.momentum_signals(valores, [p['lookback'] for p in grupo])
+        total, aportado, operacoes = strategies.signal_strategy_batch(
+            valores, sinais, [p.get('investment', 1000.0) for p in grupo])
+    return [_metrics_row(p, total[i], aportado[i], operacoes[i]) for i, p in enumerate(grupo)]
+
+
+def evaluate_batch(matrix, batch):
+    """
+    Mesmo resultado de `evaluate` para cada combinação do lote, na mesma ordem. As combinações que
+    só diferem nos parâmetros de BATCH_AXES são simuladas juntas, ao longo de um eixo de parâmetros.
+    """
+    grupos = {}
+    for i, params in enumerate(batch):
+        grupos.setdefault(_group_key(params), []).append(i)
+    linhas = [None] * len(batch)
+    for indices in grupos.values():
+        for i, linha in zip(indices, _evaluate_group(matrix, [batch[i] for i in indices])):
+            linhas[i] = linha
+    return linhas
+
+
+def _evaluate_batch(batch):
+    return evaluate_batch(_matrix, batch)
+
+
+def _pool(max_workers, field, currency):
+    """Pool de processos com a matriz de preços aberta em cada processo."""
+    # Garante que o cache .npy exista antes de os processos abrirem a matriz
+    get_price_matrix(field, currency=currency)
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(field, currency))
+
+
+def _sweep(executor, combinations, batch_size):
+    # Combinações do mesmo grupo ficam no mesmo lote, para serem simuladas juntas
+    grupos = {}
+    for params in combinations:
+        grupos.setdefault(_group_key(params), []).append(params)
+    combinations = [params for grupo in grupos.values() for params in grupo]
+
+    total = len(combinations)
+    lotes = [combinations[i:i + batch_size] for i in range(0, total, batch_size)]
+    concluidas = 0
+    futures = [executor.submit(_evaluate_batch, lote) for lote in lotes]
+    for future in as_completed(futures):
+        linhas = future.result()
+        concluidas += len(linhas)
+        yield concluidas, total, linhas
+
+
+def run_sweep(combinations, max_workers=None, batch_size=16, field='Close', currency=None, executor=None):
+    """
+    Avalia todas as combinações de parâmetros em paralelo.
+    As combinações são agrupadas em lotes para diluir o custo de cada tarefa, e os lotes
+    são distribuídos entre os núcleos. É um gerador: cada lote concluído é devolvido
+    como (concluídas, total, linhas), permitindo mostrar o progresso enquanto o resto roda.
+    Com `currency` ('BRL' ou 'USD') as estratégias rodam sobre os preços convertidos.
+    Um `executor` já aberto (de _pool, com os mesmos field e currency) é reutilizado em vez de criar outro.
+    """
+    combinations = list(combinations)
+    if not combinations:
+        return
+    if executor is not None:
+        yield from _sweep(executor, combinations, batch_size)
+        return
+    with _pool(max_workers, field, currency) as executor:
+        yield from _sweep(executor, combinations, batch_size)
+
+
+def walk_forward_windows(start_date, end_date, train_years=3, test_years=1):
+    """Janelas (início treino, fim treino, início teste, fim teste) deslizando `test_years` por vez."""
+    janelas = []
+    inicio = pd.Timestamp(start_date)
+    fim = pd.Timestamp(end_date)
+    while True:
+        fim_treino = inicio + pd.DateOffset(years=train_years) - pd.Timedelta(days=1)
+        fim_teste = fim_treino + pd.DateOffset(years=test_years)
+        if fim_teste > fim:
+            break
+        janelas.append((inicio, fim_treino, fim_treino + pd.Timedelta(days=1), fim_teste))
+        inicio = inicio + pd.DateOffset(years=test_years)
+    return janelas
+
+
+def walk_forward(combinations, start_date, end_date, train_years=3, test_years=1,
+                 metric="Retorno (%)", max_workers=None, batch_size=16, field='Close', currency=None):
+    """
+    Otimização walk-forward: em cada janela escolhe a melhor combinação no período de treino
+    (pela métrica informada) e avalia essa combinação no período de teste seguinte.
+    É um gerador que devolve uma linha por janela assim que ela termina.
+    """
+    matrix = get_price_matrix(field, currency=currency)
+    janelas = walk_forward_windows(start_date, end_date, train_years, test_years)
+    if not janelas:
+        return
+    # Um único pool para todas as janelas: os processos e a matriz aberta são reaproveitados
+    with _pool(max_workers, field, currency) as executor:
+        for inicio, fim_treino, inicio_teste, fim_teste in janelas:
+            treino = [{**params, 'start_date': inicio, 'end_date': fim_treino, 'combinacao': i}
+                      for i, params in enumerate(combinations)]
+            linhas = []
+            for _, _, lote in run_sweep(treino, batch_size=batch_size, executor=executor):
+                linhas.extend(lote)
+            linhas = [linha for linha in linhas if metric in linha]
+            if not linhas:
+                continue
+
+            # Os lotes chegam fora de ordem; 'combinacao' identifica a combinação de origem
+            melhor = max(linhas, key=lambda linha: linha[metric])
+            indice = melhor['combinacao']
+            params_teste = {**combinations[indice], 'start_date': inicio_teste, 'end_date': fim_teste}
+            teste = evaluate(matrix, params_teste)
+            yield {
+                "Treino": f"{inicio:%Y-%m-%d} a {fim_treino:%Y-%m-%d}",
+                "Teste": f"{inicio_teste:%Y-%m-%d} a {fim_teste:%Y-%m-%d}",
+                "Parâmetros": ', '.join(f"{k}={v}" for k, v in combinations[indice].items() if k not in ('tickers', 'strategy')),
+                f"{metric} Treino": melhor[metric],
+                f"{metric} Teste": teste.get(metric),
+            }
@@ -0,0 +1,368 @@
+import zlib
+import threading
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, Holiday, GoodFriday, Easter, USMartinLutherKingJr, USPresidentsDay,
+    USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday,
+)
+from pandas.tseries.offsets import Day
+
+from fetcher import FETCH_COLUMNS
+from fx import currency_of
+
+# Dados de mercado sintéticos, no mesmo formato devolvido pelas fontes do fetcher (FETCH_COLUMNS),
+# para testes de carga e uso sem acesso à internet (ex.: 5.000 tickers x 25 anos).
+# Os retornos seguem um modelo de fatores: mercado (por calendário, com prêmio de risco) + setor +
+# ruído próprio do ticker, com volatilidade que se agrupa no tempo e saltos ocasionais; daí vêm as
+# correlações entre ativos do mesmo mercado e setor. A parte própria de cada ação reverte à média
+# e o seu excesso de retorno é limitado, para que os preços fiquem em faixas plausíveis por décadas.
+# Índices (^GSPC, ^BVSP) seguem só o fator de mercado e o câmbio (BRL=X) oscila em torno de um nível.
+# Há ainda gaps de abertura, dias sem dados, listagens tardias e cancelamentos de listagem.
+# Tudo é determinístico: o ruído de cada dia depende só da semente, do ticker e do ano, então o
+# mesmo ticker tem o mesmo histórico seja baixado de uma vez ou incrementalmente.
+
+ORIGIN = '1995-01-01'  # início do histórico simulado
+LISTING_HORIZON = '2024-12-31'  # listagens tardias e deslistagens são sorteadas até esta data
+CALENDARS = ('B3', 'NYSE', 'CRYPTO')
+N_SECTORS = 11
+DAYS_PER_YEAR = {'B3': 248, 'NYSE': 252, 'CRYPTO': 365}
+# Horário de negociação (início, duração em minutos) usado nas barras intradiárias
+SESSIONS = {'B3': ('10:00', 420), 'NYSE': ('09:30', 390), 'CRYPTO': ('00:00', 1440)}
+INTERVAL_MINUTES = {'1h': 60, '30m': 30, '15m': 15, '5m': 5}
+VOL_PERSISTENCE = 0.985
+VOL_SHOCK = 0.08
+MARKET_DRIFT = {'B3': 0.08, 'NYSE': 0.07, 'CRYPTO': 0.10}  # log-retorno anual esperado do mercado
+ALPHA_LIMIT = 0.04  # diferença máxima entre o log-retorno anual esperado de uma ação e o do mercado
+HALF_LIFE = 2.0  # meia-vida (anos) da parte própria do preço de cada ação
+# Níveis aproximados em ORIGIN dos índices, que seguem o fator de mercado do seu calendário
+INDEX_LEVELS = {'^GSPC': 460.0, '^BVSP': 4300.0}
+# Câmbio: nível em torno do qual a cotação oscila, volatilidade anual e meia-vida (anos) dos desvios
+FX_LEVELS = {'BRL=X': 5.0}
+FX_VOL = 0.15
+FX_HALF_LIFE = 1.0
+
+
+class NYSECalendar(AbstractHolidayCalendar):
+    """Feriados da NYSE (Juneteenth a partir de 2022)."""
+    rules = [
+        Holiday('Ano Novo', month=1, day=1, observance=nearest_workday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+class B3Calendar(AbstractHolidayCalendar):
+    """Feriados nacionais sem pregão na B3 (Consciência Negra a partir de 2024) e o último dia do ano."""
+    rules = [
+        Holiday('Confraternização Universal', month=1, day=1),
+        Holiday('Carnaval (segunda)', month=1, day=1, offset=[Easter(), Day(-48)]),
+        Holiday('Carnaval (terça)', month=1, day=1, offset=[Easter(), Day(-47)]),
+        Holiday('Sexta-feira Santa', month=1, day=1, offset=[Easter(), Day(-2)]),
+        Holiday('Tiradentes', month=4, day=21),
+        Holiday('Dia do Trabalho', month=5, day=1),
+        Holiday('Corpus Christi', month=1, day=1, offset=[Easter(), Day(60)]),
+        Holiday('Independência', month=9, day=7),
+        Holiday('Nossa Senhora Aparecida', month=10, day=12),
+        Holiday('Finados', month=11, day=2),
+        Holiday('Proclamação da República', month=11, day=15),
+        Holiday('Consciência Negra', month=11, day=20, start_date='2024-01-01'),
+        Holiday('Natal', month=12, day=25),
+        Holiday('Último dia do ano', month=12, day=31),
+    ]
+
+
+_HOLIDAYS = {'B3': B3Calendar(), 'NYSE': NYSECalendar()}
+
+
+def trading_days(calendar, start_date, end_date):
+    """Dias de negociação do calendário ('B3', 'NYSE' ou 'CRYPTO', que negocia todos os dias) no período."""
+    if calendar == 'CRYPTO':
+        return pd.date_range(start_date, end_date, freq='D')
+    if calendar not in _HOLIDAYS:
+        raise ValueError(f"Calendário desconhecido: {calendar}")
+    dias = pd.bdate_range(start_date, end_date)
+    return dias[~dias.isin(_HOLIDAYS[calendar].holidays(start_date, end_date))]
+
+
+def calendar_of(ticker):
+    """Calendário de um ticker pelo nome: criptomoedas (-USD) negociam todo dia, ativos da B3 seguem a B3."""
+    ticker = str(ticker)
+    if ticker.endswith('-USD'):
+        return 'CRYPTO'
+    return 'B3' if currency_of(ticker) == 'BRL' else 'NYSE'
+
+
+def _mean_revert(choques, persistencia, bloco=252):
+    """
+    Processo AR(1) x[t] = persistencia * x[t-1] + choques[t] (x[-1] = 0), calculado em blocos com
+    somas acumuladas: dentro de cada bloco, x[t] = p^t * (p * x[-1] + soma(choques[s] / p^s)).
+    """
+    resultado = np.empty(len(choques))
+    potencias = persistencia ** np.arange(bloco)
+    anterior = 0.0
+    for inicio in range(0, len(choques), bloco):
+        trecho = choques[inicio:inicio + bloco]
+        p = potencias[:len(trecho)]
+        resultado[inicio:inicio + len(trecho)] = p * (persistencia * anterior + np.cumsum(trecho / p))
+        anterior = resultado[inicio + len(trecho) - 1]
+    return resultado
+
+
+def _letters(i, width):
+    texto = ''
+    for _ in range(width):
+        i, resto = divmod(i, 26)
+        texto = chr(ord('A') + resto) + texto
+    return texto
+
+
+def synthetic_tickers(n, markets=CALENDARS, weights=None):
+    """
+    `n` nomes de tickers sintéticos distribuídos entre os mercados: 'AAAB3.SA' (B3), 'ZAAB' (NYSE)
+    e 'XAAB-USD' (cripto). Os nomes são únicos e estáveis para o mesmo `n`.
+    """
+    weights = np.asarray(weights if weights is not None else [1.0] * len(markets), dtype=np.float64)
+    contagens = np.floor(weights / weights.sum() * n).astype(int)
+    contagens[0] += n - contagens.sum()
+    nomes = []
+    for mercado, quantidade in zip(markets, contagens):
+        for i in range(quantidade):
+            if mercado == 'B3':
+                nomes.append(f"{_letters(i, 4)}{3 + i % 2}.SA")
+            elif mercado == 'NYSE':
+                nomes.append(f"Z{_letters(i, 3)}")
+            else:
+                nomes.append(f"X{_letters(i, 3)}-USD")
+    return nomes
+
+
+class MarketSimulator:
+    """
+    Gerador de históricos OHLCV sintéticos. Os parâmetros de cada ticker (beta, setor, volatilidade,
+    preço inicial, datas de listagem) são sorteados a partir do seu nome e da semente.
+
+    missing_prob: probabilidade de um dia de negociação não ter dados (falha na fonte)
+    late_listing_prob / delisting_prob: fração dos tickers listados depois de ORIGIN / deslistados
+    jump_prob: probabilidade diária de um salto de preço (notícia), aplicado na abertura
+    """
+
+    def __init__(self, seed=0, origin=ORIGIN, missing_prob=0.002, late_listing_prob=0.3,
+                 delisting_prob=0.05, jump_prob=0.003):
+        self.seed = seed
+        self.origin = pd.Timestamp(origin)
+        self.missing_prob = missing_prob
+        self.late_listing_prob = late_listing_prob
+        self.delisting_prob = delisting_prob
+        self.jump_prob = jump_prob
+        self._markets = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, *chave):
+        """Gerador determinístico para a chave (textos e inteiros)."""
+        return np.random.default_rng([self.seed] + [zlib.crc32(str(c).encode()) for c in chave])
+
+    def _noise(self, chave, dias, colunas=1, uniformes=0):
+        """
+        Ruído de dimensão dias x colunas, com um gerador por ano: as primeiras colunas são normais
+        padrão e as `uniformes` últimas, uniformes em [0, 1). `dias` deve estar em ordem.
+        """
+        ruido = np.empty((len(dias), colunas))
+        anos = dias.year.to_numpy()
+        normais = colunas - uniformes
+        for ano in np.unique(anos):
+            inicio, fim = anos.searchsorted(ano), anos.searchsorted(ano, side='right')
+            rng = self._rng(chave, int(ano))
+            # Sorteia o ano inteiro para que o ruído de um dia não dependa do fim do período
+            ruido[inicio:fim, :normais] = rng.standard_normal((366, normais))[:fim - inicio]
+            if uniformes:
+                ruido[inicio:fim, normais:] = rng.random((366, uniformes))[:fim - inicio]
+        return ruido
+
+    def _market(self, calendar, end_date):
+        """
+        Fatores compartilhados do calendário desde ORIGIN até pelo menos `end_date`:
+        dias, retorno do mercado, retornos dos setores (dias x N_SECTORS) e o multiplicador de volatilidade.
+        """
+        end_date = pd.Timestamp(end_date)
+        with self._lock:
+            mercado = self._markets.get(calendar)
+            if mercado is not None and mercado[0][-1] >= end_date:
+                return mercado
+            # Gera até o fim do ano para reaproveitar nas próximas chamadas
+            dias = trading_days(calendar, self.origin, pd.Timestamp(year=end_date.year, month=12, day=31))
+            escala = np.sqrt(252 / DAYS_PER_YEAR[calendar])
+            # Volatilidade com memória: log-volatilidade AR(1) comum a todo o mercado
+            choques = self._noise(('vol', calendar), dias)[:, 0] * VOL_SHOCK
+            log_vol = np.empty(len(dias))
+            nivel = 0.0
+            for i, choque in enumerate(choques):
+                nivel = VOL_PERSISTENCE * nivel + choque
+                log_vol[i] = nivel
+            # Variância estacionária do AR(1): o multiplicador tem média 1
+            volatilidade = np.exp(log_vol - VOL_SHOCK ** 2 / (1 - VOL_PERSISTENCE ** 2) / 2)
+            fator_mercado = self._noise(('mercado', calendar), dias)[:, 0] * 0.011 * escala * volatilidade
+            setores = self._noise(('setores', calendar), dias, N_SECTORS) * 0.007 * escala * volatilidade[:, None]
+            mercado = (dias, fator_mercado, setores, volatilidade)
+            self._markets[calendar] = mercado
+            return mercado
+
+    def _params(self, ticker, calendar):
+        """
+        Parâmetros do ticker. Índices e câmbio não têm listagem sorteada: índices seguem só o fator
+        de mercado (beta 1, sem setor nem ruído próprio) e o câmbio só o seu ruído, que reverte ao nível.
+        """
+        rng = self._rng('params', ticker)
+        escala = np.sqrt(252 / DAYS_PER_YEAR[calendar])
+        if ticker.startswith('^') or ticker.endswith('=X'):
+            indice = ticker.startswith('^')
+            return {
+                'beta': 1.0 if indice else 0.0,
+                'setor': 0,
+                'carga_setor': 0.0,
+                'vol': 0.0 if indice else FX_VOL / np.sqrt(DAYS_PER_YEAR[calendar]),
+                'amplitude': 0.006 * escala,
+                'drift': MARKET_DRIFT[calendar] / DAYS_PER_YEAR[calendar] if indice else 0.0,
+                'meia_vida': FX_HALF_LIFE,
+                'preco_inicial': INDEX_LEVELS.get(ticker, 1000.0) if indice else FX_LEVELS.get(ticker, 1.0),
+                'volume': float(np.exp(rng.uniform(np.log(1e8), np.log(5e9)))) if indice else 0.0,
+                'listagem': self.origin,
+                'deslistagem': None,
+            }
+        horizonte = pd.Timestamp(LISTING_HORIZON)
+        listagem = self.origin
+        if rng.random() < self.late_listing_prob:
+            listagem = self.origin + (horizonte - self.origin) * rng.random()
+        deslistagem = None
+        if rng.random() < self.delisting_prob:
+            deslistagem = listagem + (horizonte - listagem) * rng.uniform(0.3, 1.0)
+        cripto = calendar == 'CRYPTO'
+        vol = rng.uniform(0.006, 0.018) * (2.5 if cripto else 1.0) * escala
+        return {
+            'beta': rng.uniform(0.5, 1.5) * (1.5 if cripto else 1.0),
+            'setor': zlib.crc32(ticker.encode()) % N_SECTORS,
+            'carga_setor': rng.uniform(0.3, 1.0),
+            'vol': vol,
+            'amplitude': vol,
+            'drift': (MARKET_DRIFT[calendar] + np.clip(rng.normal(0.0, 0.02), -ALPHA_LIMIT, ALPHA_LIMIT)) / DAYS_PER_YEAR[calendar],
+            'meia_vida': HALF_LIFE,
+            'preco_inicial': float(np.exp(rng.uniform(np.log(2), np.log(300)))),
+            'volume': float(np.exp(rng.uniform(np.log(1e4), np.log(2e7)))),
+            'listagem': listagem.normalize(),
+            'deslistagem': None if deslistagem is None else deslistagem.normalize(),
+        }
+
+    def _daily(self, ticker, end_date):
+        """Histórico diário completo do ticker (da listagem até end_date), antes de remover os dias sem dados."""
+        calendar = calendar_of(ticker)
+        p = self._params(ticker, calendar)
+        dias, fator_mercado, setores, volatilidade = self._market(calendar, end_date)
+        fim = p['deslistagem'] if p['deslistagem'] is not None else pd.Timestamp(end_date)
+        linhas = slice(dias.searchsorted(p['listagem']), dias.searchsorted(fim, side='right'))
+        dias, volatilidade = dias[linhas], volatilidade[linhas]
+        n = len(dias)
+        if n == 0:
+            return calendar, pd.DataFrame(columns=FETCH_COLUMNS)
+
+        # Cinco colunas normais (retorno, salto, gap, máxima, mínima/volume) e duas uniformes (salto, falha)
+        ruido = self._noise(('ticker', ticker), dias, 7, uniformes=2)
+        # Saltos (caudas pesadas) e gaps de abertura: parte do retorno do dia acontece antes da abertura
+        saltos = np.where(ruido[:, 5] < self.jump_prob,
+                          ruido[:, 1] * p['vol'] * 6, 0.0)
+        gap = ruido[:, 2] * p['amplitude'] * 0.3 * volatilidade + saltos
+        # A parte própria do log-preço (ruído e saltos) reverte à média com a meia-vida do ticker
+        persistencia = 0.5 ** (1 / (p['meia_vida'] * DAYS_PER_YEAR[calendar]))
+        proprio = _mean_revert(ruido[:, 0] * p['vol'] * volatilidade + saltos, persistencia)
+        fatores = p['drift'] + p['beta'] * fator_mercado[linhas] + p['carga_setor'] * setores[linhas, p['setor']]
+        retorno = fatores + np.diff(proprio, prepend=0.0)
+
+        log_fechamento = np.log(p['preco_inicial']) + np.cumsum(fatores) + proprio
+        fechamento = np.exp(log_fechamento)
+        fechamento_anterior = np.exp(np.concatenate([[np.log(p['preco_inicial'])], log_fechamento[:-1]]))
+        abertura = fechamento_anterior * np.exp(gap)
+        amplitude = np.abs(ruido[:, 3]) * p['amplitude'] * 0.6 * volatilidade
+        maxima = np.maximum(abertura, fechamento) * np.exp(amplitude)
+        minima = np.minimum(abertura, fechamento) * np.exp(-np.abs(ruido[:, 4]) * p['amplitude'] * 0.6 * volatilidade)
+        # Volume maior em dias de retorno extremo
+        volume = p['volume'] * np.exp(0.3 * ruido[:, 4]) * (1 + 5 * np.abs(retorno) / (p['amplitude'] + 1e-12) / 4)
+
+        dados = pd.DataFrame({
+            'Datetime': dias,
+            'Adj Close': fechamento,  # sem proventos: igual ao fechamento
+            'Close': fechamento,
+            'High': maxima,
+            'Low': minima,
+            'Open': abertura,
+            'Volume': volume.astype(np.int64),
+        }, columns=FETCH_COLUMNS)
+        falhas = ruido[:, 6] < self.missing_prob
+        return calendar, dados[~falhas].reset_index(drop=True)
+
+    def _intraday(self, ticker, calendar, diario, minutos):
+        """Barras intradiárias de cada dia ligando a abertura ao fechamento diário (ponte browniana)."""
+        inicio, duracao = SESSIONS[calendar]
+        n = -(-duracao // minutos)
+        if diario.empty:
+            return pd.DataFrame(columns=FETCH_COLUMNS)
+        dias = pd.DatetimeIndex(diario['Datetime'])
+        ruido = self._noise(('intradiario', ticker, minutos), dias, n)
+        abertura = np.log(diario['Open'].to_numpy())
+        fechamento = np.log(diario['Close'].to_numpy())
+        escala = (np.log(diario['High'].to_numpy()) - np.log(diario['Low'].to_numpy()))[:, None] / np.sqrt(n) / 2
+        passos = ruido * escala
+        passos += ((fechamento - abertura) - passos.sum(axis=1))[:, None] / n
+        caminho = abertura[:, None] + np.cumsum(passos, axis=1)
+        anterior = np.concatenate([abertura[:, None], caminho[:, :-1]], axis=1)
+        amplitude = np.abs(ruido) * escala * 0.3
+        # Volume em forma de U ao longo do pregão
+        perfil = 1 + 2 * (np.linspace(-1, 1, n) ** 2)
+        volume = diario['Volume'].to_numpy()[:, None] * perfil / perfil.sum()
+        hora, minuto = map(int, inicio.split(':'))
+        deslocamento = (hora * 60 + minuto + np.arange(n) * minutos).astype('timedelta64[m]')
+        horarios = dias.normalize().to_numpy()[:, None] + deslocamento[None, :]
+        return pd.DataFrame({
+            'Datetime': np.asarray(horarios).ravel(),
+            'Adj Close': np.exp(caminho).ravel(),
+            'Close': np.exp(caminho).ravel(),
+            'High': np.exp(np.maximum(anterior, caminho) + amplitude).ravel(),
+            'Low': np.exp(np.minimum(anterior, caminho) - amplitude).ravel(),
+            'Open': np.exp(anterior).ravel(),
+            'Volume': volume.astype(np.int64).ravel(),
+        }, columns=FETCH_COLUMNS)
+
+    def history(self, ticker, start_date, end_date, interval="1d"):
+        """Histórico do ticker em [start_date, end_date), no formato de FETCH_COLUMNS."""
+        inicio, fim = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        calendar, dados = self._daily(ticker, fim)
+        if interval != "1d":
+            if interval not in INTERVAL_MINUTES:
+                raise ValueError(f"Intervalo não suportado: {interval}")
+            dias = dados['Datetime']
+            dados = self._intraday(ticker, calendar, dados[(dias >= inicio.normalize()) & (dias < fim)],
+                                   INTERVAL_MINUTES[interval])
+        periodo = (dados['Datetime'] >= inicio) & (dados['Datetime'] < fim)
+        return dados[periodo].reset_index(drop=True)
+
+    def generate(self, tickers, start_date, end_date, interval="1d"):
+        """Históricos de vários tickers: {ticker: DataFrame}."""
+        return {ticker: self.history(ticker, start_date, end_date, interval) for ticker in tickers}
+
+
+class SyntheticSource:
+    """
+    Fonte de dados sintética, com a mesma interface de YahooSource: substitui o Yahoo em testes
+    de carga e sem internet. Use MARKET_DATA_SOURCE=synthetic para que a coleta a use por padrão.
+    """
+
+    def __init__(self, seed=0, **kwargs):
+        self.simulator = MarketSimulator(seed, **kwargs)
+
+    def download(self, ticker, start_date, end_date, interval="1d"):
+        return self.simulator.history(ticker, start_date, end_date, interval)
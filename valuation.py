@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+
+from data_collector import data_version
+from price_matrix import get_price_matrix
+import fx
+
+COLUNAS = ['Ativo', 'Operação', 'Quantidade', 'Preço', 'Valor', 'Data de Compra']
+
+# Avaliação a mercado da carteira: as posições de cada ativo são acumuladas dia a dia
+# a partir dos lançamentos e multiplicadas pela cotação do dia (a última disponível).
+
+
+def asset_ticker(ativo):
+    """Ticker do armazenamento de preços correspondente ao ativo da carteira (sem o sufixo .SA)."""
+    return str(ativo).replace('.SA', '')
+
+
+def asset_currency(ativo, matrix=None):
+    """Moeda em que o ativo é negociado; ativos sem histórico de preços são considerados em reais."""
+    matrix = get_price_matrix() if matrix is None else matrix
+    ticker = asset_ticker(ativo)
+    return fx.currency_of(ticker) if ticker in matrix.columns else 'BRL'
+
+
+def _normalize(lancamentos):
+    if 'Operação' not in lancamentos:
+        lancamentos = lancamentos.assign(**{'Operação': 'Compra'})
+    lancamentos = lancamentos.loc[:, COLUNAS].copy()
+    lancamentos['Data de Compra'] = pd.to_datetime(lancamentos['Data de Compra']).dt.normalize()
+    lancamentos = lancamentos.astype({'Quantidade': np.float64, 'Preço': np.float64, 'Valor': np.float64})
+    return lancamentos.sort_values('Data de Compra', kind='stable', ignore_index=True)
+
+
+class PortfolioValuation:
+    """
+    Quantidade, valor investido e valor de mercado diários de cada ativo da carteira
+    (matrizes dias x ativos), do primeiro lançamento até `end_date` (hoje, por padrão).
+    Vendas reduzem a quantidade e o valor investido (líquido: compras menos vendas), de modo
+    que o Resultado inclui os ganhos já realizados; o Retorno é relativo ao total comprado.
+    O preço de cada dia é a última cotação disponível até aquele dia; ativos sem histórico
+    de preços (ou antes da primeira cotação) são avaliados pelo preço do último lançamento.
+    Com `currency` ('BRL' ou 'USD') tudo é expresso nessa moeda: as cotações pelo câmbio de
+    cada dia e os lançamentos (feitos na moeda do ativo) pelo câmbio da data da operação.
+    Sem `currency` cada ativo fica na sua moeda (`asset_currencies`), e os totais só podem ser
+    somados entre ativos da mesma moeda (totals(asset_currency=...)).
+    """
+
+    def __init__(self, lancamentos, field='Close', end_date=None, currency=None):
+        self.field = field
+        self.currency = currency
+        self.end_date = pd.Timestamp(end_date if end_date is not None else pd.Timestamp.today()).normalize()
+        self.version = data_version()
+        self._build(self._convert(_normalize(lancamentos)))
+
+    def _convert(self, lancamentos):
+        """Converte Preço e Valor dos lançamentos para a moeda da avaliação."""
+        if self.currency is None or lancamentos.empty:
+            return lancamentos
+        matrix = get_price_matrix(self.field)
+        moedas = lancamentos['Ativo'].map(lambda ativo: asset_currency(ativo, matrix)).to_numpy()
+        taxa = fx.rate_at(matrix, lancamentos['Data de Compra'])
+        lancamentos = lancamentos.copy()
+        for coluna in ('Preço', 'Valor'):
+            lancamentos[coluna] = fx.convert_amounts(lancamentos[coluna], moedas, taxa, self.currency)
+        return lancamentos
+
+    def _build(self, lancamentos):
+        self.lancamentos = lancamentos
+        self.assets = list(pd.unique(lancamentos['Ativo']))
+        self.columns = {ativo: j for j, ativo in enumerate(self.assets)}
+        self.asset_currencies = [self._currency_of(ativo) for ativo in self.assets]
+        inicio = lancamentos['Data de Compra'].min() if not lancamentos.empty else self.end_date
+        fim = max(self.end_date, lancamentos['Data de Compra'].max()) if not lancamentos.empty else self.end_date
+        self.dates = pd.date_range(inicio, fim, freq='D')
+
+        forma = (len(self.dates), len(self.assets))
+        self._quantidade = np.zeros(forma)
+        self._investido = np.zeros(forma)
+        self._comprado = np.zeros(forma)
+        linhas = self.dates.searchsorted(lancamentos['Data de Compra'])
+        colunas = lancamentos['Ativo'].map(self.columns).to_numpy()
+        sinal = np.where(lancamentos['Operação'] == 'Venda', -1.0, 1.0)
+        np.add.at(self._quantidade, (linhas, colunas), sinal * lancamentos['Quantidade'].to_numpy())
+        np.add.at(self._investido, (linhas, colunas), sinal * lancamentos['Valor'].to_numpy())
+        np.add.at(self._comprado, (linhas, colunas), np.where(sinal > 0, lancamentos['Valor'].to_numpy(), 0.0))
+        np.cumsum(self._quantidade, axis=0, out=self._quantidade)
+        np.cumsum(self._investido, axis=0, out=self._investido)
+        np.cumsum(self._comprado, axis=0, out=self._comprado)
+        self._precos = self._prices(self.assets, lancamentos)
+
+    def _currency_of(self, ativo):
+        """Moeda em que o ativo é avaliado: a da avaliação, ou a do próprio ativo sem conversão."""
+        return self.currency or asset_currency(ativo, get_price_matrix(self.field))
+
+    def _prices(self, ativos, lancamentos):
+        """Preços diários (dias x ativos) dos ativos informados."""
+        matrix = get_price_matrix(self.field, currency=self.currency)
+        precos = np.full((len(self.dates), len(ativos)), np.nan)
+
+        com_historico = [j for j, ativo in enumerate(ativos) if asset_ticker(ativo) in matrix.columns]
+        if com_historico:
+            colunas = [matrix.columns[asset_ticker(ativos[j])] for j in com_historico]
+            cotacoes = pd.DataFrame(np.asarray(matrix.values)[:, colunas]).ffill().to_numpy()
+            # Junção as-of: cada dia recebe a última linha da matriz com data <= ao dia
+            linhas = matrix.dates.searchsorted(self.dates, side='right') - 1
+            precos[:, com_historico] = np.where(linhas[:, None] >= 0, cotacoes[np.maximum(linhas, 0)], np.nan)
+
+        # Preço do último lançamento, para os dias sem cotação
+        indice = {ativo: j for j, ativo in enumerate(ativos)}
+        proprios = lancamentos[lancamentos['Ativo'].isin(indice)].drop_duplicates(['Ativo', 'Data de Compra'], keep='last')
+        ultimo = np.full_like(precos, np.nan)
+        ultimo[self.dates.searchsorted(proprios['Data de Compra']), proprios['Ativo'].map(indice).to_numpy()] = proprios['Preço'].to_numpy()
+        ultimo = pd.DataFrame(ultimo).ffill().to_numpy()
+        return np.where(np.isnan(precos), ultimo, precos)
+
+    def add(self, ativo, quantidade, preco, data_compra, valor=None, operacao='Compra'):
+        """
+        Inclui um lançamento atualizando apenas a coluna do ativo a partir da data de compra,
+        sem recalcular o resto do histórico. Compras fora do período atual refazem a avaliação.
+        """
+        data = pd.Timestamp(data_compra).normalize()
+        valor = quantidade * preco if valor is None else valor
+        novo = self._convert(pd.DataFrame([[ativo, operacao, quantidade, preco, valor, data]], columns=COLUNAS))
+        preco, valor = novo.loc[0, 'Preço'], novo.loc[0, 'Valor']
+        lancamentos = _normalize(pd.concat([self.lancamentos, novo], ignore_index=True))
+        if data < self.dates[0] or data > self.dates[-1]:
+            self._build(lancamentos)
+            return
+
+        self.lancamentos = lancamentos
+        if ativo not in self.columns:
+            self.columns[ativo] = len(self.assets)
+            self.assets.append(ativo)
+            self.asset_currencies.append(self._currency_of(ativo))
+            zeros = np.zeros((len(self.dates), 1))
+            self._quantidade = np.hstack([self._quantidade, zeros])
+            self._investido = np.hstack([self._investido, zeros])
+            self._comprado = np.hstack([self._comprado, zeros])
+            self._precos = np.hstack([self._precos, zeros])
+
+        j = self.columns[ativo]
+        i = self.dates.searchsorted(data)
+        sinal = -1.0 if operacao == 'Venda' else 1.0
+        self._quantidade[i:, j] += sinal * quantidade
+        self._investido[i:, j] += sinal * valor
+        if sinal > 0:
+            self._comprado[i:, j] += valor
+        self._precos[:, [j]] = self._prices([ativo], lancamentos)
+
+    def is_current(self):
+        """Indica se a avaliação foi feita sobre a versão atual dos dados de preços e ainda vale para hoje."""
+        return self.version == data_version() and self.end_date >= pd.Timestamp.today().normalize()
+
+    def market_value(self):
+        """Valor de mercado (dias x ativos); zero nos dias sem posição."""
+        with np.errstate(invalid='ignore'):
+            return np.where(np.abs(self._quantidade) < 1e-9, 0.0, self._quantidade * self._precos)
+
+    def series(self, campo='Valor de Mercado'):
+        """Série diária por ativo: 'Quantidade', 'Valor Investido', 'Valor de Mercado' ou 'Resultado'."""
+        valores = {
+            'Quantidade': lambda: self._quantidade,
+            'Valor Investido': lambda: self._investido,
+            'Valor de Mercado': self.market_value,
+            'Resultado': lambda: self.market_value() - self._investido,
+        }[campo]()
+        return pd.DataFrame(valores, index=self.dates.rename('Data'), columns=self.assets)
+
+    def currencies(self):
+        """Moedas dos ativos da avaliação, em ordem alfabética (uma só quando há `currency`)."""
+        return sorted(set(self.asset_currencies))
+
+    def totals(self, start_date=None, end_date=None, asset_currency=None):
+        """
+        Valor investido, valor de mercado, resultado e retorno (%) da carteira, por dia.
+        Com `asset_currency` soma apenas os ativos dessa moeda: sem `currency`, somar ativos
+        de moedas diferentes não tem significado.
+        """
+        colunas = slice(None)
+        if asset_currency is not None:
+            colunas = np.asarray(self.asset_currencies, dtype=object) == asset_currency
+        investido = self._investido[:, colunas].sum(axis=1)
+        comprado = self._comprado[:, colunas].sum(axis=1)
+        mercado = self.market_value()[:, colunas].sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            retorno = np.where(comprado != 0, (mercado - investido) / comprado * 100, np.nan)
+        tabela = pd.DataFrame({
+            'Valor Investido': investido,
+            'Valor de Mercado': mercado,
+            'Resultado': mercado - investido,
+            'Retorno (%)': retorno,
+        }, index=self.dates.rename('Data'))
+        inicio = None if start_date is None else pd.Timestamp(start_date)
+        fim = None if end_date is None else pd.Timestamp(end_date)
+        return tabela.loc[inicio:fim].round(2)
+
+    def by_asset(self, date=None):
+        """Posição de cada ativo na data (a última, por padrão)."""
+        i = -1 if date is None else max(self.dates.searchsorted(pd.Timestamp(date), side='right') - 1, 0)
+        investido = self._investido[i]
+        comprado = self._comprado[i]
+        mercado = self.market_value()[i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            retorno = np.where(comprado != 0, (mercado - investido) / comprado * 100, np.nan)
+        tabela = pd.DataFrame({
+            'Ativo': self.assets,
+            'Moeda': self.asset_currencies,
+            'Quantidade': self._quantidade[i],
+            'Valor Investido': investido,
+            'Preço Atual': self._precos[i],
+            'Valor de Mercado': mercado,
+            'Resultado': mercado - investido,
+            'Retorno (%)': retorno,
+        })
+        return tabela.round(2)